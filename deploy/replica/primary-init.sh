@@ -0,0 +1,4 @@
+#!/bin/sh
+# Allows streaming replication connections to the primary "db" service
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
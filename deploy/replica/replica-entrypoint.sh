@@ -0,0 +1,13 @@
+#!/bin/sh
+# Starts hot standby of the primary "db" service, cloning it on first run
+set -e
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+  until pg_basebackup -h db -U "$POSTGRES_USER" -D "$PGDATA" -R -X stream -c fast
+  do
+    echo "waiting for primary"
+    rm -rf "${PGDATA:?}"/*
+    sleep 1
+  done
+  chmod 0700 "$PGDATA"
+fi
+exec postgres
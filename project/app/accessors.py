@@ -1,71 +1,1125 @@
-from collections.abc import Iterable
+import operator
+from collections.abc import AsyncIterator, Callable, Sequence
 from datetime import datetime
+from typing import Any
+from uuid import UUID
 
+from asyncpg import UniqueViolationError
 from marshmallow import ValidationError
-from sqlalchemy import delete, select
-from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.engine import CursorResult
+from sqlalchemy import (
+    BigInteger, Column, MetaData, String, Table, and_, any_, bindparam, case,
+    cast, column, delete, exists, func, literal, null, or_, select, text,
+    tuple_, union, update
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.engine import CursorResult, Row
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncResult, AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql.expression import (
+    CTE, ColumnElement, FromClause, Insert, Select, Subquery, TextClause,
+    Update
+)
 
+from .cache import NodeCache, NodeCacheSync
+from .catalog import Catalog
+from .coalescing import ImportCoalescer
 from .database import Database
-from .models import Item
+from .models import BATCH_MODE_SETTING, Item, ItemHistory, ItemRow
+from .parsers import ImportRequestStream
 from .schemas import ItemType
 
+# advisory lock taken by batch writes, see ``_batch_mode()``
+WRITE_LOCK_ID = 0x6d656761
+# ids per ``NOTIFY`` payload, which is limited to 8000 bytes
+NOTIFY_IDS = 200
+
 
 class ItemAccessor(Database):
     """
     Collection of methods to simplify access to ``Items`` in database.
+
+    Imports of ``copy_threshold`` ``Items`` or more are copied to a temporary
+    staging table by ``COPY`` first, smaller ones are passed as arrays.
+    Streamed imports are copied by chunks of ``stream_chunk_size``.
+
+    With ``coalesce_window`` above 0, concurrent imports smaller than
+    ``copy_threshold`` are merged into one transaction by ``coalescer``,
+    see ``ImportCoalescer``.
+
+    Imports maintain ``Item.path``, so subtrees and ancestors are read by
+    one indexed query instead of walking ``parent_id`` recursively.
+    Imports and deletes invalidate written ``Items`` in ``nodes_cache`` and
+    set ``Item.modified`` of them and all their ancestors.
+    With ``catalog``, writes notify its channel on commit, and the catalog of
+    this process is synced before they return, see ``Catalog``. With
+    ``cache_sync``, writes notify other processes to drop their caches, see
+    ``NodeCacheSync``.
+    Reads go to replica, if it is configured, writes go to primary.
+    Writes are serialized by one database-wide lock, see ``_batch_mode()``.
     """
 
-    async def import_many(self, items_objects: Iterable[Item]) -> None:
+    def __init__(
+            self,
+            copy_threshold: int | str = 1000,
+            stream_chunk_size: int | str = 10000,
+            coalesce_window: float | str = 0,
+            coalesce_max_items: int | str = 10000,
+            nodes_cache: NodeCache | None = None,
+            catalog: Catalog | None = None,
+            cache_sync: NodeCacheSync | None = None,
+    ) -> None:
+        self.copy_threshold = int(copy_threshold)
+        self.stream_chunk_size = int(stream_chunk_size)
+        self.coalescer = ImportCoalescer(
+            self._import_coalesced, coalesce_window, coalesce_max_items,
+        ) if float(coalesce_window) > 0 else None
+        self.nodes_cache = nodes_cache or NodeCache(max_size=0)
+        self.catalog = catalog
+        self.cache_sync = cache_sync
+
+    async def import_many(self, rows: Sequence[ItemRow]) -> None:
         """
-        Provides bulk insert of ``Items`` to database.
+        Provides bulk insert of ``Items`` to database, given as plain ``rows``.
 
         If ``Item`` with same ``id`` exists - updates it with new data.
+        Works in batch mode: instead of row-by-row triggers the whole batch is
+        validated by one query, and ``date`` of all ancestors is updated by one.
+        Aggregates of categories are moved along with changed ``Items``.
+        New states of all affected ``Items`` are saved to ``ItemHistory``.
 
         Raises ``ValidationError`` if ``SQL IntegrityError`` occurs during import.
         """
+        if not rows:
+            return
+        if self.coalescer is not None and len(rows) < self.copy_threshold:
+            return await self.coalescer.submit(rows)
+
         async with self.session() as db:
-            insert_statement = insert(Item).values(
-                tuple(item.dict() for item in items_objects)
-            )
-            try:
-                await db.execute(
-                    insert_statement.on_conflict_do_update(
-                        constraint=Item.__table__.primary_key,
-                        set_=insert_statement.excluded,
-                    )
-                )
-            except IntegrityError:
-                raise ValidationError('database integrity error')
+            await db.execute(_batch_mode())
+            if len(rows) < self.copy_threshold:
+                batch = _batch_from_rows(rows)
+            else:
+                batch = await _create_staging_table(db)
+                await _copy_to_staging_table(db, rows)
+                await db.execute(_analyze(batch))
+            written_ids = await _import_batch(db, batch)
+            await self._notify(db)
+        await self._written(written_ids)
 
-    async def get(self, item_id: int) -> Item:
+    async def _import_coalesced(
+            self, imports: list[Sequence[ItemRow]],
+    ) -> list[ValidationError | None]:
         """
-        Returns ``Item`` by ``id``.
+        Imports each of ``imports`` rows as ``import_many()`` does, in order,
+        all in one transaction. Each one is made in a savepoint, so invalid
+        imports are rolled back alone. Returns error of each import, if any.
         """
+        errors: list[ValidationError | None] = []
+        written_ids: list[UUID] = []
         async with self.session() as db:
-            return await db.get(Item, item_id)
+            await db.execute(_batch_mode())
+            for rows in imports:
+                try:
+                    async with db.begin_nested():
+                        written_ids += await _import_batch(
+                            db, _batch_from_rows(rows)
+                        )
+                except ValidationError as e:
+                    errors.append(e)
+                else:
+                    errors.append(None)
+            await self._notify(db)
+        await self._written(written_ids)
+        return errors
 
-    async def get_offers_in_date_range(
-            self, start: datetime, end: datetime
-    ) -> list[Item]:
+    async def import_stream(self, stream: ImportRequestStream) -> None:
         """
-        Returns ``Items`` which ``date`` in range from ``start`` to ``end``.
+        Same as ``import_many()``, but rows are read from ``stream`` and copied
+        to staging table by chunks of ``stream_chunk_size``, so memory doesn't
+        depend on import size. Import is still done in one transaction.
+
+        Imports smaller than ``copy_threshold`` are read whole first and
+        passed to ``import_many()``.
         """
+        rows = aiter(stream)
+        head: list[ItemRow] = []
+        async for row in rows:
+            head.append(row)
+            if len(head) >= self.copy_threshold:
+                break
+        else:
+            if len({row.id for row in head}) != len(head):
+                raise ValidationError('multiple items with same id')
+            # rows streamed before ``updateDate`` are read without date
+            return await self.import_many([
+                row._replace(date=stream.update_date) for row in head
+            ])
+
         async with self.session() as db:
+            await db.execute(_batch_mode())
+            batch = await _create_staging_table(db)
+            await _copy_to_staging_table(db, head)
+            chunk: list[ItemRow] = []
+            async for row in rows:
+                chunk.append(row)
+                if len(chunk) == self.stream_chunk_size:
+                    await _copy_to_staging_table(db, chunk)
+                    chunk.clear()
+            if chunk:
+                await _copy_to_staging_table(db, chunk)
+
+            # rows streamed before ``updateDate`` are copied without date
+            await db.execute(
+                update(batch).
+                where(batch.c.date.is_(None)).
+                values(date=stream.update_date)
+            )
+            await db.execute(_analyze(batch))
+            written_ids = await _import_batch(db, batch)
+            await self._notify(db)
+        await self._written(written_ids)
+
+    async def get_modified(self, item_id: UUID) -> datetime | None:
+        """
+        Returns ``Item.modified`` by ``id``, ``None`` if it is not found.
+        Lookup by primary key, which is much cheaper than reading subtree.
+        """
+        async with self.read_session() as db:
+            return await db.scalar(
+                select(Item.modified).where(Item.id == item_id)
+            )
+
+    async def get_rows(self, item_id: UUID) -> list[tuple]:
+        """
+        Returns ``Item`` by ``id`` and all its descendants as plain tuples of
+        ``Item.data_columns``, empty if it is not found. Ids are text.
+
+        No ORM objects are made, so large subtrees are cheap to read, and rows
+        are cheap to send to another process. They are linked and serialized
+        by ``serializers.dumps_shop_unit_rows()``.
+        """
+        async with self.read_session() as db:
+            result: CursorResult = await db.execute(
+                select(*_row_columns(Item.__table__)).
+                where(_in_subtrees([item_id]))
+            )
+            # iteration fetches rows one by one, at quadratic cost
+            return [tuple(row) for row in result.all()]
+
+    async def get_many_rows(
+            self, ids: Sequence[UUID], limit: int | None = None,
+    ) -> tuple[dict[str, datetime], list[tuple]]:
+        """
+        Returns ``Item.modified`` of found ``ids`` by text id, and rows as
+        ``get_rows()`` of all their subtrees, read by one shared query:
+        ``Items`` of overlapping subtrees are read once.
+
+        At most ``limit`` + 1 rows are read, so subtrees with more than
+        ``limit`` ``Items`` are told by length of rows, which are incomplete.
+        """
+        ids_array = _ids_array(ids)
+        # modified of requested Items only, in the same snapshot as rows
+        modified = case((Item.id == any_(ids_array), Item.modified))
+        async with self.read_session() as db:
+            result: CursorResult = await db.execute(
+                select(*_row_columns(Item.__table__), modified).
+                where(Item.path.overlap(ids_array)).
+                limit(limit and limit + 1)
+            )
+            rows = result.all()
+        found = {row[0]: row[-1] for row in rows if row[-1] is not None}
+        return found, [tuple(row)[:-1] for row in rows]
+
+    async def iter_rows(
+            self, item_id: UUID, fetch_size: int = 1000,
+    ) -> AsyncIterator[list[tuple]]:
+        """
+        Same rows as ``get_rows()`` with depth below ``Item`` added, ordered
+        depth-first by ``path``: every category is followed by its whole
+        subtree.
+
+        Rows are read by server-side cursor and yielded by chunks of
+        ``fetch_size``, so memory used doesn't depend on subtree size.
+        """
+        depth = func.cardinality(Item.path) - func.array_position(
+            Item.path, literal(item_id, Item.id.type),
+        )
+        async with self.read_session() as db:
+            result: AsyncResult = await db.stream(
+                select(*_row_columns(Item.__table__), depth.label('depth')).
+                where(_in_subtrees([item_id])).
+                order_by(Item.path)
+            )
+            async for rows in result.partitions(fetch_size):
+                yield [tuple(row) for row in rows]
+
+    async def get_page_rows(
+            self,
+            item_id: UUID,
+            depth: int | None = None,
+            limit: int | None = None,
+            after: UUID | None = None,
+    ) -> list[tuple]:
+        """
+        Returns ``Item`` by ``id`` and its descendants down to ``depth``
+        below it, at most ``limit`` children of each category ordered by
+        ``id``, children of ``Item`` itself after ``after`` one. Empty if
+        ``Item`` is not found.
+
+        Rows are ``Item.data_columns`` as ``get_rows()`` with ``rank`` of
+        ``Item`` among listed children and ``has_children`` flag of
+        categories at ``depth``, ``None`` for others. Each category has
+        one more child of ``rank`` above ``limit`` if not all its children
+        are listed, which subtree is not read. Rows are ordered
+        depth-first by ``path``.
+
+        Children are read by ``(parent_id, id)`` index, category price is
+        computed from aggregates, so subtrees below listed ``Items`` are
+        not read.
+        """
+        tree = (
+            select(
+                Item.__table__, literal(0).label('depth'),
+                literal(1, BigInteger).label('rank'),
+            ).
+            where(Item.id == item_id).
+            cte('tree', recursive=True)
+        )
+        child = Item.__table__.alias('child')
+        children = (
+            select(
+                child,
+                func.row_number().over(order_by=child.c.id).label('rank'),
+            ).
+            where(child.c.parent_id == tree.c.id).
+            order_by(child.c.id).
+            limit(limit and limit + 1)
+        )
+        if after is not None:
+            # cursor applies to children of Item itself only
+            children = children.where(
+                or_(tree.c.depth > 0, child.c.id > after)
+            )
+        children = children.lateral('children')
+        expanded = tree.c.type == ItemType.CATEGORY
+        if depth is not None:
+            expanded &= tree.c.depth < depth
+        if limit is not None:
+            expanded &= tree.c.rank <= limit
+        tree = tree.union_all(
+            select(
+                *(children.c[col.name] for col in Item.__table__.c),
+                tree.c.depth + 1, children.c.rank,
+            ).
+            select_from(tree).
+            join(children, literal(True)).
+            where(expanded)
+        )
+        if depth is None:
+            has_children = null()
+        else:
+            has_children = case((
+                and_(
+                    tree.c.depth == depth,
+                    tree.c.type == ItemType.CATEGORY,
+                ),
+                # not ``EXISTS``, which is planned as scan of all children
+                select(Item.id).
+                where(Item.parent_id == tree.c.id).
+                limit(1).
+                scalar_subquery().isnot(None),
+            ))
+        async with self.read_session() as db:
             result: CursorResult = await db.execute(
-                select(Item).
-                where(Item.type == ItemType.OFFER).
-                where(Item.date.between(start, end))
+                select(*_row_columns(tree), tree.c.rank, has_children).
+                order_by(tree.c.path)
             )
+            return [tuple(row) for row in result.all()]
+
+    async def get_offers_in_date_range(
+            self,
+            start: datetime,
+            end: datetime,
+            limit: int | None = None,
+            after: tuple[datetime, UUID] | None = None,
+    ) -> list[Item]:
+        """
+        Returns ``Items`` which ``date`` in range from ``start`` to ``end``
+        ordered by ``(date, id)``.
+
+        Pagination: at most ``limit`` ``Items`` placed after ``(date, id)``.
+        """
+        query = (
+            select(Item).
+            where(Item.type == ItemType.OFFER).
+            where(Item.date.between(start, end)).
+            order_by(Item.date, Item.id).
+            limit(limit)
+        )
+        if after is not None:
+            query = query.where(tuple_(Item.date, Item.id) > after)
+
+        async with self.read_session() as db:
+            result: CursorResult = await db.execute(query)
             return result.scalars().all()
 
-    async def delete(self, item_id: int) -> bool:
+    async def get_statistic(
+            self,
+            item_id: UUID,
+            start: datetime | None = None,
+            end: datetime | None = None,
+    ) -> list[Row] | None:
+        """
+        Returns states of ``Item`` which ``date`` in range [``start``, ``end``)
+        ordered by ``date``, or ``None`` if ``Item`` doesn't exist.
+        """
+        in_range = [ItemHistory.item_id == Item.id]
+        if start is not None:
+            in_range.append(ItemHistory.date >= start)
+        if end is not None:
+            in_range.append(ItemHistory.date < end)
+
+        async with self.read_session() as db:
+            result: CursorResult = await db.execute(
+                select(
+                    ItemHistory.item_id.label('id'),
+                    ItemHistory.name,
+                    ItemHistory.date,
+                    ItemHistory.parent_id,
+                    ItemHistory.type,
+                    ItemHistory.price,
+                ).
+                select_from(Item).
+                join(ItemHistory, and_(*in_range), isouter=True).
+                where(Item.id == item_id).
+                order_by(ItemHistory.date)
+            )
+            states = result.all()
+        if not states:
+            return None
+        return [state for state in states if state.id is not None]
+
+    async def delete(self, item_id: UUID) -> bool:
+        """
+        Deletes ``Item`` by ``id`` with all its descendants, see
+        ``delete_many()``. Returns ``False`` if ``Item`` is not found.
+        """
+        return not await self.delete_many([item_id])
+
+    async def delete_many(
+            self, ids: Sequence[UUID], date: datetime | None = None,
+    ) -> list[UUID]:
         """
-        Deletes ``Item`` by ``id``.
+        Deletes ``Items`` by ``ids`` with all their descendants in one
+        transaction. Returns ``ids`` which are not found.
+
+        Statements don't depend on number of ``ids``: aggregates of all
+        ancestors are updated by one query, each subtree weight subtracted
+        once even if some of ``ids`` are nested into others, and all
+        subtrees are deleted by one query by their paths.
+
+        With ``date``, the same query sets ``date`` of all ancestors, and
+        their new states are saved to ``ItemHistory``, as imports do.
         """
+        if not ids:
+            return []
+
+        deleted = (
+            select(Item.id, Item.path, *_weight(Item)).
+            where(Item.id == any_(_ids_array(ids))).
+            cte('deleted')
+        )
+        ancestry = _ancestry(deleted)
+        is_ancestor = ancestry.c.ancestor_id != ancestry.c.id
+        # weights of nested deleted Items are subtracted with their ancestors
+        nested = (
+            select(ancestry.c.id).
+            join(deleted, deleted.c.id == ancestry.c.ancestor_id).
+            where(is_ancestor).
+            cte('nested')
+        )
+        walk = (
+            select(
+                ancestry.c.ancestor_id.label('id'),
+                ancestry.c.offer_count,
+                ancestry.c.price_sum,
+            ).
+            where(
+                is_ancestor, ~exists().where(nested.c.id == ancestry.c.id),
+            ).
+            cte('walk')
+        )
         async with self.session() as db:
+            await db.execute(_batch_mode())
+            ancestors: CursorResult = await db.execute(
+                _update_aggregates(walk, operator.sub, date).
+                returning(Item.id)
+            )
+            ancestors_ids = ancestors.scalars().all()
+            if date is not None and ancestors_ids:
+                await db.execute(_record_history(None, ancestors_ids))
+            # subtree is deleted explicitly instead of cascade to get its ids
             result: CursorResult = await db.execute(
-                delete(Item).where(Item.id == item_id)
+                delete(Item).
+                where(_in_subtrees(ids)).
+                returning(Item.id).
+                execution_options(synchronize_session=False)
             )
-            return result.rowcount != 0
+            deleted_ids = result.scalars().all()
+            found = set(deleted_ids)
+            deleted_roots = [item_id for item_id in ids if item_id in found]
+            time = await self._notify(db, deleted_roots) if found else None
+        if deleted_ids:
+            await self._written(
+                [*ancestors_ids, *deleted_ids], deleted_roots, time,
+            )
+        return [item_id for item_id in ids if item_id not in found]
+
+    async def iter_catalog_rows(
+            self, after: datetime | None = None, fetch_size: int = 10000,
+    ) -> AsyncIterator[list[tuple]]:
+        """
+        Yields all ``Items`` or ones modified ``after`` given time, by chunks
+        of ``fetch_size``, as ``(id, name, date, parent_id, type, price,
+        modified)`` tuples in no particular order. Ids are text, category
+        price is computed from aggregates, ``modified`` is in microseconds
+        since epoch.
+
+        Reads primary, which has all writes notified to ``Catalog``.
+        """
+        query = select(
+            *_row_columns(Item.__table__), _microseconds(Item.modified),
+        )
+        if after is not None:
+            query = query.where(Item.modified > after)
+        async with self.session() as db:
+            result: AsyncResult = await db.stream(query)
+            async for rows in result.partitions(fetch_size):
+                yield [tuple(row) for row in rows]
+
+    async def _notify(
+            self, db: AsyncSession, deleted_ids: Sequence[UUID] = (),
+    ) -> int | None:
+        """
+        Notifies ``cache_sync`` and ``catalog`` channels of write, delivered
+        on commit. Payloads of ``catalog`` are time of write in microseconds
+        since epoch followed by ``deleted_ids`` of topmost deleted ``Items``,
+        split to fit payload limit. Returns time of write, ``None`` without
+        ``catalog``.
+        """
+        if self.cache_sync is not None:
+            await db.execute(select(func.pg_notify(
+                self.cache_sync.channel, self.cache_sync.token,
+            )))
+        if self.catalog is None:
+            return None
+        chunks = [
+            ' '.join(map(str, deleted_ids[i:i + NOTIFY_IDS]))
+            for i in range(0, len(deleted_ids), NOTIFY_IDS)
+        ] or [None]
+        return await db.scalar(_notify(self.catalog.channel, chunks))
+
+    async def _written(
+            self, written_ids: Sequence[UUID],
+            deleted_ids: Sequence[UUID] = (), time: int | None = None,
+    ) -> None:
+        """
+        Syncs ``catalog`` and invalidates ``nodes_cache`` after commit
+        """
+        await self.track_write()
+        if self.catalog is not None:
+            await self.catalog.sync(deleted_ids, time)
+        self.nodes_cache.invalidate(written_ids)
+
+
+def _ids_array(ids: Sequence[UUID]) -> ColumnElement:
+    """
+    ``ids`` as one array parameter, so statements don't depend on their number
+    """
+    return cast(bindparam('ids', list(ids)), ARRAY(Item.id.type))
+
+
+def _in_subtrees(ids: Sequence[UUID]) -> ColumnElement:
+    """
+    Criterion of ``Items`` with ``ids`` and all their descendants: ``Items``
+    which ``path`` contains any of ``ids``, looked up by GIN index
+    """
+    return Item.path.overlap(_ids_array(ids))
+
+
+def _ancestry(items: FromClause) -> Subquery:
+    """
+    ``items`` rows with ``ancestor_id`` of each ``Item`` in their ``path``:
+    row itself and all its ancestors, without walking up the tree
+    """
+    return (
+        select(items, func.unnest(items.c.path).label('ancestor_id')).
+        subquery('ancestry')
+    )
+
+
+def _microseconds(timestamp: ColumnElement) -> ColumnElement:
+    return cast(func.extract('epoch', timestamp) * 1000000, BigInteger)
+
+
+def _notify(channel: str, chunks: Sequence[str | None]) -> Select:
+    """
+    Sends ``NOTIFY`` on ``channel`` with time of write and each of ``chunks``
+    in payload, see ``ItemAccessor._notify()``. Returns time of write.
+    """
+    time = select(_microseconds(func.clock_timestamp())).scalar_subquery()
+    payloads = func.unnest(
+        cast(bindparam('notify_chunks', chunks), ARRAY(String))
+    ).table_valued('chunk').render_derived().alias('payloads')
+    return select(
+        time,
+        func.pg_notify(channel, func.concat_ws(' ', time, payloads.c.chunk)),
+    ).select_from(payloads)
+
+
+def _row_columns(items: FromClause) -> list[ColumnElement]:
+    """
+    ``Item.data_columns`` of ``items`` rows with text ids and
+    category price computed from aggregates
+    """
+    # same as category price set on ``Item`` load
+    average_price = cast(
+        func.div(items.c.price_sum, func.nullif(items.c.offer_count, 0)),
+        BigInteger,
+    )
+    columns = {
+        name: items.c[name] for name in Item.data_columns
+    } | {
+        'id': cast(items.c.id, String),
+        'parent_id': cast(items.c.parent_id, String),
+        'price': func.coalesce(items.c.price, average_price),
+    }
+    return list(columns.values())
+
+
+def _batch_from_rows(rows: Sequence[ItemRow]) -> FromClause:
+    """
+    Represents imported ``rows`` as a table made by one ``unnest()`` call,
+    so statements have constant number of bind parameters.
+    """
+    columns = [Item.__table__.c[name] for name in Item.data_columns]
+    return func.unnest(*(
+        cast(bindparam(f'batch_{col.name}', list(values)), ARRAY(col.type))
+        for col, values in zip(columns, zip(*rows))
+    )).table_valued(
+        *(column(col.name, col.type) for col in columns)
+    ).render_derived().alias('batch')
+
+
+async def _import_batch(db: AsyncSession, batch: FromClause) -> list[UUID]:
+    """
+    Validates and imports ``batch`` rows along with aggregates, ancestors dates
+    and history, see ``ItemAccessor.import_many()``.
+
+    Returns ids of all written ``Items``.
+    """
+    try:
+        if await db.scalar(_has_invalid_items(batch)):
+            raise ValidationError('database integrity error')
+
+        detached: CursorResult = await db.execute(
+            _detach_aggregates(batch).returning(Item.id)
+        )
+        detached_ids = detached.scalars().all()
+        attached: CursorResult = await db.execute(_attached_aggregates(batch))
+        deltas = attached.all()
+        await db.execute(_upsert(batch))
+        if deltas:
+            await db.execute(_add_aggregates(deltas))
+        if await db.scalar(_update_paths(batch)):
+            raise ValidationError('database integrity error')
+
+        bumped: CursorResult = await db.execute(
+            _bump_ancestors_dates(batch).returning(Item.id)
+        )
+        recorded: CursorResult = await db.execute(
+            _record_history(batch, [*detached_ids, *bumped.scalars().all()]).
+            returning(ItemHistory.item_id)
+        )
+        return recorded.scalars().all()
+    except IntegrityError:
+        raise ValidationError('database integrity error')
+
+
+_staging_table = Table(
+    'items_import',
+    MetaData(),
+    *(
+        Column(name, Item.__table__.c[name].type, primary_key=name == 'id')
+        for name in Item.data_columns
+    ),
+    prefixes=['TEMPORARY'],
+    postgresql_on_commit='DROP',
+)
+
+
+async def _create_staging_table(db: AsyncSession) -> Table:
+    """
+    Creates temporary staging table, which lives till the end of transaction.
+    Its primary key rejects imports with repeated ``id``.
+    """
+    await db.execute(CreateTable(_staging_table))
+    return _staging_table
+
+
+async def _copy_to_staging_table(
+        db: AsyncSession, rows: Sequence[ItemRow]
+) -> None:
+    """
+    Appends ``rows`` to staging table by binary ``COPY``.
+    """
+    connection: AsyncConnection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    try:
+        await raw_connection.driver_connection.copy_records_to_table(
+            _staging_table.name,
+            records=rows,
+            columns=Item.data_columns,
+        )
+    except UniqueViolationError:
+        raise ValidationError('multiple items with same id')
+
+
+def _analyze(table: Table) -> TextClause:
+    """
+    Collects planner statistics, temporary tables are not analyzed automatically
+    """
+    return text(f'ANALYZE {table.name}')
+
+
+def _upsert(batch: FromClause) -> Insert:
+    """
+    Inserts ``batch`` rows to ``Items`` or updates existing ones.
+
+    New ``Items`` get ``path`` from ``_batch_paths()``, existing ones keep
+    theirs till ``_update_paths()``.
+    """
+    paths = _batch_paths(batch)
+    insert_statement = insert(Item).from_select(
+        (*Item.data_columns, 'path'),
+        select(*(batch.c[name] for name in Item.data_columns), paths.c.path).
+        join(paths, paths.c.id == batch.c.id, isouter=True),
+    )
+    return insert_statement.on_conflict_do_update(
+        constraint=Item.__table__.primary_key,
+        set_={
+            name: insert_statement.excluded[name]
+            for name in Item.data_columns
+        } | {'modified': func.clock_timestamp()},
+    )
+
+
+def _batch_paths(batch: FromClause) -> CTE:
+    """
+    ``path`` of each imported ``Item``, walked down ``batch`` from ones which
+    parents are not imported, with paths of their parents taken from table.
+
+    Paths below ``Items`` moved by the same import may be outdated, they
+    are fixed by ``_update_paths()``. ``Items`` imported in a cycle are not
+    walked and get no ``path``.
+    """
+    imported = select(batch.c.id, batch.c.parent_id).cte('imported')
+    imported_parent = imported.alias('imported_parent')
+    parent = aliased(Item, name='parent')
+    paths = (
+        select(
+            imported.c.id,
+            func.array_append(parent.path, imported.c.id).label('path'),
+        ).
+        join(parent, parent.id == imported.c.parent_id, isouter=True).
+        where(~exists().where(imported_parent.c.id == imported.c.parent_id)).
+        cte('paths', recursive=True)
+    )
+    return paths.union_all(
+        select(imported.c.id, func.array_append(paths.c.path, imported.c.id)).
+        join(paths, imported.c.parent_id == paths.c.id)
+    )
+
+
+def _batch_mode() -> Select:
+    """
+    Turns off row-by-row triggers till the end of transaction.
+
+    Also plans every statement for its parameters: cached generic plans,
+    made while tables were small, are very slow for large batches.
+
+    Takes write lock till the end of transaction, so writes are serialized
+    whether imports are coalesced or not. It is a design decision, not only
+    a deadlock guard: aggregate deltas, validation and path rewrites are
+    computed from the tree as committed before the batch, so two batches
+    moving the same offer would both subtract it from its old parent.
+    Row locks of ancestors in id order would avoid deadlocks, but not this.
+    """
+    return select(
+        func.set_config(BATCH_MODE_SETTING, 'on', True),
+        func.set_config('plan_cache_mode', 'force_custom_plan', True),
+        func.pg_advisory_xact_lock(WRITE_LOCK_ID),
+    )
+
+
+def _has_invalid_items(batch: FromClause) -> Select:
+    """
+    Checks the whole ``batch`` like triggers do for every row:
+    ``type`` of existing ``Item`` can't be changed and parent must be category.
+    Parents are taken from ``batch`` or, if not imported, from table.
+
+    Returns number of invalid ``Items``. It is counted instead of ``EXISTS``,
+    which makes planner expect early exit and choose nested loop joins.
+    """
+    existing = aliased(Item, name='existing')
+    parent = aliased(Item, name='parent')
+    imported_parent = select(batch).cte('imported_parent')
+    parent_type = func.coalesce(imported_parent.c.type, parent.type)
+    return (
+        select(func.count()).
+        select_from(batch).
+        join(existing, existing.id == batch.c.id, isouter=True).
+        join(
+            imported_parent, imported_parent.c.id == batch.c.parent_id,
+            isouter=True,
+        ).
+        join(parent, parent.id == batch.c.parent_id, isouter=True).
+        where(or_(
+            existing.type != batch.c.type,
+            parent_type != ItemType.CATEGORY,
+        ))
+    )
+
+
+def _update_paths(batch: FromClause) -> Select:
+    """
+    Sets ``path`` of imported ``Items`` moved to other parent and of all their
+    descendants. Must be run after import itself.
+
+    Moved ``Items`` still have ``path`` which doesn't end with their
+    ``parent_id``. Paths are walked down from topmost ones only: paths of
+    their parents contain none of moved ``Items``, so they are up to date.
+
+    Returns number of moved ``Items`` which are not walked: they are moved
+    into their own subtrees, which would make a cycle.
+    """
+    parent_in_path = Item.path[func.cardinality(Item.path) - 1]
+    moved = (
+        select(Item.id, Item.parent_id).
+        join(batch, batch.c.id == Item.id).
+        where(parent_in_path.is_distinct_from(Item.parent_id)).
+        cte('moved')
+    )
+    parent = aliased(Item, name='parent')
+    moved_parents = (
+        select(moved.c.id, parent.path).
+        join(parent, parent.id == moved.c.parent_id).
+        subquery('moved_parents')
+    )
+    ancestry = _ancestry(moved_parents)
+    moved_ancestor = moved.alias('moved_ancestor')
+    below_moved = (
+        select(ancestry.c.id).
+        join(moved_ancestor, moved_ancestor.c.id == ancestry.c.ancestor_id).
+        cte('below_moved')
+    )
+
+    walk = (
+        select(
+            moved.c.id,
+            func.array_append(parent.path, moved.c.id).label('path'),
+        ).
+        join(parent, parent.id == moved.c.parent_id, isouter=True).
+        where(~exists().where(below_moved.c.id == moved.c.id)).
+        cte('walk', recursive=True)
+    )
+    walk = walk.union_all(
+        select(Item.id, func.array_append(walk.c.path, Item.id)).
+        join(walk, Item.parent_id == walk.c.id)
+    )
+    updated = (
+        update(Item).
+        where(Item.id == walk.c.id).
+        values(path=walk.c.path).
+        returning(Item.id).
+        cte('updated')
+    )
+    return (
+        select(func.count()).
+        select_from(moved).
+        where(~exists().where(updated.c.id == moved.c.id))
+    )
+
+
+def _bump_ancestors_dates(batch: FromClause) -> Update:
+    """
+    Sets ``date`` of all ancestors of imported ``Items`` to the latest
+    ``date`` of their imported descendants. Must be run after
+    ``_update_paths()``.
+
+    Dates are reduced per parent before taking ancestors from parent
+    ``path``, so query size depends on number of categories, not on number
+    of imported ``Items``.
+    """
+    parents = (
+        select(Item.parent_id.label('id'), func.max(batch.c.date).label('date')).
+        join(batch, batch.c.id == Item.id).
+        where(Item.parent_id.is_not(None)).
+        group_by(Item.parent_id).
+        subquery('parents')
+    )
+    ancestry = _ancestry(
+        select(Item.path, parents.c.date).
+        join(parents, parents.c.id == Item.id).
+        subquery('parent_paths')
+    )
+    dates = (
+        select(
+            ancestry.c.ancestor_id.label('id'),
+            func.max(ancestry.c.date).label('date'),
+        ).
+        group_by(ancestry.c.ancestor_id).
+        subquery('dates')
+    )
+    return (
+        update(Item).
+        where(Item.id == dates.c.id).
+        values(date=dates.c.date, modified=func.clock_timestamp()).
+        execution_options(synchronize_session=False)
+    )
+
+
+def _weight(item: FromClause | type[Item]) -> tuple[ColumnElement, ...]:
+    """
+    Offers count and prices sum which ``item`` adds to ancestor categories.
+    """
+    is_offer = item.type == ItemType.OFFER
+    return (
+        case((is_offer, 1), else_=item.offer_count).label('offer_count'),
+        case((is_offer, item.price), else_=item.price_sum).label('price_sum'),
+    )
+
+
+def _moved_items(batch: FromClause) -> CTE:
+    """
+    Imported ``Items`` which change aggregates of categories:
+    new ones, moved to other parent and Offers with changed ``price``.
+    Current aggregates of existing ones are included.
+    """
+    return (
+        select(batch, Item.offer_count, Item.price_sum).
+        join(Item, Item.id == batch.c.id, isouter=True).
+        where(or_(
+            Item.id.is_(None),
+            Item.parent_id.is_distinct_from(batch.c.parent_id),
+            Item.price.is_distinct_from(batch.c.price),
+        )).
+        cte('moved')
+    )
+
+
+def _ancestors_walk(
+        start: FromClause,
+        stop: FromClause | None = None,
+        imported: FromClause | None = None,
+) -> CTE:
+    """
+    Recursively walks up from parents of ``start`` rows to all ancestors,
+    carrying weights of ``start`` rows summed per parent.
+
+    ``start`` must have ``parent_id`` and weight columns.
+    Walk doesn't go above categories with ``id`` in ``stop`` rows.
+    With ``imported`` batch, parents of its ``Items`` are taken from it.
+    """
+    walk = (
+        select(
+            start.c.parent_id.label('origin_id'),
+            start.c.parent_id.label('id'),
+            func.sum(start.c.offer_count).label('offer_count'),
+            func.sum(start.c.price_sum).label('price_sum'),
+        ).
+        where(start.c.parent_id.is_not(None)).
+        group_by(start.c.parent_id).
+        cte('walk', recursive=True)
+    )
+
+    # walked ``Items`` are categories, which are a few among all ``Items``
+    parent = aliased(Item, name='parent')
+    walked = walk.join(
+        parent,
+        and_(parent.id == walk.c.id, parent.type == ItemType.CATEGORY),
+        isouter=True,
+    )
+    parent_id = parent.parent_id
+    if imported is not None:
+        imported_parent = (
+            select(imported.c.id, imported.c.parent_id).
+            where(imported.c.type == ItemType.CATEGORY).
+            cte('imported_parent').
+            prefix_with('MATERIALIZED')
+        )
+        walked = walked.join(
+            imported_parent, imported_parent.c.id == walk.c.id, isouter=True
+        )
+        parent_id = case(
+            (imported_parent.c.id.is_not(None), imported_parent.c.parent_id),
+            else_=parent.parent_id,
+        )
+    step = (
+        select(walk.c.origin_id, parent_id, walk.c.offer_count, walk.c.price_sum).
+        select_from(walked).
+        where(parent_id.is_not(None))
+    )
+    if stop is not None:
+        step = (
+            step.
+            join(stop, stop.c.id == walk.c.id, isouter=True).
+            where(stop.c.id.is_(None))
+        )
+    # UNION stops recursion on cycles, origin_id keeps legal rows unique
+    return walk.union(step)
+
+
+def _update_aggregates(
+        walk: CTE, apply: Callable[[Any, Any], ColumnElement],
+        date: datetime | None = None,
+) -> Update:
+    """
+    Applies weights of ``walk`` rows to aggregates of walked categories
+    with ``apply`` operator: ``operator.add`` or ``operator.sub``.
+    Also sets their ``date``, if it is given.
+    """
+    deltas = (
+        select(
+            walk.c.id,
+            func.sum(walk.c.offer_count).label('offer_count'),
+            func.sum(walk.c.price_sum).label('price_sum'),
+        ).
+        group_by(walk.c.id).
+        subquery('deltas')
+    )
+    values = dict(
+        offer_count=apply(Item.offer_count, deltas.c.offer_count),
+        price_sum=apply(Item.price_sum, deltas.c.price_sum),
+        modified=func.clock_timestamp(),
+    )
+    if date is not None:
+        values['date'] = date
+    return (
+        update(Item).
+        where(Item.id == deltas.c.id).
+        values(**values).
+        execution_options(synchronize_session=False)
+    )
+
+
+def _detach_aggregates(batch: FromClause) -> Update:
+    """
+    Subtracts moved ``Items`` from aggregates of their current ancestors.
+
+    Walk from moved ``Item`` stops at moved ancestor category, so the latter
+    keeps weights of its not moved descendants only.
+    """
+    moved = _moved_items(batch)
+    detached = (
+        select(Item.id, Item.parent_id, *_weight(Item)).
+        join(moved, moved.c.id == Item.id).
+        cte('detached')
+    )
+    return _update_aggregates(
+        _ancestors_walk(detached, stop=moved), operator.sub
+    )
+
+
+def _attached_aggregates(batch: FromClause) -> Select:
+    """
+    Calculates weights which moved ``Items`` add to their new ancestors.
+
+    Must be run after ``_detach_aggregates()`` and before import itself:
+    parents of imported ``Items`` are taken from ``batch``, others - from table.
+    Returns ``(id, offer_count, price_sum)`` rows for ``_add_aggregates()``.
+    """
+    moved = _moved_items(batch)
+    is_offer = moved.c.type == ItemType.OFFER
+    attached = select(
+        moved.c.parent_id,
+        case(
+            (is_offer, 1),
+            else_=func.coalesce(moved.c.offer_count, 0),
+        ).label('offer_count'),
+        case(
+            (is_offer, moved.c.price),
+            else_=func.coalesce(moved.c.price_sum, 0),
+        ).label('price_sum'),
+    ).cte('attached')
+    walk = _ancestors_walk(attached, imported=batch)
+    return (
+        select(
+            walk.c.id,
+            func.sum(walk.c.offer_count).label('offer_count'),
+            func.sum(walk.c.price_sum).label('price_sum'),
+        ).
+        group_by(walk.c.id)
+    )
+
+
+def _add_aggregates(deltas: Sequence[Row]) -> Update:
+    """
+    Adds weights calculated by ``_attached_aggregates()`` to categories.
+    """
+    columns = (Item.id, Item.offer_count, Item.price_sum)
+    deltas_table = func.unnest(*(
+        cast(
+            bindparam(f'delta_{col.name}', [row[i] for row in deltas]),
+            ARRAY(col.type),
+        )
+        for i, col in enumerate(columns)
+    )).table_valued(
+        *(column(col.name, col.type) for col in columns)
+    ).render_derived().alias('deltas')
+    return (
+        update(Item).
+        where(Item.id == deltas_table.c.id).
+        values(
+            offer_count=Item.offer_count + deltas_table.c.offer_count,
+            price_sum=Item.price_sum + deltas_table.c.price_sum,
+            modified=func.clock_timestamp(),
+        ).
+        execution_options(synchronize_session=False)
+    )
+
+
+def _price(item: FromClause | type[Item]) -> ColumnElement:
+    """
+    Offer ``price`` or average price of nested Offers for category.
+    """
+    return case(
+        (item.offer_count > 0, func.div(item.price_sum, item.offer_count)),
+        else_=item.price,
+    )
+
+
+def _record_history(
+        batch: FromClause | None, extra_ids: Sequence[UUID],
+) -> Insert:
+    """
+    Saves current states of imported ``Items``, if there is ``batch``, and
+    ``Items`` with ``extra_ids`` to ``ItemHistory``.
+    """
+    ids = select(func.unnest(cast(
+        bindparam('extra_ids', extra_ids), ARRAY(Item.id.type)
+    )).label('id'))
+    if batch is not None:
+        # UNION instead of OR keeps a hash join for imports of any size
+        ids = union(select(batch.c.id), ids)
+    ids = ids.subquery('ids')
+    return insert(ItemHistory).from_select(
+        ('item_id', 'name', 'date', 'parent_id', 'type', 'price'),
+        select(
+            Item.id, Item.name, Item.date, Item.parent_id, Item.type,
+            _price(Item),
+        ).
+        join(ids, ids.c.id == Item.id)
+    )
@@ -0,0 +1,146 @@
+import logging
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import datetime
+from typing import NamedTuple
+from uuid import UUID, uuid4
+
+from aiohttp.web_app import Application
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class CachedNode(NamedTuple):
+    """
+    Serialized ``/nodes/{id}`` response and ``Item.modified`` it was read at
+    """
+    body: bytes
+    modified: datetime
+
+
+class NodeCache:
+    """
+    LRU cache of serialized ``/nodes/{id}`` responses, bounded by total size
+    of responses in bytes. ``max_size=0`` turns cache off.
+
+    Writers invalidate ``Items`` which responses they changed: ancestors and
+    descendants of written ones. Every invalidation increases ``version``,
+    responses read before it are not stored, as they may miss the write.
+    """
+
+    def __init__(self, max_size: int | str = 64 * 1024**2) -> None:
+        self.max_size = int(max_size)
+        self.version = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._responses: OrderedDict[UUID, CachedNode] = OrderedDict()
+
+    def get(self, item_id: UUID) -> CachedNode | None:
+        response = self._responses.get(item_id)
+        if response is None:
+            self.misses += 1
+            return None
+        self._responses.move_to_end(item_id)
+        self.hits += 1
+        return response
+
+    def put(self, item_id: UUID, response: CachedNode, version: int) -> None:
+        """
+        Stores ``response`` read at ``version``, evicts least recently used
+        responses above ``max_size``.
+        """
+        if version != self.version or len(response.body) > self.max_size:
+            return
+        self._pop(item_id)
+        self._responses[item_id] = response
+        self.size += len(response.body)
+        while self.size > self.max_size:
+            _, evicted = self._responses.popitem(last=False)
+            self.size -= len(evicted.body)
+            self.evictions += 1
+
+    def invalidate(self, item_ids: Iterable[UUID]) -> None:
+        """
+        Drops responses of written ``Items``, must be called after commit
+        """
+        self.version += 1
+        for item_id in item_ids:
+            if self._pop(item_id):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """
+        Drops all responses, must be called after commit
+        """
+        self.version += 1
+        self.invalidations += len(self._responses)
+        self._responses.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self._responses),
+            'size': self.size,
+            'max_size': self.max_size,
+        }
+
+    def _pop(self, item_id: UUID) -> bool:
+        response = self._responses.pop(item_id, None)
+        if response is None:
+            return False
+        self.size -= len(response.body)
+        return True
+
+
+class NodeCacheSync:
+    """
+    Keeps ``nodes_cache`` of each server process current with writes of
+    other processes, which don't know what it holds: writers notify
+    ``channel`` on commit with ``token`` of their process, see
+    ``ItemAccessor``, and other processes drop their whole cache.
+
+    If notifications connection is lost, cache is turned off, as writes of
+    other processes are not seen anymore.
+    """
+
+    def __init__(
+            self, nodes_cache: NodeCache, channel: str = 'nodes_cache',
+    ) -> None:
+        self.nodes_cache = nodes_cache
+        self.channel = channel
+        self.token = uuid4().hex
+        self._connection: AsyncConnection | None = None
+
+    async def start(self, _: Application) -> None:
+        self._connection = await Database.listen(
+            self.channel, self._notified, self._terminated,
+        )
+
+    async def stop(self, _: Application) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            # listener stays on connection, so it is not returned to pool
+            await connection.invalidate()
+
+    def _notified(self, payload: str) -> None:
+        # own writes invalidate written Items only
+        if payload != self.token:
+            self.nodes_cache.clear()
+
+    def _terminated(self) -> None:
+        if self._connection is None:
+            return  # closed by ``stop()``
+        logger.error('/nodes cache notifications connection is lost, '
+                     'cache is turned off')
+        self.nodes_cache.clear()
+        self.nodes_cache.max_size = 0
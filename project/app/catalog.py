@@ -0,0 +1,545 @@
+"""
+In-memory copy of the whole catalog, kept by each server process to answer
+``/nodes`` and ``/sales`` without database.
+
+``Items`` are stored by position in compact arrays instead of objects,
+see ``tests/benchmark_catalog.py`` for memory and load time per million.
+"""
+import asyncio
+import heapq
+import logging
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from collections.abc import AsyncIterable, Iterable, Sequence
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from aiohttp.web_app import Application
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .cache import NodeCache
+from .database import Database
+from .models import ItemRow, ItemType
+
+if TYPE_CHECKING:
+    from .accessors import ItemAccessor
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# ``types`` values, ``FREE`` positions are left by deleted ``Items``
+FREE, OFFER, CATEGORY = 0, 1, 2
+_TYPES = {ItemType.OFFER.value: OFFER, ItemType.CATEGORY.value: CATEGORY}
+_TYPE_NAMES = {OFFER: ItemType.OFFER.value, CATEGORY: ItemType.CATEGORY.value}
+# ``prices`` and ``parents`` value of ``None``
+NONE = -1
+
+
+class Catalog:
+    """
+    All ``Items`` by position: ``index`` maps text id to position,
+    ``parents`` are positions of parents, ``children`` are arrays of
+    children positions of each category. Offers positions are also kept in
+    ``sales`` ordered by ``(date, id)``. Category price is read from
+    aggregates, not computed.
+
+    Bootstraps by one read of all ``Items`` in a background task started on
+    startup, so server starts at once and catalog gets ``ready`` when the
+    read is done, see ``catalog_ready`` metric. Writers notify ``channel``
+    on commit with time of write and ids of deleted ``Items``, see
+    ``ItemAccessor``: on notification deleted subtrees are dropped and
+    ``Items`` with ``Item.modified`` after the latest one seen are read
+    again. Writes are serialized, so no later one is missed by that read.
+    Changed ``Items`` are invalidated in ``nodes_cache``.
+
+    Until bootstrap is done, or if notifications connection is lost,
+    catalog is not ``ready`` and views read database instead.
+    """
+
+    def __init__(
+            self,
+            channel: str = 'items',
+            fetch_size: int | str = 10000,
+            nodes_cache: NodeCache | None = None,
+    ) -> None:
+        self.channel = channel
+        self.fetch_size = int(fetch_size)
+        self.nodes_cache = nodes_cache or NodeCache(max_size=0)
+        self.ready = False
+        self.syncs = 0
+        self._items: 'ItemAccessor | None' = None
+        self._connection: AsyncConnection | None = None
+        self._lock = asyncio.Lock()
+        self._deleted: list[tuple[list[str], int]] = []
+        self._pending = False
+        self._task: asyncio.Task | None = None
+        self._bootstrap_task: asyncio.Task | None = None
+        self._listening = False
+        self._clear()
+
+    def _clear(self) -> None:
+        self.ids: list[str | None] = []
+        self.index: dict[str, int] = {}
+        self.names: list[str | None] = []
+        self.dates: list[datetime | None] = []
+        self.parents = array('i')
+        self.types = bytearray()
+        self.prices = array('q')
+        self.modified = array('q')
+        self.children: dict[int, array] = {}
+        self.sales = array('i')
+        self.free: list[int] = []
+        # latest ``Item.modified`` seen, in microseconds since epoch
+        self.watermark: int | None = None
+        # ``Items`` share ``date`` of their import, so it is stored once
+        self._dates: dict[datetime, datetime] = {}
+
+    async def start(self, app: Application) -> None:
+        """
+        Subscribes to notifications and starts loading all ``Items`` in
+        background. Notifications of writes made meanwhile are applied
+        after it.
+        """
+        self._items = app['items']
+        self._connection = await Database.listen(
+            self.channel, self._notified, self._terminated,
+        )
+        self._listening = True
+        self._bootstrap_task = asyncio.create_task(self._bootstrap())
+
+    async def _bootstrap(self) -> None:
+        try:
+            async with self._lock:
+                self._clear()
+                await self.load(
+                    self._items.iter_catalog_rows(fetch_size=self.fetch_size)
+                )
+        except Exception:
+            logger.exception('catalog load failed, reads go to database')
+            return
+        if not self._listening:
+            return  # notifications are lost while loading
+        self.ready = True
+        logger.info('catalog of %d items loaded', len(self.index))
+        # writes notified while loading, which it may have missed
+        self._schedule_sync()
+
+    async def stop(self, _: Application) -> None:
+        self.ready = False
+        self._listening = False
+        for task in (self._bootstrap_task, self._task):
+            if task is not None:
+                task.cancel()
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            # listener stays on connection, so it is not returned to pool
+            await connection.invalidate()
+
+    async def load(
+            self, chunks: Iterable[list[tuple]] | AsyncIterable[list[tuple]],
+    ) -> None:
+        """
+        Appends chunks of rows of ``ItemAccessor.iter_catalog_rows()`` to
+        empty catalog, column by column. Parents are linked and offers are
+        sorted once all rows are read.
+        """
+        parent_ids: list[str | None] = []
+        if isinstance(chunks, AsyncIterable):
+            async for rows in chunks:
+                parent_ids += self._extend(rows)
+        else:
+            for rows in chunks:
+                parent_ids += self._extend(rows)
+
+        index = self.index
+        self.parents = array('i', [
+            NONE if parent_id is None else index[parent_id]
+            for parent_id in parent_ids
+        ])
+        del parent_ids
+        self.children = {
+            position: array('i')
+            for position, type_ in enumerate(self.types) if type_ == CATEGORY
+        }
+        children = self.children
+        for position, parent in enumerate(self.parents):
+            if parent != NONE:
+                children[parent].append(position)
+        offers = [
+            position for position, type_ in enumerate(self.types)
+            if type_ == OFFER
+        ]
+        offers.sort(key=self._sale_key)
+        self.sales = array('i', offers)
+        self.watermark = max(self.modified, default=None)
+
+    def _extend(self, rows: Sequence[tuple]) -> tuple[str | None, ...]:
+        """
+        Appends ``rows`` to columns, returns their parent ids
+        """
+        if not rows:
+            return ()
+        ids, names, dates, parent_ids, types, prices, modified = zip(*rows)
+        start = len(self.ids)
+        self.ids += ids
+        self.index.update(zip(ids, range(start, start + len(ids))))
+        self.names += names
+        self.dates += map(self._dates.setdefault, dates, dates)
+        self.types += bytes(map(_TYPES.__getitem__, types))
+        self.prices += array('q', [
+            NONE if price is None else price for price in prices
+        ])
+        self.modified += array('q', modified)
+        return parent_ids
+
+    def _sale_key(self, position: int) -> tuple[datetime, str]:
+        return self.dates[position], self.ids[position]
+
+    def _notified(self, payload: str) -> None:
+        time, *deleted_ids = payload.split(' ')
+        if deleted_ids:
+            self._deleted.append((deleted_ids, int(time)))
+        self._schedule_sync()
+
+    def _schedule_sync(self) -> None:
+        self._pending = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sync_pending())
+
+    def _terminated(self) -> None:
+        if self._connection is None:
+            return  # closed by ``stop()``
+        logger.error('catalog notifications connection is lost, '
+                     'reads go to database')
+        self._listening = False
+        self.ready = False
+
+    async def _sync_pending(self) -> None:
+        # notifications coming while syncing are applied by one more sync
+        while self._pending and self.ready:
+            self._pending = False
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception('catalog sync failed, reads go to database')
+                self.ready = False
+
+    async def sync(
+            self, deleted_ids: Sequence[UUID] = (), time: int | None = None,
+    ) -> None:
+        """
+        Applies notified writes: drops subtrees of ``deleted_ids`` deleted at
+        ``time`` along with notified ones, then reads ``Items`` modified
+        after ``watermark``. Called by writers of this process too, so
+        their writes are seen by the next request.
+        """
+        if deleted_ids:
+            self._deleted.append(([str(i) for i in deleted_ids], time))
+        if not self.ready:
+            # applied after bootstrap
+            return
+        async with self._lock:
+            deleted, self._deleted = self._deleted, []
+            after = None
+            if self.watermark is not None:
+                after = _EPOCH + timedelta(microseconds=self.watermark)
+            rows = []
+            async for chunk in self._items.iter_catalog_rows(
+                    after, self.fetch_size,
+            ):
+                rows += chunk
+            # no await below: requests see catalog before or after sync
+            changed_ids = []
+            for ids, time in deleted:
+                changed_ids += self._delete(ids, time)
+            changed_ids += self._update(rows)
+            self.syncs += 1
+        self.nodes_cache.invalidate(map(UUID, changed_ids))
+
+    def _delete(self, ids: Sequence[str], time: int) -> list[str]:
+        """
+        Drops subtrees of ``ids`` deleted at ``time``. ``Items`` modified
+        later are kept: they are written after delete, and already read.
+        Returns ids of dropped ``Items``.
+        """
+        subtree = []
+        for item_id in ids:
+            position = self.index.get(item_id)
+            if position is None:
+                continue
+            walk = [position]
+            for position in walk:
+                walk += self.children.get(position, ())
+            subtree += walk
+        # ``ids`` may be nested into each other
+        dropped = [
+            position for position in dict.fromkeys(subtree)
+            if self.modified[position] < time
+        ]
+        if not dropped:
+            return []
+
+        dropped_set = set(dropped)
+        detached: defaultdict[int, set[int]] = defaultdict(set)
+        for position in dropped:
+            parent = self.parents[position]
+            if parent != NONE and parent not in dropped_set:
+                detached[parent].add(position)
+        self._detach(detached)
+        self._remove_sales(
+            [position for position in dropped if self.types[position] == OFFER]
+        )
+        dropped_ids = [self.ids[position] for position in dropped]
+        for position in dropped:
+            self._free(position)
+        return dropped_ids
+
+    def _free(self, position: int) -> None:
+        del self.index[self.ids[position]]
+        self.ids[position] = None
+        self.names[position] = None
+        self.dates[position] = None
+        self.parents[position] = NONE
+        self.types[position] = FREE
+        self.children.pop(position, None)
+        self.free.append(position)
+
+    def _update(self, rows: Sequence[tuple]) -> list[str]:
+        """
+        Stores read ``rows`` over existing ``Items`` or in new positions,
+        moves them to new parents and keeps ``sales`` ordered.
+        Returns ids of changed ``Items``.
+        """
+        index = self.index
+        changed_offers = [
+            position for position in map(index.get, (row[0] for row in rows))
+            if position is not None and self.types[position] == OFFER
+        ]
+        # offers are found in ``sales`` by their key before it is changed
+        self._remove_sales(changed_offers)
+
+        positions = []
+        for id_, name, date, _, type_, price, modified in rows:
+            position = index.get(id_)
+            if position is None:
+                position = self._allocate(id_, _TYPES[type_])
+            self.names[position] = name
+            self.dates[position] = self._dates.setdefault(date, date)
+            self.prices[position] = NONE if price is None else price
+            self.modified[position] = modified
+            self.watermark = max(self.watermark or 0, modified)
+            positions.append(position)
+
+        detached: defaultdict[int, set[int]] = defaultdict(set)
+        for position, row in zip(positions, rows):
+            parent_id = row[3]
+            # parent may be deleted by a write not notified yet
+            parent = NONE if parent_id is None else index.get(parent_id, NONE)
+            previous = self.parents[position]
+            if parent != previous:
+                if previous != NONE:
+                    detached[previous].add(position)
+                self.parents[position] = parent
+                if parent != NONE:
+                    self.children[parent].append(position)
+        self._detach(detached)
+        self._add_sales([
+            position for position in positions
+            if self.types[position] == OFFER
+        ])
+        return [row[0] for row in rows]
+
+    def _allocate(self, id_: str, type_: int) -> int:
+        if self.free:
+            position = self.free.pop()
+            self.ids[position] = id_
+            self.types[position] = type_
+        else:
+            position = len(self.ids)
+            self.ids.append(id_)
+            self.names.append(None)
+            self.dates.append(None)
+            self.parents.append(NONE)
+            self.types.append(type_)
+            self.prices.append(NONE)
+            self.modified.append(0)
+        self.index[id_] = position
+        if type_ == CATEGORY:
+            self.children[position] = array('i')
+        return position
+
+    def _detach(self, detached: dict[int, set[int]]) -> None:
+        """
+        Removes children from their former parents, each array is
+        rebuilt once however many children it loses
+        """
+        for parent, positions in detached.items():
+            self.children[parent] = array('i', [
+                child for child in self.children[parent]
+                if child not in positions
+            ])
+
+    def _remove_sales(self, positions: Sequence[int]) -> None:
+        if len(positions) * 64 < len(self.sales):
+            # each one is found by binary search, at cost of array shift
+            for position in positions:
+                del self.sales[bisect_left(
+                    self.sales, self._sale_key(position), key=self._sale_key,
+                )]
+        elif positions:
+            removed = set(positions)
+            self.sales = array('i', [
+                position for position in self.sales
+                if position not in removed
+            ])
+
+    def _add_sales(self, positions: list[int]) -> None:
+        if len(positions) * 64 < len(self.sales):
+            for position in positions:
+                insort(self.sales, position, key=self._sale_key)
+        elif positions:
+            # sorting of two sorted runs merges them
+            positions.sort(key=self._sale_key)
+            self.sales.extend(positions)
+            self.sales = array('i', sorted(self.sales, key=self._sale_key))
+
+    def get_modified(self, item_id: UUID) -> datetime | None:
+        """
+        Same as ``ItemAccessor.get_modified()``
+        """
+        position = self.index.get(str(item_id))
+        if position is None:
+            return None
+        return _EPOCH + timedelta(microseconds=self.modified[position])
+
+    def get_rows(self, item_id: UUID) -> list[tuple] | None:
+        """
+        Same as rows of ``ItemAccessor.iter_rows()`` all at once, depth-first
+        ordered: Offers follow their category at once, then subcategories
+        with their subtrees. ``None`` if ``Item`` is not found.
+        """
+        root = self.index.get(str(item_id))
+        if root is None:
+            return None
+        ids, names, dates = self.ids, self.names, self.dates
+        types, prices, parents = self.types, self.prices, self.parents
+        offer = ItemType.OFFER.value
+        rows = []
+        stack = [(root, 0)]
+        while stack:
+            position, depth = stack.pop()
+            parent = parents[position]
+            price = prices[position]
+            rows.append((
+                ids[position], names[position], dates[position],
+                None if parent == NONE else ids[parent],
+                _TYPE_NAMES[types[position]],
+                None if price == NONE else price,
+                depth,
+            ))
+            if types[position] == OFFER:
+                continue
+            parent_id = ids[position]
+            depth += 1
+            for child in self.children[position]:
+                if types[child] == OFFER:
+                    rows.append((
+                        ids[child], names[child], dates[child], parent_id,
+                        offer, prices[child], depth,
+                    ))
+                else:
+                    stack.append((child, depth))
+        return rows
+
+    def get_page_rows(
+            self,
+            item_id: UUID,
+            depth: int | None = None,
+            limit: int | None = None,
+            after: UUID | None = None,
+    ) -> list[tuple] | None:
+        """
+        Same as ``ItemAccessor.get_page_rows()``, ``None`` if ``Item`` is
+        not found. Only listed children of each category are sorted.
+        """
+        root = self.index.get(str(item_id))
+        if root is None:
+            return None
+        ids, types, parents = self.ids, self.types, self.parents
+        rows = []
+        stack = [(root, 0, 1)]
+        while stack:
+            position, level, rank = stack.pop()
+            children = self.children.get(position, ())
+            cut = types[position] == CATEGORY and level == depth
+            parent = parents[position]
+            price = self.prices[position]
+            rows.append((
+                ids[position], self.names[position], self.dates[position],
+                None if parent == NONE else ids[parent],
+                _TYPE_NAMES[types[position]],
+                None if price == NONE else price,
+                rank,
+                len(children) > 0 if cut else None,
+            ))
+            if cut or limit is not None and rank > limit:
+                continue
+            if level == 0 and after is not None:
+                after_id = str(after)
+                children = [
+                    child for child in children if ids[child] > after_id
+                ]
+            if limit is None:
+                listed = sorted(children, key=ids.__getitem__)
+            else:
+                listed = heapq.nsmallest(
+                    limit + 1, children, key=ids.__getitem__,
+                )
+            # popped in order of ids
+            stack.extend(
+                (child, level + 1, child_rank)
+                for child_rank, child in reversed(list(enumerate(listed, 1)))
+            )
+        return rows
+
+    def get_offers_in_date_range(
+            self,
+            start: datetime,
+            end: datetime,
+            limit: int | None = None,
+            after: tuple[datetime, UUID] | None = None,
+    ) -> list[ItemRow]:
+        """
+        Same as ``ItemAccessor.get_offers_in_date_range()``, ids are text
+        """
+        first = bisect_left(self.sales, (start,), key=self._sale_key)
+        if after is not None:
+            after_date, after_id = after
+            first = max(first, bisect_right(
+                self.sales, (after_date, str(after_id)), key=self._sale_key,
+            ))
+        last = bisect_right(self.sales, end, key=self.dates.__getitem__)
+        if limit is not None:
+            last = min(last, first + limit)
+        return [self._item_row(position) for position in self.sales[first:last]]
+
+    def _item_row(self, position: int) -> ItemRow:
+        parent = self.parents[position]
+        return ItemRow(
+            id=self.ids[position],
+            name=self.names[position],
+            date=self.dates[position],
+            parent_id=None if parent == NONE else self.ids[parent],
+            type=ItemType.OFFER.value,
+            price=self.prices[position],
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'items': len(self.index),
+            'syncs': self.syncs,
+            'ready': int(self.ready),
+        }
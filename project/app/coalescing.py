@@ -0,0 +1,90 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Sequence
+
+from .models import ItemRow
+
+Write = Callable[[list[Sequence[ItemRow]]], Awaitable[list[Exception | None]]]
+
+
+class ImportCoalescer:
+    """
+    Merges concurrent imports into one write, so they share transaction,
+    locks of common ancestor categories and commit.
+
+    Imports submitted within ``window`` seconds from the first one, or till
+    they have ``max_items`` rows, are passed to one ``write`` call in order
+    of submission. ``write`` applies them one after another and returns an
+    exception or ``None`` for each one, which is raised or returned by its
+    ``submit()``. Writes are made one at a time, imports submitted meanwhile
+    wait for the next one.
+    """
+
+    def __init__(
+            self,
+            write: Write,
+            window: float | str = 0.01,
+            max_items: int | str = 10000,
+    ) -> None:
+        self.write = write
+        self.window = float(window)
+        self.max_items = int(max_items)
+        self.imports = 0
+        self.writes = 0
+        self._pending: list[tuple[Sequence[ItemRow], asyncio.Future]] = []
+        self._pending_items = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, rows: Sequence[ItemRow]) -> None:
+        """
+        Imports ``rows`` along with other submitted imports
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((rows, future))
+        self._pending_items += len(rows)
+        if self._pending_items >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        await future
+
+    def stats(self) -> dict[str, int]:
+        return {'imports': self.imports, 'writes': self.writes}
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.create_task(self._write())
+        # loop keeps only weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self) -> None:
+        async with self._lock:
+            # imports submitted while previous write was made are taken too
+            pending = self._pending
+            if not pending:
+                return
+            self._pending = []
+            self._pending_items = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            try:
+                errors = await self.write([rows for rows, _ in pending])
+            except Exception as e:
+                errors = [e] * len(pending)
+            self.imports += len(pending)
+            self.writes += 1
+            for (_, future), error in zip(pending, errors):
+                # request may be cancelled by its client meanwhile
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
@@ -1,41 +1,194 @@
+import logging
 import os
+import time
+from collections.abc import AsyncIterator, Callable, Mapping
+from contextlib import asynccontextmanager
+from typing import Any
 
 from aiohttp.web_app import Application
+from sqlalchemy import exc, text
 from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import (
     create_async_engine, AsyncEngine, AsyncConnection, AsyncSession
 )
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# ``DB_*`` config options of connection pool
+POOL_OPTIONS: dict[str, Callable[[str], Any]] = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_timeout': float,
+    'pool_recycle': int,
+    'pool_pre_ping': _flag,
+}
+# ``DB_*`` config options of asyncpg statements caches: of asyncpg itself
+# and of SQLAlchemy asyncpg dialect, which is set in URL query
+STATEMENT_CACHE_OPTIONS = ('statement_cache_size', 'prepared_statement_cache_size')
+
+
+def database_url(db_config: Mapping[str, str]) -> URL:
+    """
+    Makes database URL from ``DB_*`` config options
+    """
+    url_options = {
+        name: value for name, value in db_config.items()
+        if name not in POOL_OPTIONS and name not in STATEMENT_CACHE_OPTIONS
+    }
+    query = {}
+    if 'prepared_statement_cache_size' in db_config:
+        query['prepared_statement_cache_size'] = (
+            db_config['prepared_statement_cache_size']
+        )
+    return URL.create('postgresql+asyncpg', **url_options, query=query)
+
+
+def engine_options(db_config: Mapping[str, str]) -> dict[str, Any]:
+    """
+    Makes ``create_async_engine()`` options from ``DB_*`` config options
+    """
+    options = {
+        name: parse(db_config[name])
+        for name, parse in POOL_OPTIONS.items() if name in db_config
+    }
+    if 'statement_cache_size' in db_config:
+        options['connect_args'] = {
+            'statement_cache_size': int(db_config['statement_cache_size'])
+        }
+    return options
+
+
+class MonitoredPool(AsyncAdaptedQueuePool):
+    """
+    Connection pool which counts checkouts and time spent waiting for them
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait_time = time.perf_counter() - start
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.checkouts += 1
+        return connection
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': self.overflow(),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_time': self.wait_time,
+            'max_wait_time': self.max_wait_time,
+        }
+
+
+def _create_engine(db_config: Mapping[str, str]) -> AsyncEngine:
+    return create_async_engine(
+        url=database_url(db_config),
+        future=True,  # TODO: remove after upgrading to SQLAlchemy 2.0
+        echo=os.getenv('DEBUG') is not None,
+        poolclass=MonitoredPool,
+        **engine_options(db_config),
+    )
+
+
+def _session_maker(engine: AsyncEngine) -> sessionmaker:
+    return sessionmaker(
+        engine,
+        expire_on_commit=False,
+        class_=AsyncSession,
+        future=True,  # TODO: remove after upgrading to SQLAlchemy 2.0
+    )
+
+
+# position in WAL as a number of bytes, ``NULL`` on primary for replay one
+_CURRENT_LSN = text("SELECT pg_current_wal_lsn() - '0/0'")
+_REPLAY_LSN = text("SELECT pg_last_wal_replay_lsn() - '0/0'")
 
 
 class Database:
     """
     Contains methods for creating database sessions
+
+    Reads may go to a replica, configured by ``REPLICA_*`` options, which
+    override ``DB_*`` ones. Replica is used only after it has replayed the last
+    write of this process, so it never returns data older than its writes.
     """
 
     _engine: AsyncEngine
     _session_maker: sessionmaker
+    _replica_engine: AsyncEngine | None = None
+    _replica_session_maker: sessionmaker | None = None
+    # LSN of the last write and the last one known to be replayed by replica,
+    # shared by subclasses, so are reads counters
+    _write_lsn = 0
+    _replica_lsn = 0
+    replica_reads = 0
+    primary_reads = 0
+    # reads moved to primary because replica is unavailable
+    replica_failures = 0
 
     @classmethod
     async def connect(cls, app: Application) -> None:
         """
         Prepares internal configuration which will be used later for DB sessions
         """
-        cls._engine = create_async_engine(
-            url=URL.create('postgresql+asyncpg', **app['config']['db']),
-            future=True,  # TODO: remove after upgrading to SQLAlchemy 2.0
-            echo=os.getenv('DEBUG') is not None,
-        )
-        cls._session_maker = sessionmaker(
-            cls._engine,
-            expire_on_commit=False,
-            class_=AsyncSession,
-            future=True,  # TODO: remove after upgrading to SQLAlchemy 2.0
-        )
+        db_config = app['config']['db']
+        cls._engine = _create_engine(db_config)
+        cls._session_maker = _session_maker(cls._engine)
+
+        replica_config = {
+            name: value for name, value in app['config']['replica'].items()
+            if value
+        }
+        if replica_config.get('host'):
+            cls._replica_engine = _create_engine(db_config | replica_config)
+            cls._replica_session_maker = _session_maker(cls._replica_engine)
 
     @classmethod
     async def disconnect(cls, _: Application) -> None:
         await cls._engine.dispose()
+        if cls._replica_engine is not None:
+            await cls._replica_engine.dispose()
+
+    @classmethod
+    def pool_stats(cls, replica: bool = False) -> dict[str, int | float] | None:
+        """
+        Connections pool state, checkouts and time spent waiting for them.
+        ``None`` for replica if it is not configured.
+        """
+        engine = cls._replica_engine if replica else cls._engine
+        if engine is None:
+            return None
+        return engine.sync_engine.pool.stats()
+
+    @classmethod
+    def read_stats(cls) -> dict[str, int]:
+        return {
+            'replica_reads': cls.replica_reads,
+            'primary_reads': cls.primary_reads,
+        }
 
     @classmethod
     def engine(cls) -> AsyncConnection:
@@ -50,3 +203,78 @@ class Database:
         Start autocommit session with ``SQLAlchemy`` ORM functions
         """
         return cls._session_maker.begin()
+
+    @classmethod
+    @asynccontextmanager
+    async def read_session(cls) -> AsyncIterator[AsyncSession]:
+        """
+        Same as ``session()`` for read-only queries: on replica, if it has
+        caught up with writes of this process, otherwise on primary.
+
+        Reads go to primary if replica is down or refuses connections too:
+        replica connection is taken before the session is given out, so
+        its errors are told apart from errors of reads.
+        """
+        if cls._replica_session_maker is not None:
+            db = cls._replica_session_maker()
+            try:
+                await db.connection()
+                caught_up = await cls._replica_caught_up(db)
+            except (OSError, exc.DBAPIError) as e:
+                await db.close()
+                Database.replica_failures += 1
+                logger.warning('replica is unavailable, reading primary: %r', e)
+            else:
+                if caught_up:
+                    # read-only: transaction is rolled back on close
+                    async with db:
+                        Database.replica_reads += 1
+                        yield db
+                        return
+                await db.close()
+        Database.primary_reads += 1
+        async with cls.session() as db:
+            yield db
+
+    @classmethod
+    async def track_write(cls) -> None:
+        """
+        Remembers LSN of committed write, so later reads see it on replica
+        """
+        if cls._replica_engine is None:
+            return
+        async with cls.engine() as db:
+            lsn = (await db.execute(_CURRENT_LSN)).scalar_one()
+        Database._write_lsn = max(Database._write_lsn, int(lsn))
+
+    @classmethod
+    async def listen(
+            cls, channel: str, callback: Callable[[str], None],
+            terminated: Callable[[], None],
+    ) -> AsyncConnection:
+        """
+        Subscribes ``callback`` to payloads of ``NOTIFY`` on ``channel`` of
+        primary, ``terminated`` is called if connection is lost. Connection
+        is held out of pool till it is closed by caller.
+        """
+        connection = await cls._engine.connect()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        await driver_connection.add_listener(
+            channel, lambda _, __, ___, payload: callback(payload),
+        )
+        driver_connection.add_termination_listener(lambda _: terminated())
+        return connection
+
+    @classmethod
+    async def _replica_caught_up(cls, db: AsyncSession) -> bool:
+        # replica is asked only when there are writes it is not known to have
+        write_lsn = Database._write_lsn
+        if Database._replica_lsn >= write_lsn:
+            return True
+        lsn = (await db.execute(_REPLAY_LSN)).scalar_one()
+        if lsn is None:
+            # not a standby: replica options point to primary itself
+            lsn = write_lsn
+        Database._replica_lsn = max(Database._replica_lsn, int(lsn))
+        return Database._replica_lsn >= write_lsn
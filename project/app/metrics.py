@@ -0,0 +1,330 @@
+"""
+Prometheus metrics of requests and of server internals.
+
+Every request is timed as a whole and by phases: request validation,
+database queries, response serialization and the rest of Python work.
+Label sets of known routes are registered on startup, so a request
+only looks up ready metric children.
+"""
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from aiohttp import hdrs
+from aiohttp.web_app import Application
+from aiohttp.web_middlewares import middleware
+from aiohttp.web_request import Request
+from aiohttp.web_response import Response, StreamResponse
+from aiohttp_apispec import validation_middleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+)
+from prometheus_client.core import (
+    CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+)
+from sqlalchemy import event
+
+from .database import Database
+
+PHASES = ('validation', 'db', 'serialization', 'other')
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+UNMATCHED_ROUTE = 'unmatched'
+# label of methods unknown to HTTP, any token is accepted as a method
+OTHER_METHOD = 'OTHER'
+
+
+class RequestTimings:
+    """
+    Seconds spent by current request in each phase but ``other``
+    """
+    __slots__ = ('validation', 'db', 'serialization')
+
+    def __init__(self) -> None:
+        self.validation = 0.0
+        self.db = 0.0
+        self.serialization = 0.0
+
+
+_timings: ContextVar[RequestTimings | None] = ContextVar(
+    'request_timings', default=None,
+)
+
+
+@contextmanager
+def timed_serialization() -> Iterator[None]:
+    """
+    Counts time spent in block as serialization of current request
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _timings.get()
+        if timings is not None:
+            timings.serialization += time.perf_counter() - start
+
+
+class _RouteMetrics:
+    __slots__ = ('labels', 'latency', 'phases', 'responses')
+
+    def __init__(self, metrics: 'Metrics', route: str, method: str) -> None:
+        self.labels = (route, method)
+        self.latency = metrics.latency.labels(route, method)
+        self.phases = [
+            metrics.phases.labels(route, method, phase) for phase in PHASES
+        ]
+        self.responses: dict[int, Any] = {}
+
+
+class Metrics:
+    """
+    Request metrics and collector of server internals, in own registry
+    """
+
+    def __init__(self, app: Application) -> None:
+        self.app = app
+        self.registry = CollectorRegistry(auto_describe=True)
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Requests latency',
+            ['route', 'method'], buckets=BUCKETS, registry=self.registry,
+        )
+        self.phases = Histogram(
+            'http_request_phase_duration_seconds',
+            'Requests latency by phase', ['route', 'method', 'phase'],
+            buckets=BUCKETS, registry=self.registry,
+        )
+        self.responses = Counter(
+            'http_responses', 'Responses by status',
+            ['route', 'method', 'status'], registry=self.registry,
+        )
+        self.registry.register(_InternalsCollector(app))
+        self._routes: dict[tuple[str, str], _RouteMetrics] = {}
+
+    def register_routes(self) -> None:
+        for route in self.app.router.routes():
+            path = route.resource.canonical if route.resource else None
+            methods = [route.method]
+            if route.method == hdrs.METH_ANY:
+                # class based view: its own methods
+                methods = [
+                    method for method in hdrs.METH_ALL
+                    if hasattr(route.handler, method.lower())
+                ]
+            for method in methods:
+                self.route(path, method)
+
+    def route(self, path: str | None, method: str) -> _RouteMetrics:
+        if method not in hdrs.METH_ALL:
+            method = OTHER_METHOD
+        key = (path or UNMATCHED_ROUTE, method)
+        route = self._routes.get(key)
+        if route is None:
+            route = self._routes[key] = _RouteMetrics(self, *key)
+        return route
+
+    def observe(self, route: _RouteMetrics, status: int, seconds: float,
+                timings: RequestTimings) -> None:
+        route.latency.observe(seconds)
+        other = seconds - timings.validation - timings.db - timings.serialization
+        validation, db, serialization, rest = route.phases
+        validation.observe(timings.validation)
+        db.observe(timings.db)
+        serialization.observe(timings.serialization)
+        rest.observe(max(other, 0.0))
+
+        responses = route.responses.get(status)
+        if responses is None:
+            responses = route.responses[status] = self.responses.labels(
+                *route.labels, str(status),
+            )
+        responses.inc()
+
+    def render(self) -> bytes:
+        return generate_latest(self.registry)
+
+
+class _InternalsCollector:
+    """
+    Exports stats of connection pools, ``/nodes`` cache, in-memory catalog,
+    coalesced imports, offloaded work, replica reads and event loop lag
+    on scrape
+    """
+
+    def __init__(self, app: Application) -> None:
+        self.app = app
+
+    def collect(self):
+        pools = {
+            'primary': Database.pool_stats(),
+            'replica': Database.pool_stats(replica=True),
+        } if _connected() else {}
+        for name, family in (
+                ('size', GaugeMetricFamily),
+                ('checked_out', GaugeMetricFamily),
+                ('overflow', GaugeMetricFamily),
+                ('checkouts', CounterMetricFamily),
+                ('timeouts', CounterMetricFamily),
+                ('wait_time', CounterMetricFamily),
+        ):
+            metric = family(
+                f'db_pool_{name}', f'Connections pool {name}', labels=['pool'],
+            )
+            for pool, stats in pools.items():
+                if stats is not None:
+                    metric.add_metric([pool], stats[name])
+            yield metric
+
+        reads = CounterMetricFamily(
+            'db_reads', 'Read sessions by database', labels=['database'],
+        )
+        for name, count in Database.read_stats().items():
+            reads.add_metric([name.removesuffix('_reads')], count)
+        yield reads
+        yield CounterMetricFamily(
+            'db_replica_failures',
+            'Read sessions moved to primary as replica is unavailable',
+            Database.replica_failures,
+        )
+
+        cache = self.app['nodes_cache'].stats()
+        for name in ('hits', 'misses', 'evictions', 'invalidations'):
+            yield CounterMetricFamily(
+                f'nodes_cache_{name}', f'/nodes cache {name}', cache[name],
+            )
+        for name in ('entries', 'size'):
+            yield GaugeMetricFamily(
+                f'nodes_cache_{name}', f'/nodes cache {name}', cache[name],
+            )
+
+        catalog = self.app['catalog']
+        if catalog is not None:
+            stats = catalog.stats()
+            yield GaugeMetricFamily(
+                'catalog_items', 'Items in memory catalog', stats['items'],
+            )
+            yield GaugeMetricFamily(
+                'catalog_ready', 'Memory catalog is ready', stats['ready'],
+            )
+            yield CounterMetricFamily(
+                'catalog_syncs', 'Memory catalog syncs', stats['syncs'],
+            )
+
+        coalescer = self.app['items'].coalescer
+        if coalescer is not None:
+            for name, count in coalescer.stats().items():
+                yield CounterMetricFamily(
+                    f'import_coalesced_{name}',
+                    f'Coalesced imports {name}', count,
+                )
+
+        offloaded = CounterMetricFamily(
+            'offload_calls', 'CPU-bound calls by place', labels=['place'],
+        )
+        for place, count in self.app['offloader'].stats().items():
+            offloaded.add_metric([place], count)
+        yield offloaded
+
+        loop_lag = self.app['loop_lag']
+        buckets = [(str(bound), count) for bound, count in loop_lag.buckets()]
+        buckets.append(('+Inf', loop_lag.count))
+        yield HistogramMetricFamily(
+            'event_loop_lag_seconds', 'Event loop lag',
+            buckets=buckets, sum_value=loop_lag.total,
+        )
+
+
+def _connected() -> bool:
+    return hasattr(Database, '_engine')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany) -> None:
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings.db += time.perf_counter() - context._metrics_start
+
+
+def _listen_engine(engine: Any) -> None:
+    event.listen(engine.sync_engine, 'before_cursor_execute',
+                 _before_cursor_execute)
+    event.listen(engine.sync_engine, 'after_cursor_execute',
+                 _after_cursor_execute)
+
+
+async def _start_metrics(app: Application) -> None:
+    app['metrics'].register_routes()
+    for engine in (Database._engine, Database._replica_engine):
+        if engine is not None:
+            _listen_engine(engine)
+
+
+async def metrics_view(request: Request) -> Response:
+    return Response(
+        body=request.app['metrics'].render(),
+        headers={'Content-Type': CONTENT_TYPE_LATEST},
+    )
+
+
+@middleware
+async def metrics_middleware(
+        request: Request,
+        handler: Callable[[Request], Awaitable[StreamResponse]]
+) -> StreamResponse:
+    """
+    Times request as a whole and by phases
+    """
+    start = time.perf_counter()
+    timings = RequestTimings()
+    token = _timings.set(timings)
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    finally:
+        _timings.reset(token)
+        route = request.app['metrics'].route(
+            request.match_info.route.resource
+            and request.match_info.route.resource.canonical,
+            request.method,
+        )
+        request.app['metrics'].observe(
+            route, status, time.perf_counter() - start, timings,
+        )
+
+
+@middleware
+async def timed_validation_middleware(
+        request: Request,
+        handler: Callable[[Request], Awaitable[StreamResponse]]
+) -> StreamResponse:
+    """
+    ``validation_middleware`` which time is counted as validation
+    """
+    start = time.perf_counter()
+
+    async def validated_handler(validated: Request) -> StreamResponse:
+        timings = _timings.get()
+        if timings is not None:
+            timings.validation += time.perf_counter() - start
+        return await handler(validated)
+
+    return await validation_middleware(request, validated_handler)
+
+
+def setup_metrics(app: Application) -> None:
+    """
+    Must be called after ``setup_store()``: engines are listened once
+    connected
+    """
+    app['metrics'] = Metrics(app)
+    app.on_startup.append(_start_metrics)
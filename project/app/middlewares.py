@@ -7,17 +7,22 @@ from aiohttp.web_exceptions import (
 from aiohttp.web_middlewares import middleware
 from aiohttp.web_request import Request
 from aiohttp.web_response import json_response, StreamResponse, Response
-from aiohttp_apispec import validation_middleware
 from marshmallow import ValidationError
 
-from .views import ItemNotFound
+from .metrics import metrics_middleware, timed_validation_middleware
+from .querylog import setup_query_log
+from .views import ItemNotFound, TooManyItems
 
 
 def setup_middlewares(app: Application) -> None:
+    # outermost, to see responses made by error_middleware
+    app.middlewares.append(metrics_middleware)
+    # SQL statements of requests, if turned on
+    setup_query_log(app)
     app.middlewares.append(error_middleware)
 
-    # marshmallow validator for requests:
-    app.middlewares.append(validation_middleware)
+    # marshmallow validator for requests, timed by metrics:
+    app.middlewares.append(timed_validation_middleware)
 
 
 @middleware
@@ -41,6 +46,11 @@ async def error_middleware(
             status_code=e.status_code,
             message="Item not found",
         )
+    except TooManyItems as e:
+        return json_error(
+            status_code=e.status_code,
+            message="Too many items",
+        )
     except HTTPException as e:
         return json_error(
             status_code=e.status_code,
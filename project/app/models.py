@@ -1,13 +1,16 @@
-from collections.abc import Mapping
+from datetime import datetime
+from decimal import Decimal
 from enum import Enum
-from typing import Any
+from typing import NamedTuple
+from uuid import UUID as PyUUID
 
 from alembic_utils.pg_function import PGFunction
 from alembic_utils.pg_trigger import PGTrigger
 from sqlalchemy import (
-    Column, CheckConstraint, ForeignKey, BigInteger, String, TIMESTAMP, event, orm
+    Column, CheckConstraint, ForeignKey, Index, BigInteger, Numeric, String,
+    TIMESTAMP, orm, text
 )
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 
 Base = orm.declarative_base()
 
@@ -17,6 +20,18 @@ class ItemType(str, Enum):
     OFFER = 'OFFER'
 
 
+class ItemRow(NamedTuple):
+    """
+    ``Item`` data columns provided by clients, imported without ORM objects
+    """
+    id: PyUUID
+    name: str
+    date: datetime
+    parent_id: PyUUID | None
+    type: str
+    price: int | None
+
+
 class Item(Base):
     """
     ORM class which maps to database table
@@ -25,13 +40,13 @@ class Item(Base):
     name = Column(String, nullable=False)
     date = Column(TIMESTAMP(timezone=True), nullable=False)
     parent_id: str | None = Column(
-        UUID(as_uuid=True), ForeignKey(id, ondelete='CASCADE'), index=True,
+        UUID(as_uuid=True), ForeignKey(id, ondelete='CASCADE'),
     )
     type = Column(
         String,
         # TODO: uncomment after Alembic 1.9+ implements column checks detection
         # CheckConstraint(
-        #     f"type in ('{ItemType.OFFER}', '{ItemType.CATEGORY}')",
+        #     f"type in ('{ItemType.OFFER.value}', '{ItemType.CATEGORY.value}')",
         #     name='type_value_check'
         # )
     )
@@ -44,88 +59,107 @@ class Item(Base):
         # )
     )
 
-    children = orm.relationship(
-        lambda: Item,
-        cascade='save-update, merge, expunge, delete',
-        passive_deletes=True,
+    # Category aggregates of all nested Offers, maintained by ``ItemAccessor``
+    offer_count: int = Column(BigInteger, nullable=False, server_default='0')
+    price_sum: Decimal = Column(Numeric, nullable=False, server_default='0')
+    # Time of the last write to Item or its descendants, maintained by
+    # ``ItemAccessor``: validator of ``/nodes`` responses, unlike ``date``
+    # it changes on deletes too and never goes back
+    modified: datetime = Column(
+        TIMESTAMP(timezone=True), nullable=False,
+        server_default=text('clock_timestamp()'),
     )
+    # Materialized path: ids of all ancestors from root and of Item itself,
+    # maintained by ``ItemAccessor``. Subtree of Item is rows which path
+    # contains its id, ancestors are ids in its path: both by one query
+    path: list[PyUUID] = Column(ARRAY(UUID(as_uuid=True)), nullable=False)
 
     __tablename__ = 'items'
     __table_args__ = (
         CheckConstraint(
-            f"type != '{ItemType.CATEGORY}' OR price IS NULL",
+            f"type != '{ItemType.CATEGORY.value}' OR price IS NULL",
             name='category_price_is_null',
         ),
         CheckConstraint(
-            f"type != '{ItemType.OFFER}' OR price IS NOT NULL",
+            f"type != '{ItemType.OFFER.value}' OR price IS NOT NULL",
             name='offer_price_is_not_null',
         ),
 
         # TODO: move to column after Alembic 1.9+ implements detection there
         CheckConstraint(
-            f"type in ('{ItemType.OFFER}', '{ItemType.CATEGORY}')",
+            f"type in ('{ItemType.OFFER.value}', '{ItemType.CATEGORY.value}')",
             name='type_value_check'
         ),
         # TODO: move to column after Alembic 1.9+ implements detection there
         CheckConstraint(
             'price >= 0',
             name='price_value_check'
-        )
+        ),
+
+        # for Offers in date range, ordered by (date, id) for pagination
+        Index(
+            'ix_items_offer_date_id', date, id,
+            postgresql_where=text(f"type = '{ItemType.OFFER.value}'"),
+        ),
+        # for walks over categories tree without scanning all Offers
+        Index(
+            'ix_items_category_id_parent_id', id, parent_id,
+            postgresql_where=text(f"type = '{ItemType.CATEGORY.value}'"),
+        ),
+        # for children of category ordered by id for pagination, and for
+        # cascade deletes by parent_id
+        Index('ix_items_parent_id_id', parent_id, id),
+        # for subtrees by path overlap: ``path && ARRAY[ids]``
+        Index('ix_items_path', path, postgresql_using='gin'),
+        # for ``Catalog`` syncs: ``Items`` modified after the last one seen
+        Index('ix_items_modified', modified),
     )
 
+    # columns provided by clients, the rest are maintained by the database
+    data_columns = ItemRow._fields
+
     def __repr__(self) -> str:
         return f'Item({self.type}, {self.name}, {self.price}, {self.date})'
 
-    def dict(self) -> Mapping[str, Any]:
-        """
-        Converts ``Item`` columns and values to ``dict``
-        """
-        return {
-            col.name: getattr(self, col.name) for col in self.__table__.columns
-        }
-
-    def fulfill_category_prices(self) -> None:
-        """
-        We don't store price data for Category, so calculate it on demand
-        """
-        if self.type == ItemType.CATEGORY:
-            self._count_category_offers_and_prices_sum()
-
-    def _count_category_offers_and_prices_sum(self) -> tuple[int, int]:
-        """
-        Recursively calculates average ``price`` of child Offers to update Category ``price``
-        """
-        count = 0
-        price_sum = 0
-        for child in self.children:
-            child: Item
-            if child.type == ItemType.OFFER:
-                count += 1
-                price_sum += child.price
-            elif child.type == ItemType.CATEGORY:
-                cat_count, cat_sum = child._count_category_offers_and_prices_sum()
-                count += cat_count
-                price_sum += cat_sum
-
-        if count > 0:
-            self.price = price_sum // count
-        return count, price_sum
-
-
-@event.listens_for(Item, 'load')
-def load_children(item: Item, _: orm.QueryContext) -> None:
+
+class ItemHistory(Base):
     """
-    Function to preload all ``Item`` children to avoid SQLAlchemy's lazy loading
+    ORM class which maps to append-only table of ``Item`` states.
+
+    Category ``price`` is an average price of its Offers at that ``date``.
     """
-    if item.type == ItemType.OFFER:
-        orm.attributes.set_committed_value(item, 'children', None)
-    elif item.type == ItemType.CATEGORY:
-        orm.attributes.set_committed_value(item, 'children', item.children)
+    id = Column(BigInteger, primary_key=True)
+    item_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey(Item.id, ondelete='CASCADE'),
+        nullable=False,
+    )
+    name = Column(String, nullable=False)
+    date = Column(TIMESTAMP(timezone=True), nullable=False)
+    parent_id = Column(UUID(as_uuid=True))
+    type = Column(String, nullable=False)
+    price = Column(BigInteger)
+
+    __tablename__ = 'item_history'
+    __table_args__ = (
+        Index('ix_item_history_item_id_date', item_id, date),
+    )
+
+    def __repr__(self) -> str:
+        return f'ItemHistory({self.type}, {self.name}, {self.price}, {self.date})'
+
+
+# Transaction-local setting which turns off row-by-row triggers,
+# ``ItemAccessor`` validates and updates the whole batch by itself instead
+BATCH_MODE_SETTING = 'mega_market.batch_mode'
+NOT_IN_BATCH_MODE = f"current_setting('{BATCH_MODE_SETTING}', true) IS DISTINCT FROM 'on'"
 
 
 def item_database_triggers():
     """
     Various PostgreSQL database trigger validations.
+
+    Triggers are skipped in batch mode, see ``BATCH_MODE_SETTING``.
     """
     return {
 
@@ -166,7 +200,7 @@ def item_database_triggers():
             on_entity=f'public.{Item.__tablename__}',
             definition=f'''
                 AFTER INSERT OR UPDATE ON {Item.__tablename__} FOR EACH ROW
-                WHEN (NEW.parent_id IS NOT NULL)
+                WHEN (NEW.parent_id IS NOT NULL AND {NOT_IN_BATCH_MODE})
                 EXECUTE PROCEDURE update_category_date();
             '''
         ),
@@ -204,9 +238,9 @@ def item_database_triggers():
                 RETURNS TRIGGER AS
                 $$
                 BEGIN
-                if get_item_type(NEW.parent_id) != '{ItemType.CATEGORY}' THEN
+                if get_item_type(NEW.parent_id) != '{ItemType.CATEGORY.value}' THEN
                     RAISE EXCEPTION
-                        'Parent must be - {ItemType.CATEGORY}'
+                        'Parent must be - {ItemType.CATEGORY.value}'
                         USING ERRCODE = 'check_violation';
                 END IF;
                 RETURN NEW;
@@ -220,6 +254,7 @@ def item_database_triggers():
             on_entity=f'public.{Item.__tablename__}',
             definition=f'''
                 AFTER INSERT OR UPDATE ON {Item.__tablename__} FOR EACH ROW
+                WHEN ({NOT_IN_BATCH_MODE})
                 EXECUTE PROCEDURE check_parent_is_category();
             '''
         ),
@@ -0,0 +1,126 @@
+import asyncio
+import bisect
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from aiohttp.web_app import Application
+
+T = TypeVar('T')
+
+EXECUTORS = ('none', 'thread', 'process')
+
+
+class Offloader:
+    """
+    Runs CPU-bound functions out of the event loop, in a pool of ``workers``
+    threads or processes by ``executor`` kind, once their input has at least
+    ``threshold`` elements. Smaller inputs and ``executor='none'`` run inline:
+    handing them over to a pool costs more than it saves.
+
+    Threads still share GIL with the loop, but it takes GIL back every switch
+    interval. Processes don't block the loop at all, but their arguments and
+    results are pickled, so they have to be plain data.
+    """
+
+    def __init__(
+            self,
+            executor: str = 'thread',
+            workers: int | str = 2,
+            threshold: int | str = 5000,
+    ) -> None:
+        if executor not in EXECUTORS:
+            raise ValueError(f'unknown executor: {executor}')
+        self.kind = executor
+        self.workers = int(workers)
+        self.threshold = int(threshold)
+        self.inline = 0
+        self.offloaded = 0
+        self._executor: Executor | None = None
+
+    async def start(self, _: Application) -> None:
+        if self.kind == 'thread':
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix='offload',
+            )
+        elif self.kind == 'process':
+            # forking a process with running loop and open connections
+            # is unsafe, workers start clean
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'),
+            )
+
+    async def stop(self, _: Application) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    async def run(self, size: int, func: Callable[..., T], *args: Any) -> T:
+        """
+        Returns ``func(*args)``, ``size`` is a number of elements of input
+        """
+        if self._executor is None or size < self.threshold:
+            self.inline += 1
+            return func(*args)
+        self.offloaded += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def stats(self) -> dict[str, int]:
+        return {'inline': self.inline, 'offloaded': self.offloaded}
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than planned a coroutine
+    sleeping for ``interval`` seconds wakes up. Lags are counted in
+    cumulative ``BUCKETS`` by upper bound in seconds.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+    def __init__(self, interval: float | str = 0.05) -> None:
+        self.interval = float(interval)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self._task: asyncio.Task | None = None
+
+    def observe(self, lag: float) -> None:
+        self.count += 1
+        self.total += lag
+        self.max = max(self.max, lag)
+        self._bucket_counts[bisect.bisect_left(self.BUCKETS, lag)] += 1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.observe(max(0.0, loop.time() - start - self.interval))
+
+    async def start(self, _: Application | None = None) -> None:
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, _: Application | None = None) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    def buckets(self) -> list[tuple[float, int]]:
+        """
+        Cumulative counts of lags not greater than each bucket bound
+        """
+        counts, cumulative = [], 0
+        for bound, count in zip(self.BUCKETS, self._bucket_counts):
+            cumulative += count
+            counts.append((bound, cumulative))
+        return counts
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+        }
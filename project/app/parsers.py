@@ -0,0 +1,142 @@
+import codecs
+import json
+import re
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Any
+
+from aiohttp import StreamReader
+from aiohttp.web_exceptions import HTTPRequestEntityTooLarge
+from marshmallow import ValidationError
+
+from .models import ItemRow
+from .schemas import ShopUnitImport, ShopUnitImportRequest
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class ImportRequestStream:
+    """
+    Incremental parser of ``ShopUnitImportRequest`` JSON body.
+
+    Iteration reads body by chunks and yields validated ``ItemRow`` of
+    ``items`` one by one, so memory doesn't depend on body size.
+    ``updateDate`` may follow ``items`` in body: rows yielded before it have
+    ``date=None``, and ``update_date`` is known after iteration only.
+    Body above ``max_size`` bytes is rejected, as aiohttp does for bodies
+    read whole.
+    """
+
+    read_size = 2**16
+    max_value_size = 2**20
+
+    _item_schema = ShopUnitImport()
+    _date_field = ShopUnitImportRequest._declared_fields['update_date']
+
+    def __init__(self, content: StreamReader, max_size: int | None = None):
+        self.update_date: datetime | None = None
+        self.max_size = max_size
+        self._content = content
+        self._size = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    async def __aiter__(self) -> AsyncIterator[ItemRow]:
+        fields = {'items', 'updateDate'}
+        await self._expect('{')
+        end = await self._next_is('}')
+        while not end:
+            key = await self._value()
+            await self._expect(':')
+            if not isinstance(key, str):
+                raise ValidationError('invalid JSON')
+            if key not in fields:
+                raise ValidationError(f'unknown or repeated field: {key}')
+            fields.remove(key)
+            if key == 'items':
+                async for row in self._items():
+                    yield row
+            else:
+                self.update_date = self._date_field.deserialize(
+                    await self._value()
+                )
+            end = await self._next_is('}')
+            if not end:
+                await self._expect(',')
+        if fields:
+            raise ValidationError(f'missing fields: {", ".join(fields)}')
+        if await self._peek() != '':
+            raise ValidationError('invalid JSON')
+
+    async def _items(self) -> AsyncIterator[ItemRow]:
+        await self._expect('[')
+        if await self._next_is(']'):
+            return
+        while True:
+            item = self._item_schema.load(await self._value())
+            yield ShopUnitImportRequest.make_row(item, self.update_date)
+            if await self._next_is(']'):
+                return
+            await self._expect(',')
+
+    async def _fill(self) -> bool:
+        """
+        Reads next chunk of body to buffer, returns ``False`` at end of body
+        """
+        if self._eof:
+            return False
+        if len(self._buffer) - self._pos > self.max_value_size:
+            raise ValidationError('too large JSON value')
+        chunk = await self._content.read(self.read_size)
+        self._size += len(chunk)
+        if self.max_size is not None and self._size > self.max_size:
+            raise HTTPRequestEntityTooLarge(
+                max_size=self.max_size, actual_size=self._size,
+            )
+        self._eof = not chunk
+        try:
+            text = self._decoder.decode(chunk, final=self._eof)
+        except UnicodeDecodeError:
+            raise ValidationError('invalid JSON')
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+
+    async def _peek(self) -> str:
+        """
+        Skips whitespaces, returns next char or empty string at end of body
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                return ''
+
+    async def _next_is(self, char: str) -> bool:
+        if await self._peek() == char:
+            self._pos += 1
+            return True
+        return False
+
+    async def _expect(self, char: str) -> None:
+        if not await self._next_is(char):
+            raise ValidationError('invalid JSON')
+
+    async def _value(self) -> Any:
+        await self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if await self._fill():
+                    continue
+                raise ValidationError('invalid JSON')
+            # number at the end of buffer may continue in the next chunk
+            if end == len(self._buffer) and await self._fill():
+                continue
+            self._pos = end
+            return value
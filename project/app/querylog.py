@@ -0,0 +1,131 @@
+"""
+Instrumentation of SQL statements executed by each request, to catch
+N+1 patterns and slow requests. Turned on by ``MONITOR_QUERIES``.
+
+Requests above ``MONITOR_QUERY_BUDGET`` statements or
+``MONITOR_DURATION_BUDGET`` seconds are logged with fingerprints of their
+statements. Number of statements is also returned in ``X-Query-Count``
+header, so tests can assert budgets of endpoints; streamed responses count
+statements made before they are started.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+
+from aiohttp.web_app import Application
+from aiohttp.web_middlewares import middleware
+from aiohttp.web_request import Request
+from aiohttp.web_response import StreamResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .database import _flag
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+logger = logging.getLogger(__name__)
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_lists = re.compile(r'\((?:\s*(?:\?|%s|\$\d+)\s*,)+\s*(?:\?|%s|\$\d+)\s*\)')
+_spaces = re.compile(r'\s+')
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Statement with literals, parameters lists and whitespace normalized,
+    so same queries with different values look the same
+    """
+    statement = _lists.sub('(...)', statement)
+    statement = _literals.sub('?', statement)
+    return _spaces.sub(' ', statement).strip()
+
+
+class RequestQueries:
+    __slots__ = ('statements', 'seconds')
+
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+        self.seconds = 0.0
+
+
+_queries: ContextVar[RequestQueries | None] = ContextVar(
+    'request_queries', default=None,
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany) -> None:
+    queries = _queries.get()
+    if queries is not None:
+        queries.statements.append(statement)
+        context._querylog_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany) -> None:
+    queries = _queries.get()
+    if queries is not None:
+        queries.seconds += time.perf_counter() - context._querylog_start
+
+
+def query_log_middleware(
+        query_budget: int, duration_budget: float,
+) -> Callable[..., Awaitable[StreamResponse]]:
+    @middleware
+    async def query_log(
+            request: Request,
+            handler: Callable[[Request], Awaitable[StreamResponse]]
+    ) -> StreamResponse:
+        start = time.perf_counter()
+        queries = RequestQueries()
+        token = _queries.set(queries)
+        try:
+            response = await handler(request)
+        finally:
+            _queries.reset(token)
+            seconds = time.perf_counter() - start
+            count = len(queries.statements)
+            if count > query_budget or seconds > duration_budget:
+                fingerprints = Counter(map(fingerprint, queries.statements))
+                logger.warning(
+                    '%s %s: %d statements in %.3fs, %.3fs in database\n%s',
+                    request.method, request.path, count, seconds,
+                    queries.seconds,
+                    '\n'.join(
+                        f'{times:5d} x {statement}'
+                        for statement, times in fingerprints.most_common()
+                    ),
+                )
+        if not response.prepared:
+            response.headers[QUERY_COUNT_HEADER] = str(count)
+        return response
+
+    return query_log
+
+
+async def _count_streamed_queries(request: Request,
+                                  response: StreamResponse) -> None:
+    # responses started by handler itself, before middleware gets them
+    queries = _queries.get()
+    if queries is not None:
+        response.headers[QUERY_COUNT_HEADER] = str(len(queries.statements))
+
+
+def setup_query_log(app: Application) -> None:
+    """
+    Adds ``query_log`` middleware if instrumentation is turned on
+    """
+    config = app['config']['monitor']
+    if not _flag(config.get('queries', 'false')):
+        return
+    app.middlewares.append(query_log_middleware(
+        int(config.get('query_budget', 10)),
+        float(config.get('duration_budget', 1.0)),
+    ))
+    app.on_response_prepare.append(_count_streamed_queries)
+    # all engines, including not yet created by ``Database.connect``
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
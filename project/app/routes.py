@@ -1,14 +1,34 @@
 from aiohttp import web
 from aiohttp.web_app import Application
 
-from . import views
+from . import metrics, views
+from .database import _flag
 
 
 def setup_routes(app: Application) -> None:
+    streaming = int(app['config']['import'].get('stream_chunk_size', 0)) > 0
+    nodes_streaming = int(
+        app['config']['nodes'].get('stream_threshold', 0)
+    ) > 0
+    nodes_view = views.NodesStreamView if nodes_streaming else views.NodesView
+    children_view = views.ChildrenView
+    nodes_batch_view = views.NodesBatchView
+    sales_view = views.SalesView
+    if _flag(app['config']['catalog'].get('enabled', 'false')):
+        nodes_view, sales_view = views.NodesCatalogView, views.SalesCatalogView
+        children_view = views.ChildrenCatalogView
+        nodes_batch_view = views.NodesBatchCatalogView
     app.add_routes([
-        web.view('/imports', views.ImportsView),
+        web.view(
+            '/imports',
+            views.ImportsStreamView if streaming else views.ImportsView,
+        ),
+        web.view('/delete', views.BulkDeleteView),
         web.view('/delete/{id}', views.DeleteView),
-        web.view('/nodes/{id}', views.NodesView),
-        web.view('/sales', views.SalesView),
+        web.view('/nodes', nodes_batch_view),
+        web.view('/nodes/{id}', nodes_view),
+        web.view('/nodes/{id}/children', children_view),
+        web.view('/sales', sales_view),
         web.view('/node/{id}/statistic', views.StatisticView),
+        web.get('/metrics', metrics.metrics_view),
     ])
@@ -1,12 +1,54 @@
-from collections.abc import Generator, Mapping
+import base64
+from collections.abc import Mapping
 from datetime import datetime
 from typing import Any, MutableMapping
+from uuid import UUID
 
 from marshmallow import (
     Schema, fields, validate, validates_schema, ValidationError, post_dump
 )
 
-from .models import Item, ItemType
+from .models import ItemRow, ItemType
+
+
+class Cursor(fields.Field):
+    """
+    Opaque pagination cursor which keeps ``(date, id)`` of the last ``Item``
+    """
+
+    def _serialize(
+            self, value: tuple[datetime, UUID] | None, *_, **__
+    ) -> str | None:
+        if value is None:
+            return None
+        date, item_id = value
+        raw = f'{date.isoformat()} {item_id}'.encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def _deserialize(self, value: str, *_, **__) -> tuple[datetime, UUID]:
+        try:
+            raw = base64.urlsafe_b64decode(value.encode()).decode()
+            date, item_id = raw.split(' ')
+            return datetime.fromisoformat(date), UUID(item_id)
+        except ValueError:
+            raise ValidationError('invalid cursor')
+
+
+class ChildrenCursor(fields.Field):
+    """
+    Opaque pagination cursor which keeps ``id`` of the last listed child
+    """
+
+    def _serialize(self, value: UUID | str | None, *_, **__) -> str | None:
+        if value is None:
+            return None
+        return base64.urlsafe_b64encode(str(value).encode()).decode()
+
+    def _deserialize(self, value: str, *_, **__) -> UUID:
+        try:
+            return UUID(base64.urlsafe_b64decode(value.encode()).decode())
+        except ValueError:
+            raise ValidationError('invalid cursor')
 
 
 class ShopUnit(Schema):
@@ -89,6 +131,24 @@ class Id(ShopUnit):
         fields = ('id',)
 
 
+class ShopUnitPage(ShopUnit):
+    children = fields.List(
+        fields.Nested(lambda: ShopUnitPage()),
+        nullable=True,
+        description=''
+        'Дочерние товары\\категории в порядке id, не более limit и до глубины'
+        ' depth. Для товаров поле равно null.'
+    )
+    next_cursor = ChildrenCursor(
+        data_key='nextCursor',
+        allow_none=True,
+        description=''
+        'Только для категорий: курсор для /nodes/{id}/children, с которого'
+        ' продолжается список не вошедших в children дочерних элементов.'
+        ' Равен null, если в children перечислены все дочерние элементы.',
+    )
+
+
 class ShopUnitImport(ShopUnit):
     class Meta:
         exclude = ('date', 'children')
@@ -115,11 +175,77 @@ class ShopUnitImportRequest(Schema):
             raise ValidationError('multiple items with same id')
 
     @staticmethod
-    def make_orm_objects(
-            data: Mapping[str, datetime | list[Any]], **_
-    ) -> Generator[Item]:
+    def make_row(item: Mapping[str, Any], date: datetime | None) -> ItemRow:
+        return ItemRow(
+            item['id'], item['name'], date,
+            item.get('parent_id'), item['type'], item.get('price'),
+        )
+
+    @classmethod
+    def make_rows(cls, data: Mapping[str, datetime | list[Any]]) -> list[ItemRow]:
         date = data['update_date']
-        return (Item(date=date, **item_dict) for item_dict in data['items'])
+        return [cls.make_row(item, date) for item in data['items']]
+
+    class Meta:
+        ordered = True
+
+
+class DeleteRequest(Schema):
+    ids = fields.List(
+        fields.UUID(),
+        required=True,
+        nullable=False,
+        validate=validate.Length(min=1, max=10_000),
+        description='Идентификаторы удаляемых элементов',
+        example=['3fa85f64-5717-4562-b3fc-2c963f66a333'],
+    )
+    update_date = fields.AwareDateTime(
+        data_key='updateDate',
+        nullable=False,
+        description=''
+        'Время удаления. Если задано, им обновляется время всех категорий,'
+        ' из которых удалены элементы',
+        example='2022-05-28T21:12:01.000Z',
+    )
+
+    @validates_schema
+    def validate_unique_ids(self, data, **_):
+        if len(data['ids']) != len(set(data['ids'])):
+            raise ValidationError('multiple same ids')
+
+
+class DeleteResponse(Schema):
+    not_found = fields.List(
+        fields.UUID(),
+        data_key='notFound',
+        description='Идентификаторы элементов, которые не найдены',
+    )
+
+
+class NodesRequest(DeleteRequest):
+    ids = fields.List(
+        fields.UUID(),
+        required=True,
+        nullable=False,
+        validate=validate.Length(min=1, max=100),
+        description='Идентификаторы получаемых элементов',
+        example=['3fa85f64-5717-4562-b3fc-2c963f66a333'],
+    )
+
+    class Meta:
+        exclude = ('update_date',)
+
+
+class NodesResponse(Schema):
+    items = fields.List(
+        fields.Nested(ShopUnit),
+        description='Найденные элементы в порядке запроса',
+    )
+    not_found = fields.List(
+        fields.UUID(),
+        data_key='notFound',
+        description='Идентификаторы элементов, которые не найдены',
+    )
 
     class Meta:
         ordered = True
@@ -133,6 +259,41 @@ class Date(Schema):
     )
 
 
+class SalesQuery(Date):
+    limit = fields.Int(
+        validate=validate.Range(min=1, max=10_000),
+        description='Максимальное количество товаров в ответе',
+        example=100,
+    )
+    cursor = Cursor(
+        description='Курсор следующей страницы из поля nextCursor ответа',
+    )
+
+    class Meta:
+        ordered = True
+
+
+class ChildrenQuery(Schema):
+    limit = fields.Int(
+        validate=validate.Range(min=1, max=10_000),
+        description='Максимальное количество дочерних элементов категории',
+        example=100,
+    )
+    cursor = ChildrenCursor(
+        description='Курсор следующей страницы из поля nextCursor ответа',
+    )
+
+
+class NodesQuery(ChildrenQuery):
+    depth = fields.Int(
+        validate=validate.Range(min=0),
+        description=''
+        'Глубина вложенности возвращаемых дочерних элементов, 0 - только сам'
+        ' элемент',
+        example=1,
+    )
+
+
 class DateStartEnd(Schema):
     date_start = fields.AwareDateTime(
         data_key='dateStart',
@@ -147,6 +308,12 @@ class DateStartEnd(Schema):
         example='2022-05-28T21:12:01.000Z',
     )
 
+    @validates_schema
+    def validate_start_before_end(self, data: Mapping[str, Any], **_):
+        date_start, date_end = data.get('date_start'), data.get('date_end')
+        if date_start and date_end and date_start >= date_end:
+            raise ValidationError('dateStart must be before dateEnd')
+
     class Meta:
         ordered = True
 
@@ -162,6 +329,35 @@ class ShopUnitStatisticResponse(Schema):
         description='Список в произвольном порядке',
     )
 
+    class Meta:
+        ordered = True
+
+
+class ShopUnitSalesResponse(ShopUnitStatisticResponse):
+    next_cursor = Cursor(
+        data_key='nextCursor',
+        allow_none=True,
+        description=''
+        'Курсор следующей страницы, только при заданном limit.'
+        ' Равен null на последней странице.',
+    )
+
+
+class ShopUnitChildrenResponse(Schema):
+    items = fields.List(
+        fields.Nested(ShopUnitStatisticUnit),
+        description='Дочерние элементы в порядке id',
+    )
+    next_cursor = ChildrenCursor(
+        data_key='nextCursor',
+        allow_none=True,
+        description=''
+        'Курсор следующей страницы, равен null на последней странице.',
+    )
+
+    class Meta:
+        ordered = True
+
 
 class Error(Schema):
     code = fields.Integer(required=True, nullable=False)
@@ -0,0 +1,259 @@
+"""
+Precompiled serializers of ``schemas`` response shapes for large responses.
+
+Output is the same JSON as marshmallow schemas dump, field by field and
+in the same order, but rendered by ``orjson``.
+"""
+from collections import defaultdict
+from collections.abc import Iterable, Mapping, Sequence
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from typing import Any
+from uuid import UUID
+
+import orjson
+
+from .models import ItemType
+from .schemas import ShopUnit, ShopUnitPage, ShopUnitSalesResponse
+
+_date_format: str = ShopUnit._declared_fields['date'].format
+_cursor_field = ShopUnitSalesResponse._declared_fields['next_cursor']
+_children_cursor = ShopUnitPage._declared_fields['next_cursor']._serialize
+# cursor of category which children are not listed at all
+_first_children_cursor = _children_cursor(UUID(int=0))
+
+
+def _date(value: datetime) -> str:
+    # same instants in other timezones are equal, but formatted differently
+    return _format_date(value, value.tzinfo)
+
+
+@lru_cache(maxsize=1024)
+def _format_date(value: datetime, _: tzinfo | None) -> str:
+    # imported Items share ``date``, so it is formatted once per import
+    return value.strftime(_date_format)
+
+
+def _default(value: Any) -> str:
+    # asyncpg returns its own ``UUID`` subclass, unknown to ``orjson``
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError
+
+
+def _unit(item: Any) -> dict[str, Any]:
+    """
+    ``ShopUnitStatisticUnit`` dict of ``Item`` or ``ItemHistory`` row
+    """
+    price = item.price
+    return {
+        'id': item.id,
+        'name': item.name,
+        'date': _date(item.date),
+        'parentId': item.parent_id,
+        'type': item.type,
+        # average price of ``ItemHistory`` category is ``Decimal``
+        'price': price if price is None else int(price),
+    }
+
+
+def _link_units(rows: Iterable[tuple]) -> dict[str, dict[str, Any]]:
+    """
+    ``ShopUnit`` dicts by id of flat ``rows`` of ``Item.data_columns``,
+    each linked into ``children`` of its parent if it is in ``rows``
+    """
+    units = {}
+    children: defaultdict[str, list[dict[str, Any]]] = defaultdict(list)
+    for id_, name, date, parent_id, type_, price in rows:
+        unit = {
+            'id': id_,
+            'name': name,
+            'date': _date(date),
+            'parentId': parent_id,
+            'type': type_,
+            'price': price,
+            'children': None if type_ == ItemType.OFFER else children[id_],
+        }
+        units[id_] = unit
+        children[parent_id].append(unit)
+    return units
+
+
+def dumps_shop_unit_rows(rows: Sequence[tuple], root_id: str) -> bytes:
+    """
+    Same as ``ShopUnit().dumps()`` of ``Item`` with ``root_id`` linked from
+    flat subtree ``rows`` of ``Item.data_columns``. Takes and returns plain
+    data, so it can run in another process.
+    """
+    root = _link_units(rows).get(root_id)
+    if root is None:
+        raise ValueError(f'no root {root_id} in rows')
+    return orjson.dumps(root, default=_default)
+
+
+def dumps_shop_units_rows(
+        rows: Sequence[tuple], root_ids: Sequence[str],
+) -> list[bytes]:
+    """
+    Same as ``dumps_shop_unit_rows()`` of each of ``root_ids``, with rows
+    of all their subtrees linked once, even if subtrees overlap
+    """
+    units = _link_units(rows)
+    return [orjson.dumps(units[id_], default=_default) for id_ in root_ids]
+
+
+def dumps_shop_units(
+        bodies: Iterable[bytes], not_found: Iterable[UUID],
+) -> bytes:
+    """
+    ``NodesResponse`` of already serialized ``ShopUnit`` ``bodies``
+    """
+    return b''.join((
+        b'{"items":[', b','.join(bodies), b'],"notFound":',
+        orjson.dumps([str(id_) for id_ in not_found]), b'}',
+    ))
+
+
+def dumps_shop_unit_page_rows(
+        rows: Sequence[tuple], limit: int | None,
+) -> bytes:
+    """
+    Same as ``ShopUnitPage().dumps()`` of ``Item`` linked from rows of
+    ``ItemAccessor.get_page_rows()``: categories have ``nextCursor`` of
+    their children not listed in ``children``
+    """
+    root = None
+    units: dict[str, dict[str, Any]] = {}
+    for id_, name, date, parent_id, type_, price, rank, has_children in rows:
+        if limit is not None and rank > limit:
+            # the first child not listed
+            parent = units[parent_id]
+            parent['nextCursor'] = _children_cursor(
+                parent['children'][-1]['id']
+            )
+            continue
+        unit = {
+            'id': id_,
+            'name': name,
+            'date': _date(date),
+            'parentId': parent_id,
+            'type': type_,
+            'price': price,
+        }
+        if type_ == ItemType.OFFER:
+            unit['children'] = None
+        else:
+            unit['children'] = []
+            unit['nextCursor'] = (
+                _first_children_cursor if has_children else None
+            )
+        if root is None:
+            root = unit
+        else:
+            units[parent_id]['children'].append(unit)
+        units[id_] = unit
+    if root is None:
+        raise ValueError('no root in rows')
+    return orjson.dumps(root, default=_default)
+
+
+def dumps_shop_unit_children_rows(
+        rows: Sequence[tuple], limit: int | None,
+) -> bytes:
+    """
+    Same as ``ShopUnitChildrenResponse().dumps()`` of children in rows of
+    ``ItemAccessor.get_page_rows()`` of depth 1
+    """
+    children = rows[1:]
+    listed = children if limit is None else children[:limit]
+    data = {
+        'items': [
+            {
+                'id': id_,
+                'name': name,
+                'date': _date(date),
+                'parentId': parent_id,
+                'type': type_,
+                'price': price,
+            }
+            for id_, name, date, parent_id, type_, price, *_ in listed
+        ],
+        'nextCursor': (
+            _children_cursor(listed[-1][0])
+            if len(listed) < len(children) else None
+        ),
+    }
+    return orjson.dumps(data, default=_default)
+
+
+class ShopUnitRowsEncoder:
+    """
+    Encodes ``ShopUnit`` JSON piece by piece from depth-first ordered
+    subtree rows of ``ItemAccessor.iter_rows()``, as ``dumps_shop_unit_rows()``
+    does from all rows at once. Only the path of open categories is kept.
+    """
+
+    def __init__(self) -> None:
+        self.depth = -1  # of the deepest open category
+        self.opened = True  # nothing is written since it was opened
+
+    def encode(self, rows: Iterable[tuple]) -> bytes:
+        parts = []
+        for id_, name, date, parent_id, type_, price, depth in rows:
+            if depth <= self.depth:
+                # previous category subtree is over
+                parts.append(b']}' * (self.depth - depth + 1))
+                self.depth = depth - 1
+                self.opened = False
+            if not self.opened:
+                parts.append(b',')
+            unit = {
+                'id': id_,
+                'name': name,
+                'date': _date(date),
+                'parentId': parent_id,
+                'type': type_,
+                'price': price,
+            }
+            if type_ == ItemType.OFFER:
+                unit['children'] = None
+                parts.append(orjson.dumps(unit, default=_default))
+                self.opened = False
+            else:
+                # children are the last field, they follow as next rows
+                parts.append(orjson.dumps(unit, default=_default)[:-1])
+                parts.append(b',"children":[')
+                self.depth = depth
+                self.opened = True
+        return b''.join(parts)
+
+    def close(self) -> bytes:
+        """
+        Closes categories still open, at least the root one
+        """
+        closing = b']}' * (self.depth + 1)
+        self.depth = -1
+        return closing
+
+
+def dumps_shop_unit_ordered_rows(rows: Sequence[tuple]) -> bytes:
+    """
+    Same as ``dumps_shop_unit_rows()`` of all depth-first ordered ``rows``
+    of ``ItemAccessor.iter_rows()``
+    """
+    encoder = ShopUnitRowsEncoder()
+    return encoder.encode(rows) + encoder.close()
+
+
+def dumps_shop_unit_list(response: Mapping[str, Any]) -> bytes:
+    """
+    Same as ``ShopUnitStatisticResponse().dumps(response)``,
+    or ``ShopUnitSalesResponse().dumps(response)`` if it has ``next_cursor``
+    """
+    items: Iterable[Any] = response['items']
+    data = {'items': [_unit(item) for item in items]}
+    if 'next_cursor' in response:
+        data['nextCursor'] = _cursor_field.serialize(
+            'next_cursor', response
+        )
+    return orjson.dumps(data, default=_default)
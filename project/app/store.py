@@ -1,11 +1,45 @@
 from aiohttp.web_app import Application
 
 from .accessors import ItemAccessor
-from .database import Database
+from .cache import NodeCache, NodeCacheSync
+from .catalog import Catalog
+from .database import Database, _flag
+from .offload import LoopLagMonitor, Offloader
 
 
 def setup_store(app: Application) -> None:
     app.on_startup.append(Database.connect)
     app.on_cleanup.append(Database.disconnect)
 
-    app['items'] = ItemAccessor()
+    app['offloader'] = Offloader(**app['config']['offload'])
+    app.on_startup.append(app['offloader'].start)
+    app.on_cleanup.append(app['offloader'].stop)
+
+    app['loop_lag'] = LoopLagMonitor(
+        app['config']['monitor'].get('loop_lag_interval', 0.05)
+    )
+    app.on_startup.append(app['loop_lag'].start)
+    app.on_cleanup.append(app['loop_lag'].stop)
+
+    cache_config = dict(app['config']['cache'])
+    cache_sync = _flag(cache_config.pop('sync', 'false'))
+    cache_channel = cache_config.pop('channel', 'nodes_cache')
+    app['nodes_cache'] = NodeCache(**cache_config)
+    catalog_config = dict(app['config']['catalog'])
+    app['catalog'] = None
+    if _flag(catalog_config.pop('enabled', 'false')):
+        app['catalog'] = Catalog(
+            **catalog_config, nodes_cache=app['nodes_cache'],
+        )
+        app.on_startup.append(app['catalog'].start)
+        app.on_cleanup.append(app['catalog'].stop)
+    # catalog syncs invalidate cache on writes of other processes already
+    app['cache_sync'] = None
+    if cache_sync and app['catalog'] is None and app['nodes_cache'].max_size:
+        app['cache_sync'] = NodeCacheSync(app['nodes_cache'], cache_channel)
+        app.on_startup.append(app['cache_sync'].start)
+        app.on_cleanup.append(app['cache_sync'].stop)
+    app['items'] = ItemAccessor(
+        **app['config']['import'], nodes_cache=app['nodes_cache'],
+        catalog=app['catalog'], cache_sync=app['cache_sync'],
+    )
@@ -1,49 +1,102 @@
-from collections.abc import Mapping
-from datetime import datetime, timedelta
+from collections.abc import AsyncIterator, Callable, Mapping, Sequence
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 from typing import Any
+from uuid import UUID
 
-from aiohttp.web_exceptions import HTTPNotFound
-from aiohttp.web_response import json_response, Response
+from aiohttp import hdrs
+from aiohttp.helpers import ETAG_ANY
+from aiohttp.web_exceptions import (
+    HTTPClientError, HTTPNotFound, HTTPNotModified,
+)
+from aiohttp.web_request import Request
+from aiohttp.web_response import json_response, Response, StreamResponse
 from aiohttp.web_urldispatcher import View
 from aiohttp_apispec import (
     docs, json_schema, querystring_schema, match_info_schema
 )
 
-from . import schemas
+from . import schemas, serializers
+from .cache import CachedNode, NodeCache
+from .catalog import Catalog
+from .metrics import timed_serialization
+from .offload import Offloader
+from .parsers import ImportRequestStream
 
 
 class ItemNotFound(HTTPNotFound):
     pass
 
 
-class ImportsView(View):
-    @docs(
-        tags=['Базовые задачи'],
-        description=''
-        'Импортирует новые товары и/или категории.\n'
-        'Товары/категории импортированные повторно обновляют текущие.\n'
-        'Изменение типа элемента с товара на категорию или с категории'
-        ' на товар не допускается.\n'
-        'Порядок элементов в запросе является произвольным.\n',
-        responses={
-            200: {
-                'description': 'Вставка или обновление прошли успешно',
-            },
-            400: {
-                'schema': schemas.Error,
-                'description':
-                    'Невалидная схема документа или входные данные не верны',
-            }
+class TooManyItems(HTTPClientError):
+    status_code = 413
+
+
+def json_schema_docs(schema, **kwargs):
+    """
+    Same as ``json_schema``, but only documents request body,
+    which is parsed by view itself instead of ``validation_middleware``.
+    """
+    def wrapper(func):
+        func = json_schema(schema, **kwargs)(func)
+        del func.__schemas__
+        return func
+    return wrapper
+
+
+# shared by ``ImportsView`` and ``ImportsStreamView``
+IMPORTS_DOCS = dict(
+    tags=['Базовые задачи'],
+    description=''
+    'Импортирует новые товары и/или категории.\n'
+    'Товары/категории импортированные повторно обновляют текущие.\n'
+    'Изменение типа элемента с товара на категорию или с категории'
+    ' на товар не допускается.\n'
+    'Порядок элементов в запросе является произвольным.\n',
+    responses={
+        200: {
+            'description': 'Вставка или обновление прошли успешно',
+        },
+        400: {
+            'schema': schemas.Error,
+            'description':
+                'Невалидная схема документа или входные данные не верны',
         }
-    )
+    }
+)
+
+
+class ImportsView(View):
+    @docs(**IMPORTS_DOCS)
     @json_schema(
         schemas.ShopUnitImportRequest,
         description='Импортируемые элементы',
     )
     async def post(self) -> Response:
         import_req: Mapping[str, datetime | list[Any]] = self.request['json']
-        items = schemas.ShopUnitImportRequest.make_orm_objects(import_req)
-        await self.request.app['items'].import_many(items)
+        rows = schemas.ShopUnitImportRequest.make_rows(import_req)
+        await self.request.app['items'].import_many(rows)
+        return Response()
+
+
+class ImportsStreamView(View):
+    """
+    ``ImportsView`` which parses and imports body while it's being received
+    """
+    @docs(**IMPORTS_DOCS)
+    @json_schema_docs(
+        schemas.ShopUnitImportRequest,
+        description='Импортируемые элементы',
+    )
+    async def post(self) -> Response:
+        stream = ImportRequestStream(
+            self.request.content,
+            int(self.request.app['config']['server'].get(
+                'client_max_size', 1024**2,
+            )),
+        )
+        await self.request.app['items'].import_stream(stream)
         return Response()
 
 
@@ -73,7 +126,7 @@ class DeleteView(View):
     )
     @match_info_schema(schemas.Id)
     async def delete(self) -> Response:
-        item_id = self.request.match_info['id']
+        item_id = self.request['match_info']['id']
         found = await self.request.app['items'].delete(item_id)
         if not found:
             raise ItemNotFound
@@ -81,24 +134,313 @@ class DeleteView(View):
         return Response()
 
 
+class BulkDeleteView(View):
+    @docs(
+        tags=['Дополнительные задачи'],
+        description=''
+        'Удалить элементы по списку идентификаторов в одной транзакции.\n'
+        'При удалении категории удаляются все дочерние элементы.\n'
+        'Идентификаторы ненайденных элементов возвращаются в поле notFound,'
+        ' остальные элементы удаляются.\n'
+        'Если задано updateDate, время категорий, из которых удалены'
+        ' элементы, и всех их предков обновляется, а их новые состояния'
+        ' сохраняются в статистику.\n',
+        responses={
+            200: {
+                'schema': schemas.DeleteResponse,
+                'description': 'Удаление прошло успешно',
+            },
+            400: {
+                'schema': schemas.Error,
+                'description':
+                    'Невалидная схема документа или входные данные не верны',
+            },
+        }
+    )
+    @json_schema(
+        schemas.DeleteRequest,
+        description='Удаляемые элементы',
+    )
+    async def post(self) -> Response:
+        ids = self.request['json']['ids']
+        not_found = await self.request.app['items'].delete_many(
+            ids, self.request['json'].get('update_date'),
+        )
+        return json_response(schemas.DeleteResponse().dump(
+            {'not_found': not_found}
+        ))
+
+
+# shared by ``NodesView`` and ``NodesStreamView``
+NODES_DOCS = dict(
+    tags=['Базовые задачи'],
+    description=''
+    'Получить информацию об элементе по идентификатору.\n'
+    'При получении информации о категории также предоставляется'
+    ' информация о её дочерних элементах.\n'
+    '\n'
+    '- для пустой категории поле children равно пустому массиву, а для'
+    ' товара равно null\n'
+    '- цена категории - это средняя цена всех её товаров, включая товары'
+    ' дочерних категорий. Если категория не содержит товаров цена равна'
+    ' null. При обновлении цены товара, средняя цена категории, которая'
+    ' содержит этот товар, тоже обновляется.\n'
+    '\n'
+    'При заданных depth, limit или cursor возвращаются дочерние элементы до'
+    ' глубины depth, не более limit дочерних элементов каждой категории в'
+    ' порядке id, для самого элемента - начиная после cursor. У категорий'
+    ' есть поле nextCursor для продолжения списка дочерних элементов через'
+    ' /nodes/{id}/children. Цена категории учитывает все её товары, а не'
+    ' только вошедшие в ответ.\n',
+    responses={
+        200: {
+            'schema': schemas.ShopUnitPage,
+            'description': 'Информация об элементе',
+        },
+        400: {
+            'schema': schemas.Error,
+            'description':
+                'Невалидная схема документа или входные данные не верны',
+        },
+        404: {
+            'schema': schemas.Error,
+            'description': 'Категория/товар не найден',
+        },
+    },
+)
+
+
 class NodesView(View):
+    """
+    Responses have ``ETag`` and ``Last-Modified`` of ``Item.modified``, so
+    conditional requests of unchanged ``Items`` are answered with 304 after
+    a lookup by primary key, or without database at all on cache hit.
+
+    Responses limited by ``depth``, ``limit`` or ``cursor`` are read by
+    ``get_page_rows()`` and are not cached.
+    """
+    @docs(**NODES_DOCS)
+    @match_info_schema(schemas.Id)
+    @querystring_schema(schemas.NodesQuery)
+    async def get(self) -> StreamResponse:
+        item_id = self.request['match_info']['id']
+        query = self.request['querystring']
+        if query:
+            return await self.get_page(
+                item_id, query.get('depth'), query.get('limit'),
+                query.get('cursor'), serializers.dumps_shop_unit_page_rows,
+            )
+
+        cache: NodeCache = self.request.app['nodes_cache']
+        node = cache.get(item_id)
+        version = cache.version
+        if node is not None:
+            modified = node.modified
+        else:
+            # read before response, so validator is never newer than it
+            modified = await self.get_modified(item_id)
+            if modified is None:
+                raise ItemNotFound
+
+        validators = _validators(modified)
+        if _not_modified(self.request, modified):
+            return Response(
+                status=HTTPNotModified.status_code, headers=validators,
+            )
+        if node is not None:
+            return json_response(
+                body=node.body, headers={'X-Cache': 'HIT', **validators},
+            )
+        return await self.read(item_id, modified, version, validators)
+
+    async def get_modified(self, item_id: UUID) -> datetime | None:
+        return await self.request.app['items'].get_modified(item_id)
+
+    async def get_page(
+            self, item_id: UUID, depth: int | None, limit: int | None,
+            after: UUID | None,
+            dumps: Callable[[list[tuple], int | None], bytes],
+    ) -> Response:
+        """
+        Reads rows of ``get_page_rows()`` and serializes them by ``dumps``
+        """
+        modified = await self.get_modified(item_id)
+        if modified is None:
+            raise ItemNotFound
+
+        validators = _validators(modified)
+        if _not_modified(self.request, modified):
+            return Response(
+                status=HTTPNotModified.status_code, headers=validators,
+            )
+        rows = await self.get_page_rows(item_id, depth, limit, after)
+        if not rows:
+            raise ItemNotFound
+
+        offloader: Offloader = self.request.app['offloader']
+        with timed_serialization():
+            body = await offloader.run(len(rows), dumps, rows, limit)
+        return json_response(body=body, headers=validators)
+
+    async def get_page_rows(
+            self, item_id: UUID, depth: int | None, limit: int | None,
+            after: UUID | None,
+    ) -> list[tuple] | None:
+        return await self.request.app['items'].get_page_rows(
+            item_id, depth, limit, after,
+        )
+
+    async def read(
+            self, item_id: UUID, modified: datetime, version: int,
+            validators: Mapping[str, str],
+    ) -> StreamResponse:
+        """
+        Reads and serializes response of ``Item`` not found in cache
+        """
+        rows = await self.request.app['items'].get_rows(item_id)
+        if not rows:
+            raise ItemNotFound
+
+        offloader: Offloader = self.request.app['offloader']
+        with timed_serialization():
+            body = await offloader.run(
+                len(rows), serializers.dumps_shop_unit_rows, rows, str(item_id),
+            )
+        cache: NodeCache = self.request.app['nodes_cache']
+        cache.put(item_id, CachedNode(body, modified), version)
+        return json_response(
+            body=body, headers={'X-Cache': 'MISS', **validators},
+        )
+
+
+class NodesStreamView(NodesView):
+    """
+    ``NodesView`` which streams response of subtree with
+    ``NODES_STREAM_THRESHOLD`` items or more, while they are read from
+    database. Responses of smaller subtrees are built whole and cached.
+    """
+
+    async def read(
+            self, item_id: UUID, modified: datetime, version: int,
+            validators: Mapping[str, str],
+    ) -> StreamResponse:
+        config = self.request.app['config']['nodes']
+        threshold = int(config['stream_threshold'])
+        fetch_size = int(config.get('fetch_size', 1000))
+        rows = []
+        chunks = self.request.app['items'].iter_rows(item_id, fetch_size)
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                rows.extend(chunk)
+                if len(rows) >= threshold:
+                    return await self.stream(
+                        rows, chunks, fetch_size, validators,
+                    )
+        if not rows:
+            raise ItemNotFound
+
+        offloader: Offloader = self.request.app['offloader']
+        with timed_serialization():
+            body = await offloader.run(
+                len(rows), serializers.dumps_shop_unit_ordered_rows, rows,
+            )
+        cache: NodeCache = self.request.app['nodes_cache']
+        cache.put(item_id, CachedNode(body, modified), version)
+        return json_response(
+            body=body, headers={'X-Cache': 'MISS', **validators},
+        )
+
+    async def stream(
+            self, rows: list[tuple], chunks: AsyncIterator[list[tuple]],
+            fetch_size: int, validators: Mapping[str, str],
+    ) -> StreamResponse:
+        """
+        Writes ``ShopUnit`` of already read ``rows`` and rest ``chunks``
+        """
+        response = StreamResponse(headers={'X-Cache': 'MISS', **validators})
+        response.content_type = 'application/json'
+        await response.prepare(self.request)
+        encoder = serializers.ShopUnitRowsEncoder()
+        # read rows are written by chunks too, so loop is not blocked long
+        for i in range(0, len(rows), fetch_size):
+            with timed_serialization():
+                body = encoder.encode(rows[i:i + fetch_size])
+            await response.write(body)
+        rows.clear()
+        async for chunk in chunks:
+            with timed_serialization():
+                body = encoder.encode(chunk)
+            await response.write(body)
+        await response.write(encoder.close())
+        await response.write_eof()
+        return response
+
+
+class NodesCatalogView(NodesStreamView):
+    """
+    ``NodesView`` which reads ``Catalog`` in memory instead of database.
+    Database is read while catalog is not ready, with response streamed
+    as ``NodesStreamView`` does if ``NODES_STREAM_THRESHOLD`` is set.
+    """
+
+    async def get_modified(self, item_id: UUID) -> datetime | None:
+        catalog: Catalog = self.request.app['catalog']
+        if not catalog.ready:
+            return await super().get_modified(item_id)
+        return catalog.get_modified(item_id)
+
+    async def get_page_rows(
+            self, item_id: UUID, depth: int | None, limit: int | None,
+            after: UUID | None,
+    ) -> list[tuple] | None:
+        catalog: Catalog = self.request.app['catalog']
+        if not catalog.ready:
+            return await super().get_page_rows(item_id, depth, limit, after)
+        return catalog.get_page_rows(item_id, depth, limit, after)
+
+    async def read(
+            self, item_id: UUID, modified: datetime, version: int,
+            validators: Mapping[str, str],
+    ) -> StreamResponse:
+        catalog: Catalog = self.request.app['catalog']
+        if not catalog.ready:
+            if int(self.request.app['config']['nodes'].get(
+                    'stream_threshold', 0)):
+                return await super().read(
+                    item_id, modified, version, validators,
+                )
+            return await NodesView.read(
+                self, item_id, modified, version, validators,
+            )
+
+        rows = catalog.get_rows(item_id)
+        if rows is None:
+            raise ItemNotFound
+
+        offloader: Offloader = self.request.app['offloader']
+        with timed_serialization():
+            body = await offloader.run(
+                len(rows), serializers.dumps_shop_unit_ordered_rows, rows,
+            )
+        cache: NodeCache = self.request.app['nodes_cache']
+        cache.put(item_id, CachedNode(body, modified), version)
+        return json_response(
+            body=body, headers={'X-Cache': 'MISS', **validators},
+        )
+
+
+class ChildrenView(NodesView):
     @docs(
-        tags=['Базовые задачи'],
+        tags=['Дополнительные задачи'],
         description=''
-        'Получить информацию об элементе по идентификатору.\n'
-        'При получении информации о категории также предоставляется'
-        ' информация о её дочерних элементах.\n'
-        '\n'
-        '- для пустой категории поле children равно пустому массиву, а для'
-        ' товара равно null\n'
-        '- цена категории - это средняя цена всех её товаров, включая товары'
-        ' дочерних категорий. Если категория не содержит товаров цена равна'
-        ' null. При обновлении цены товара, средняя цена категории, которая'
-        ' содержит этот товар, тоже обновляется.\n',
+        'Получить список дочерних элементов категории в порядке id.\n'
+        'При заданном limit список возвращается постранично, курсор следующей'
+        ' страницы передается в поле nextCursor. Цена категории учитывает'
+        ' все её товары.\n',
         responses={
             200: {
-                'schema': schemas.ShopUnit,
-                'description': 'Информация об элементе',
+                'schema': schemas.ShopUnitChildrenResponse,
+                'description': 'Список дочерних элементов',
             },
             400: {
                 'schema': schemas.Error,
@@ -109,18 +451,199 @@ class NodesView(View):
                 'schema': schemas.Error,
                 'description': 'Категория/товар не найден',
             },
-        },
+        }
     )
     @match_info_schema(schemas.Id)
-    async def get(self) -> Response:
-        item_id = self.request.match_info['id']
-        item = await self.request.app['items'].get(item_id)
-        if item is None:
-            raise ItemNotFound
+    @querystring_schema(schemas.ChildrenQuery)
+    async def get(self) -> StreamResponse:
+        query = self.request['querystring']
+        return await self.get_page(
+            self.request['match_info']['id'], 1, query.get('limit'),
+            query.get('cursor'), serializers.dumps_shop_unit_children_rows,
+        )
+
 
-        item.fulfill_category_prices()
-        schema = schemas.ShopUnit()
-        return json_response(body=schema.dumps(item))
+class ChildrenCatalogView(ChildrenView, NodesCatalogView):
+    """
+    ``ChildrenView`` which reads ``Catalog`` in memory instead of database,
+    while it is ready
+    """
+
+
+class NodesBatchView(View):
+    """
+    ``NodesView`` of many ``Items`` at once. Responses of ``Items`` in cache
+    are reused, others are read by one shared query and cached one by one.
+
+    Responses are built whole, so subtrees read for them are limited to
+    ``NODES_STREAM_THRESHOLD`` ``Items`` in total, if it is set: larger ones
+    are rejected with 413 and should be read from ``/nodes/{id}``, which
+    streams them.
+    """
+    @docs(
+        tags=['Дополнительные задачи'],
+        description=''
+        'Получить информацию о нескольких элементах по списку'
+        ' идентификаторов, как в /nodes/{id}.\n'
+        'Элементы возвращаются в порядке запроса, идентификаторы ненайденных'
+        ' элементов возвращаются в поле notFound.\n',
+        responses={
+            200: {
+                'schema': schemas.NodesResponse,
+                'description': 'Информация об элементах',
+            },
+            400: {
+                'schema': schemas.Error,
+                'description':
+                    'Невалидная схема документа или входные данные не верны',
+            },
+            413: {
+                'schema': schemas.Error,
+                'description':
+                    'Слишком много элементов в поддеревьях, больше'
+                    ' NODES_STREAM_THRESHOLD',
+            },
+        }
+    )
+    @json_schema(
+        schemas.NodesRequest,
+        description='Получаемые элементы',
+    )
+    async def post(self) -> Response:
+        ids = self.request['json']['ids']
+        cache: NodeCache = self.request.app['nodes_cache']
+        nodes = {}
+        for item_id in ids:
+            node = cache.get(item_id)
+            if node is not None:
+                nodes[item_id] = node
+        version = cache.version
+        missing = [item_id for item_id in ids if item_id not in nodes]
+        if missing:
+            for item_id, node in (await self.read(missing)).items():
+                cache.put(item_id, node, version)
+                nodes[item_id] = node
+
+        with timed_serialization():
+            body = serializers.dumps_shop_units(
+                [nodes[item_id].body for item_id in ids if item_id in nodes],
+                [item_id for item_id in ids if item_id not in nodes],
+            )
+        return json_response(body=body)
+
+    @property
+    def max_items(self) -> int | None:
+        """
+        Limit of ``Items`` read for one response, ``None`` if not limited
+        """
+        threshold = int(
+            self.request.app['config']['nodes'].get('stream_threshold', 0)
+        )
+        return threshold or None
+
+    async def read(self, ids: Sequence[UUID]) -> dict[UUID, CachedNode]:
+        """
+        Reads and serializes responses of ``Items`` not found in cache,
+        only found ones are returned. Raises ``TooManyItems`` if their
+        subtrees have more than ``max_items``.
+        """
+        max_items = self.max_items
+        modified, rows = await self.request.app['items'].get_many_rows(
+            ids, max_items,
+        )
+        if max_items is not None and len(rows) > max_items:
+            raise TooManyItems
+        found = [item_id for item_id in ids if str(item_id) in modified]
+        if not found:
+            return {}
+
+        offloader: Offloader = self.request.app['offloader']
+        with timed_serialization():
+            bodies = await offloader.run(
+                len(rows), serializers.dumps_shop_units_rows, rows,
+                [str(item_id) for item_id in found],
+            )
+        return {
+            item_id: CachedNode(body, modified[str(item_id)])
+            for item_id, body in zip(found, bodies)
+        }
+
+
+class NodesBatchCatalogView(NodesBatchView):
+    """
+    ``NodesBatchView`` which reads ``Catalog`` in memory instead of
+    database, while it is ready
+    """
+
+    async def read(self, ids: Sequence[UUID]) -> dict[UUID, CachedNode]:
+        catalog: Catalog = self.request.app['catalog']
+        if not catalog.ready:
+            return await super().read(ids)
+
+        offloader: Offloader = self.request.app['offloader']
+        max_items = self.max_items
+        nodes = {}
+        total = 0
+        for item_id in ids:
+            modified = catalog.get_modified(item_id)
+            if modified is None:
+                continue
+            rows = catalog.get_rows(item_id)
+            total += len(rows)
+            if max_items is not None and total > max_items:
+                raise TooManyItems
+            with timed_serialization():
+                body = await offloader.run(
+                    len(rows), serializers.dumps_shop_unit_ordered_rows, rows,
+                )
+            nodes[item_id] = CachedNode(body, modified)
+        return nodes
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_SECOND = timedelta(seconds=1)
+
+
+def _etag(modified: datetime) -> str:
+    return f'{(modified - _EPOCH) // _MICROSECOND:x}'
+
+
+def _last_modified(modified: datetime) -> datetime:
+    # ``Last-Modified`` has whole seconds, rounded up to cover ``modified``
+    return _EPOCH + -((_EPOCH - modified) // _SECOND) * _SECOND
+
+
+def _validators(modified: datetime) -> dict[str, str]:
+    """
+    ``ETag`` and ``Last-Modified`` headers of response read at ``modified``.
+
+    ``ETag`` is weak: order of children is not fixed. ``Last-Modified`` is
+    sent once its second is over, so later writes are always after it.
+    """
+    headers = {hdrs.ETAG: f'W/"{_etag(modified)}"'}
+    last_modified = _last_modified(modified)
+    if last_modified <= datetime.now(timezone.utc):
+        headers[hdrs.LAST_MODIFIED] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def _not_modified(request: Request, modified: datetime) -> bool:
+    """
+    Whether client has response read at ``modified``, by ``If-None-Match``,
+    otherwise by ``If-Modified-Since``
+    """
+    if_none_match = request.if_none_match
+    if if_none_match:
+        etag = _etag(modified)
+        return any(tag.value in (ETAG_ANY, etag) for tag in if_none_match)
+    if_modified_since = request.if_modified_since
+    return (
+        if_modified_since is not None
+        # writes are not known for future dates
+        and if_modified_since <= datetime.now(timezone.utc)
+        and _last_modified(modified) <= if_modified_since
+    )
 
 
 class SalesView(View):
@@ -129,10 +652,12 @@ class SalesView(View):
         description=''
         'Получение списка **товаров**, цена которых была обновлена за последние'
         ' 24 часа включительно [now() - 24h, now()] от времени переданном в'
-        ' запросе.\n',
+        ' запросе.\n'
+        'При заданном limit список возвращается постранично, курсор следующей'
+        ' страницы передается в поле nextCursor.\n',
         responses={
             200: {
-                'schema': schemas.ShopUnitStatisticResponse,
+                'schema': schemas.ShopUnitSalesResponse,
                 'description': 'Список товаров, цена которых была обновлена',
             },
             400: {
@@ -142,14 +667,50 @@ class SalesView(View):
             },
         }
     )
-    @querystring_schema(schemas.Date)
+    @querystring_schema(schemas.SalesQuery)
     async def get(self) -> Response:
-        date = self.request['querystring']['date']
-        offers = await self.request.app['items'].get_offers_in_date_range(
+        query = self.request['querystring']
+        date, limit = query['date'], query.get('limit')
+        offers = await self.get_offers(
             date - timedelta(days=1), date,
+            limit=limit and limit + 1,
+            after=query.get('cursor'),
         )
-        schema = schemas.ShopUnitStatisticResponse()
-        return json_response(body=schema.dumps({'items': offers}))
+        if limit is None:
+            response = {'items': offers}
+        else:
+            page, rest = offers[:limit], offers[limit:]
+            response = {
+                'items': page,
+                'next_cursor': (page[-1].date, page[-1].id) if rest else None,
+            }
+        with timed_serialization():
+            body = serializers.dumps_shop_unit_list(response)
+        return json_response(body=body)
+
+    async def get_offers(
+            self, start: datetime, end: datetime, limit: int | None,
+            after: tuple[datetime, UUID] | None,
+    ) -> list[Any]:
+        return await self.request.app['items'].get_offers_in_date_range(
+            start, end, limit, after,
+        )
+
+
+class SalesCatalogView(SalesView):
+    """
+    ``SalesView`` which reads ``Catalog`` in memory instead of database,
+    while it is ready
+    """
+
+    async def get_offers(
+            self, start: datetime, end: datetime, limit: int | None,
+            after: tuple[datetime, UUID] | None,
+    ) -> list[Any]:
+        catalog: Catalog = self.request.app['catalog']
+        if not catalog.ready:
+            return await super().get_offers(start, end, limit, after)
+        return catalog.get_offers_in_date_range(start, end, limit, after)
 
 
 class StatisticView(View):
@@ -183,8 +744,16 @@ class StatisticView(View):
     @match_info_schema(schemas.Id)
     @querystring_schema(schemas.DateStartEnd)
     async def get(self) -> Response:
-        item_id = self.request.match_info.get('id')
-        date_start = self.request['querystring']['date_start']
-        date_end = self.request['querystring']['date_end']
-        return json_response({})  # TODO
+        item_id = self.request['match_info']['id']
+        date_start = self.request['querystring'].get('date_start')
+        date_end = self.request['querystring'].get('date_end')
+        states = await self.request.app['items'].get_statistic(
+            item_id, date_start, date_end,
+        )
+        if states is None:
+            raise ItemNotFound
+
+        with timed_serialization():
+            body = serializers.dumps_shop_unit_list({'items': states})
+        return json_response(body=body)
 
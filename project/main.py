@@ -1,6 +1,13 @@
+import argparse
+import asyncio
 import logging
+import multiprocessing
 import os
+import signal
+import time
 from collections import defaultdict
+from collections.abc import Callable
+from multiprocessing.connection import wait
 from typing import Any
 
 from aiohttp import web
@@ -45,9 +52,13 @@ async def app_factory() -> Application:
     from app.routes import setup_routes
     from app.middlewares import setup_middlewares
     from app.store import setup_store
+    from app.metrics import setup_metrics
 
-    app: Application = web.Application()
-    app['config'] = get_config()
+    config = get_config()
+    app: Application = web.Application(
+        client_max_size=int(config['server'].get('client_max_size', 1024**2)),
+    )
+    app['config'] = config
     logging.basicConfig(level=logging.INFO)
 
     setup_aiohttp_apispec(
@@ -59,11 +70,142 @@ async def app_factory() -> Application:
     setup_routes(app)
     setup_middlewares(app)
     setup_store(app)
+    setup_metrics(app)
 
     async def welcome(_): logging.info("Mega Market server started")
     app.on_startup.append(welcome)
     return app
 
 
+async def _watch_master(app: Application) -> None:
+    """
+    Stops prefork worker when master process is gone
+    """
+    master_pid = app['master_pid']
+    while os.getppid() == master_pid:
+        await asyncio.sleep(1)
+    logging.warning('master process %s exited, stopping worker', master_pid)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+async def _start_watching_master(app: Application) -> None:
+    app['watch_master'] = asyncio.create_task(_watch_master(app))
+
+
+async def _stop_watching_master(app: Application) -> None:
+    app['watch_master'].cancel()
+
+
+async def worker_app_factory(master_pid: int) -> Application:
+    app = await app_factory()
+    app['master_pid'] = master_pid
+    app.on_startup.append(_start_watching_master)
+    app.on_cleanup.append(_stop_watching_master)
+    return app
+
+
+def run_worker(port: int, master_pid: int) -> None:
+    # terminal signals go to master only, it stops workers with SIGTERM
+    os.setpgid(0, 0)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    web.run_app(
+        worker_app_factory(master_pid), port=port, reuse_port=True,
+        print=None,
+    )
+
+
+def start_worker_process(
+        target: Callable[..., Any], *args: Any,
+) -> multiprocessing.Process:
+    """
+    Forks process of prefork worker. It is not a daemon, as daemons can't
+    start children, which ``OFFLOAD_EXECUTOR=process`` does, so master
+    stops and joins workers itself.
+    """
+    context = multiprocessing.get_context('fork')
+    process = context.Process(target=target, args=args)
+    process.start()
+    return process
+
+
+def run_workers(workers: int, port: int) -> None:
+    """
+    Prefork mode: runs ``workers`` server processes, each with its own
+    engine, listening the same ``port`` with ``SO_REUSEPORT``.
+    Exited workers are restarted, SIGINT / SIGTERM gracefully stops all.
+    """
+    from app.database import _flag
+
+    logging.basicConfig(level=logging.INFO)
+    config = get_config()
+    # workers don't see writes of each other, without catalog their caches
+    # are kept current by notifications of writes
+    if not _flag(config['catalog'].get('enabled', 'false')):
+        os.environ['CACHE_SYNC'] = 'true'
+
+    master_pid = os.getpid()
+    stopping = False
+
+    def start() -> multiprocessing.Process:
+        process = start_worker_process(run_worker, port, master_pid)
+        process.started_at = time.monotonic()
+        return process
+
+    def stop(signum: int, _) -> None:
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        logging.info('stopping %d workers', len(processes))
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    processes = [start() for _ in range(workers)]
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    logging.info(
+        'Mega Market server started %d workers on port %d', workers, port,
+    )
+
+    try:
+        while not stopping:
+            wait([process.sentinel for process in processes])
+            for i, process in enumerate(processes):
+                if stopping or process.is_alive():
+                    continue
+                logging.warning(
+                    'worker %s exited with code %s, restarting',
+                    process.pid, process.exitcode,
+                )
+                # don't restart worker failing on start in a busy loop
+                if time.monotonic() - process.started_at < 1:
+                    time.sleep(1)
+                processes[i] = start()
+    finally:
+        # workers are not daemons, they are not stopped on master exit
+        stop(signal.SIGTERM, None)
+        for process in processes:
+            process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Mega Market server')
+    parser.add_argument(
+        '--workers', type=int,
+        default=int(get_config()['server'].get('workers', 1)),
+        help='number of server processes, 0 - one per CPU',
+    )
+    parser.add_argument('--port', type=int, default=80)
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    if workers == 1:
+        web.run_app(app_factory(), port=args.port)
+    else:
+        run_workers(workers, args.port)
+
+
 if __name__ == '__main__':
-    web.run_app(app_factory(), port=80)
+    main()
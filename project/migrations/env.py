@@ -4,7 +4,7 @@ from alembic import context
 from alembic_utils.replaceable_entity import register_entities
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
-from sqlalchemy.engine import Connection, URL
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 from project.app import models
@@ -12,7 +12,8 @@ from project.app import models
 
 def get_app_database_url() -> str:
     from project.main import get_config
-    return str(URL.create('postgresql+asyncpg', **get_config()['db']))
+    from project.app.database import database_url
+    return str(database_url(get_config()['db']))
 
 
 # this is the Alembic Config object, which provides
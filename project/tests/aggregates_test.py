@@ -0,0 +1,326 @@
+# encoding=utf8
+"""
+Checks ``offer_count`` and ``price_sum`` of categories, maintained by imports
+and deletes, against a model of the tree: repricing, moves of offers and
+categories, nested moves, cascade deletes and random imports and deletes,
+and ancestor dates and history set by deletes with date.
+
+Needs database of ``config.env`` migrated to head, the server may be running.
+
+Run from ``project`` directory: python -m tests.aggregates_test [seed] [steps]
+"""
+
+import asyncio
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from marshmallow import ValidationError
+from sqlalchemy import select
+
+from app.accessors import ItemAccessor
+from app.database import Database
+from app.models import Item, ItemHistory, ItemRow, ItemType
+
+DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+
+# ``(id, parent_id, price)`` of imported ``Item``, ``price`` is ``None`` for
+# categories
+Node = tuple[uuid.UUID, uuid.UUID | None, int | None]
+
+
+class Tree:
+    """
+    Model of imported ``Items``: parent and price of each one by id
+    """
+
+    def __init__(self, accessor: ItemAccessor):
+        self.accessor = accessor
+        self.items: dict[uuid.UUID, tuple[uuid.UUID | None, int | None]] = {}
+        self.date = DATE
+
+    def categories(self) -> list[uuid.UUID]:
+        return [i for i, (_, price) in self.items.items() if price is None]
+
+    def children(self, item_id: uuid.UUID) -> list[uuid.UUID]:
+        return [i for i, (parent_id, _) in self.items.items()
+                if parent_id == item_id]
+
+    def subtree(self, item_id: uuid.UUID) -> set[uuid.UUID]:
+        found, stack = {item_id}, [item_id]
+        while stack:
+            for child_id in self.children(stack.pop()):
+                found.add(child_id)
+                stack.append(child_id)
+        return found
+
+    def path(self, item_id: uuid.UUID) -> list[uuid.UUID]:
+        path = []
+        while item_id is not None:
+            path.append(item_id)
+            item_id = self.items[item_id][0]
+        return path[::-1]
+
+    def aggregates(self, item_id: uuid.UUID) -> tuple[int, int]:
+        prices = [self.items[i][1] for i in self.subtree(item_id)
+                  if self.items[i][1] is not None]
+        return len(prices), sum(prices)
+
+    def rows(self, items: Iterable[Node]) -> list[ItemRow]:
+        return [
+            ItemRow(
+                item_id, str(item_id), self.date, parent_id,
+                (ItemType.CATEGORY if price is None else ItemType.OFFER).value,
+                price,
+            )
+            for item_id, parent_id, price in items
+        ]
+
+    async def write(self, *items: Node):
+        """
+        Imports ``items`` given as ``(id, parent_id, price)``, ``price`` is
+        ``None`` for categories
+        """
+        self.date += timedelta(hours=1)
+        await self.accessor.import_many(self.rows(items))
+        for item_id, parent_id, price in items:
+            self.items[item_id] = parent_id, price
+
+    async def reject(self, *items: Node):
+        """
+        Checks that import of ``items`` is rejected and changes nothing
+        """
+        try:
+            await self.accessor.import_many(self.rows(items))
+        except ValidationError:
+            return await self.check()
+        raise AssertionError(f'{items} is not rejected')
+
+    async def delete(self, item_id: uuid.UUID):
+        for i in self.subtree(item_id):
+            del self.items[i]
+        assert not await self.accessor.delete_many([item_id])
+
+    async def check(self):
+        async with Database.session() as db:
+            result = await db.execute(
+                select(Item.id, Item.offer_count, Item.price_sum, Item.path).
+                where(Item.id.in_(list(self.items)))
+            )
+            found = {row.id: row for row in result}
+        assert found.keys() == self.items.keys()
+        for item_id in self.categories():
+            row = found[item_id]
+            assert (row.offer_count, row.price_sum) == \
+                self.aggregates(item_id), (row, self.aggregates(item_id))
+        for item_id, row in found.items():
+            assert row.path == self.path(item_id), (row, self.path(item_id))
+
+    async def clear(self):
+        for item_id in [i for i, (parent_id, _) in self.items.items()
+                        if parent_id is None]:
+            await self.delete(item_id)
+
+
+def new_ids(count: int) -> list[uuid.UUID]:
+    return [uuid.uuid4() for _ in range(count)]
+
+
+async def _reprice(tree: Tree):
+    root, category, offer, other = new_ids(4)
+    await tree.write(
+        (root, None, None), (category, root, None),
+        (offer, category, 100), (other, root, 50),
+    )
+    await tree.check()
+    await tree.write((offer, category, 300))
+    await tree.check()
+    await tree.write((offer, category, 0), (other, root, 7))
+    await tree.check()
+    await tree.clear()
+
+
+async def _move_offers(tree: Tree):
+    root, first, second, offer, other = new_ids(5)
+    await tree.write(
+        (root, None, None), (first, root, None), (second, root, None),
+        (offer, first, 100), (other, first, 20),
+    )
+    # moved and repriced at once, and moved to the top level
+    await tree.write((offer, second, 150))
+    await tree.check()
+    await tree.write((other, None, 20))
+    await tree.check()
+    await tree.write((other, second, 30), (offer, first, 150))
+    await tree.check()
+    await tree.clear()
+
+
+async def _move_categories(tree: Tree):
+    root, first, second, nested, offer, other = new_ids(6)
+    await tree.write(
+        (root, None, None), (first, root, None), (second, root, None),
+        (nested, first, None), (offer, nested, 100), (other, first, 10),
+    )
+    await tree.check()
+    # category with a nested category moves, then the nested one moves out
+    await tree.write((first, second, None))
+    await tree.check()
+    await tree.write((nested, root, None))
+    await tree.check()
+    # category moves under a category which moves in the same import
+    await tree.write((second, nested, None), (nested, None, None))
+    await tree.check()
+    await tree.write((root, second, None))
+    await tree.check()
+    await tree.clear()
+
+
+async def _cycles(tree: Tree):
+    root, child, grandchild, offer = new_ids(4)
+    await tree.write(
+        (root, None, None), (child, root, None),
+        (grandchild, child, None), (offer, grandchild, 5),
+    )
+    first, second = new_ids(2)
+    await tree.reject((root, grandchild, None))
+    await tree.reject((child, child, None))
+    await tree.reject((first, second, None), (second, first, None))
+    await tree.reject((child, None, None), (root, grandchild, None),
+                      (grandchild, root, None))
+    await tree.clear()
+
+
+async def _cascade_deletes(tree: Tree):
+    root, first, nested, second, *offers = new_ids(8)
+    await tree.write(
+        (root, None, None), (first, root, None), (nested, first, None),
+        (second, root, None),
+        (offers[0], nested, 10), (offers[1], nested, 20),
+        (offers[2], first, 30), (offers[3], second, 40),
+    )
+    await tree.delete(offers[1])
+    await tree.check()
+    await tree.delete(first)
+    await tree.check()
+    assert not any(i in tree.items for i in (nested, offers[0], offers[2]))
+    await tree.delete(second)
+    await tree.check()
+    await tree.clear()
+
+
+def _has_cycle(items: dict[uuid.UUID, tuple[uuid.UUID | None, int | None]]):
+    """
+    ``items`` are parent and price by id, as ``Tree.items``
+    """
+    for item_id in items:
+        seen = set()
+        while item_id is not None:
+            if item_id in seen:
+                return True
+            seen.add(item_id)
+            item_id = items[item_id][0]
+    return False
+
+
+async def _delete_dates(tree: Tree):
+    root, first, second, nested, *offers = new_ids(6)
+    await tree.write(
+        (root, None, None), (first, root, None), (second, root, None),
+        (nested, first, None),
+        (offers[0], nested, 10), (offers[1], second, 20),
+    )
+    written = tree.date
+
+    async def dates_and_history():
+        async with Database.session() as db:
+            dates = dict((await db.execute(
+                select(Item.id, Item.date).where(Item.id.in_(list(tree.items)))
+            )).all())
+            history = (await db.execute(
+                select(ItemHistory.item_id, ItemHistory.date,
+                       ItemHistory.price).
+                where(ItemHistory.item_id.in_([root, first, second])).
+                where(ItemHistory.date > written)
+            )).all()
+        return dates, sorted(history)
+
+    # without date, deletes keep dates and history of ancestors
+    await tree.delete(offers[1])
+    dates, history = await dates_and_history()
+    assert set(dates.values()) == {written} and not history, (dates, history)
+
+    deleted = written + timedelta(hours=1)
+    for i in (nested, offers[0]):
+        del tree.items[i]
+    assert not await tree.accessor.delete_many([nested, offers[0]], deleted)
+    await tree.check()
+    dates, history = await dates_and_history()
+    assert dates == {
+        root: deleted, first: deleted, second: written,
+    }, dates
+    # ancestors without offers have no price
+    assert history == sorted([(root, deleted, None), (first, deleted, None)])
+    await tree.clear()
+
+
+async def _random_writes(tree: Tree, seed: int = 1, steps: int = 60):
+    rnd = random.Random(seed)
+    for _ in range(steps):
+        batch: dict[uuid.UUID, Node] = {}
+        for _ in range(rnd.randint(1, 8)):
+            categories = tree.categories() + [
+                i for i, (_, _, price) in batch.items() if price is None
+            ]
+            if rnd.random() < 0.3 or not tree.items:
+                item_id = uuid.uuid4()
+                price = rnd.randint(0, 1000) if rnd.random() < 0.6 else None
+                parent_id = rnd.choice(categories + [None])
+                batch[item_id] = item_id, parent_id, price
+                continue
+            item_id = rnd.choice(list(tree.items))
+            if item_id in batch:
+                continue
+            parent_id, price = tree.items[item_id]
+            if rnd.random() < 0.5:
+                below = tree.subtree(item_id)
+                parent_id = rnd.choice(
+                    [i for i in categories if i not in below] + [None]
+                )
+            if price is not None and rnd.random() < 0.6:
+                price = rnd.randint(0, 1000)
+            batch[item_id] = item_id, parent_id, price
+        if _has_cycle(tree.items | {i: v[1:] for i, v in batch.items()}):
+            await tree.reject(*batch.values())
+            continue
+        await tree.write(*batch.values())
+        if tree.items and rnd.random() < 0.15:
+            await tree.delete(rnd.choice(list(tree.items)))
+        await tree.check()
+    await tree.clear()
+
+
+async def run_all(seed: int = 1, steps: int = 60):
+    from main import get_config
+    await Database.connect({'config': get_config()})
+    try:
+        tree = Tree(ItemAccessor())
+        for test in (
+            _reprice, _move_offers, _move_categories, _cycles,
+            _cascade_deletes, _delete_dates,
+        ):
+            await test(tree)
+        await _random_writes(tree, seed, steps)
+    finally:
+        await Database.disconnect(None)
+
+
+def test_all(seed: int = 1, steps: int = 60):
+    asyncio.run(run_all(seed, steps))
+    print("Test aggregates passed.")
+
+
+if __name__ == "__main__":
+    test_all(*map(int, sys.argv[1:]))
@@ -0,0 +1,132 @@
+# encoding=utf8
+"""
+Benchmark of memory used by ``Catalog`` per million ``Items``, of its load
+time, and of reads it answers.
+
+With ``db`` argument also bootstraps catalog from database of ``config.env``,
+as server does on startup.
+
+Run from ``project`` directory: python -m tests.benchmark_catalog [items] [db]
+"""
+
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.accessors import ItemAccessor
+from app.catalog import Catalog
+from app.database import Database
+from app.models import ItemType
+
+DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+MODIFIED = int(DATE.timestamp() * 1000000)
+FETCH_SIZE = 10000
+
+
+def make_rows(size: int, fanout: int = 100) -> list[tuple]:
+    """
+    Rows as returned by ``ItemAccessor.iter_catalog_rows()``, each Offer
+    with its own name and one of 24 dates
+    """
+    root_id = category_id = str(uuid.uuid4())
+    rows = [(root_id, 'root', DATE, None, ItemType.CATEGORY.value, 1, MODIFIED)]
+    for i in range(size - 1):
+        if i % fanout == 0:
+            category_id = str(uuid.uuid4())
+            rows.append((
+                category_id, f'category {i}', DATE, root_id,
+                ItemType.CATEGORY.value, 1, MODIFIED,
+            ))
+        else:
+            rows.append((
+                str(uuid.uuid4()), f'offer {i}', DATE - timedelta(hours=i % 24),
+                category_id, ItemType.OFFER.value, i, MODIFIED,
+            ))
+    return rows
+
+
+def chunks(rows: list[tuple]) -> list[list[tuple]]:
+    return [rows[i:i + FETCH_SIZE] for i in range(0, len(rows), FETCH_SIZE)]
+
+
+def measure_memory(size: int) -> float:
+    """
+    Bytes taken by catalog per ``Item``: rows are made while traced, so
+    their names and ids kept by catalog are counted too
+    """
+    gc.collect()
+    tracemalloc.start()
+    rows = make_rows(size)
+    catalog = Catalog()
+    asyncio.run(catalog.load(chunks(rows)))
+    del rows
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(catalog.index) == size
+    return used / size
+
+
+def measure_load(size: int) -> Catalog:
+    rows = make_rows(size)
+    catalog = Catalog()
+    start = time.perf_counter()
+    asyncio.run(catalog.load(chunks(rows)))
+    seconds = time.perf_counter() - start
+    print(f'load: {seconds:.2f} s, {seconds * 1000000 / size:.2f} s per 1M items')
+    return catalog
+
+
+def measure_reads(catalog: Catalog) -> None:
+    root_id = uuid.UUID(catalog.ids[0])
+    start = time.perf_counter()
+    rows = catalog.get_rows(root_id)
+    print(f'/nodes rows of root ({len(rows)}): '
+          f'{time.perf_counter() - start:.3f} s')
+
+    category_id = uuid.UUID(catalog.ids[catalog.parents[-1]])
+    start = time.perf_counter()
+    for _ in range(1000):
+        catalog.get_rows(category_id)
+    print(f'/nodes rows of category: '
+          f'{(time.perf_counter() - start) * 1000:.3f} ms')
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        catalog.get_offers_in_date_range(DATE - timedelta(days=1), DATE, 100)
+    print(f'/sales page of 100: {(time.perf_counter() - start) * 1000:.3f} ms')
+
+
+async def bootstrap() -> None:
+    from main import get_config
+    await Database.connect({'config': get_config()})
+    try:
+        catalog = Catalog()
+        start = time.perf_counter()
+        await catalog.load(ItemAccessor().iter_catalog_rows(
+            fetch_size=FETCH_SIZE,
+        ))
+        seconds = time.perf_counter() - start
+    finally:
+        await Database.disconnect(None)
+    size = len(catalog.index)
+    print(f'bootstrap of {size} items from database: {seconds:.2f} s, '
+          f'{seconds * 1000000 / max(size, 1):.2f} s per 1M items')
+
+
+def main() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    used = measure_memory(size)
+    print(f'memory: {used:.0f} bytes per item, '
+          f'{used * 1000000 / 1024**2:.0f} MiB per 1M items')
+    measure_reads(measure_load(size))
+    if 'db' in sys.argv[2:]:
+        asyncio.run(bootstrap())
+
+
+if __name__ == '__main__':
+    main()
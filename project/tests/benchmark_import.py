@@ -0,0 +1,61 @@
+# encoding=utf8
+"""
+Micro-benchmark of per-item cost of preparing imported items for database:
+ORM ``Item`` objects converted back to column values vs plain ``ItemRow``.
+
+Run from ``project`` directory: python -m tests.benchmark_import [items]
+"""
+
+import sys
+import timeit
+import uuid
+
+from app.models import Item
+from app.schemas import ShopUnitImportRequest
+
+
+def make_request(size: int) -> dict:
+    root_id = str(uuid.uuid4())
+    items = [{'id': root_id, 'name': 'root', 'type': 'CATEGORY'}]
+    items += [
+        {
+            'id': str(uuid.uuid4()),
+            'name': f'offer {i}',
+            'type': 'OFFER',
+            'parentId': root_id,
+            'price': i,
+        }
+        for i in range(size - 1)
+    ]
+    return {'items': items, 'updateDate': '2022-02-01T12:00:00.000Z'}
+
+
+def orm_objects(data: dict) -> list[tuple]:
+    """
+    Former import path: ORM objects turned back to column values
+    """
+    date = data['update_date']
+    items = [Item(date=date, **item) for item in data['items']]
+    return [
+        tuple(getattr(item, name) for name in Item.data_columns)
+        for item in items
+    ]
+
+
+def plain_rows(data: dict) -> list[tuple]:
+    return ShopUnitImportRequest.make_rows(data)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    data = ShopUnitImportRequest().load(make_request(size))
+    assert orm_objects(data) == plain_rows(data)
+
+    for prepare in (orm_objects, plain_rows):
+        runs = 5
+        seconds = min(timeit.repeat(lambda: prepare(data), number=1, repeat=runs))
+        print(f'{prepare.__name__:>12}: {seconds / size * 1e6:8.2f} us/item')
+
+
+if __name__ == "__main__":
+    main()
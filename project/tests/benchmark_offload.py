@@ -0,0 +1,77 @@
+# encoding=utf8
+"""
+Benchmark of event loop lag while large ``/nodes`` responses are serialized
+inline or offloaded to thread or process pool.
+
+Run from ``project`` directory: python -m tests.benchmark_offload [items]
+"""
+
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.models import ItemType
+from app.offload import LoopLagMonitor, Offloader
+from app.serializers import dumps_shop_unit_rows
+
+DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_rows(size: int, fanout: int = 100) -> list[tuple]:
+    """
+    Subtree rows as returned by ``ItemAccessor.get_rows()``
+    """
+    root_id = category_id = str(uuid.uuid4())
+    rows = [(root_id, 'root', DATE, None, ItemType.CATEGORY.value, 1)]
+    for i in range(size - 1):
+        if i % fanout == 0:
+            category_id = str(uuid.uuid4())
+            rows.append((
+                category_id, f'category {i}', DATE, root_id,
+                ItemType.CATEGORY.value, 1,
+            ))
+        else:
+            rows.append((
+                str(uuid.uuid4()), f'offer {i}', DATE, category_id,
+                ItemType.OFFER.value, i,
+            ))
+    return rows
+
+
+async def measure(executor: str, rows: list[tuple], requests: int) -> None:
+    offloader = Offloader(executor, workers=2, threshold=0)
+    monitor = LoopLagMonitor(interval=0.005)
+    await offloader.start(None)
+    # pool warm-up is not measured
+    await offloader.run(len(rows), dumps_shop_unit_rows, rows[:1], rows[0][0])
+    await monitor.start()
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await offloader.run(len(rows), dumps_shop_unit_rows, rows, rows[0][0])
+        # other requests would be served here
+        await asyncio.sleep(0.01)
+    seconds = time.perf_counter() - start
+
+    await monitor.stop()
+    await offloader.stop(None)
+    stats = monitor.stats()
+    print(
+        f'{executor:>8}: {seconds / requests * 1e3:8.1f} ms/response,'
+        f' loop lag max {stats["max"] * 1e3:7.1f} ms,'
+        f' mean {stats["mean"] * 1e3:6.1f} ms'
+    )
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = make_rows(size)
+    for executor in ('none', 'thread', 'process'):
+        asyncio.run(measure(executor, rows, requests=5))
+
+
+if __name__ == "__main__":
+    main()
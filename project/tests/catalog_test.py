@@ -0,0 +1,230 @@
+# encoding=utf8
+"""
+Checks ``Catalog``: ``/nodes`` and ``/sales`` reads after load and after
+syncs of notified writes, with rows read from a fake accessor instead of
+database.
+
+Run from ``project`` directory: python -m tests.catalog_test
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app import serializers
+from app.catalog import Catalog
+from app.models import ItemType
+
+DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+OFFER, CATEGORY = ItemType.OFFER.value, ItemType.CATEGORY.value
+
+
+class Items:
+    """
+    Rows of ``ItemAccessor.iter_catalog_rows()`` kept by id, each write
+    gets later ``modified``
+    """
+
+    def __init__(self):
+        self.rows: dict[str, tuple] = {}
+        self.time = 0
+
+    def write(self, id_, name, parent_id, type_, price=None, date=DATE):
+        self.time += 1
+        self.rows[id_] = (id_, name, date, parent_id, type_, price, self.time)
+
+    def delete(self, *ids) -> int:
+        self.time += 1
+        for id_ in ids:
+            self.rows.pop(id_, None)
+        return self.time
+
+    async def iter_catalog_rows(self, after=None, fetch_size=2):
+        after = None if after is None else _microseconds(after)
+        rows = [
+            row for row in self.rows.values()
+            if after is None or row[-1] > after
+        ]
+        for i in range(0, len(rows), fetch_size):
+            yield rows[i:i + fetch_size]
+
+
+def _microseconds(value: datetime) -> int:
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (value - epoch) // timedelta(microseconds=1)
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+async def make_catalog(items: Items) -> Catalog:
+    catalog = Catalog(fetch_size=2)
+    catalog._items = items
+    await catalog.load(items.iter_catalog_rows())
+    catalog.ready = True
+    return catalog
+
+
+def node(catalog: Catalog, item_id: str) -> dict | None:
+    rows = catalog.get_rows(uuid.UUID(item_id))
+    if rows is None:
+        return None
+    unit = json.loads(serializers.dumps_shop_unit_ordered_rows(rows))
+    # same as built from unordered rows
+    plain = [row[:-1] for row in rows]
+    assert unit == json.loads(serializers.dumps_shop_unit_rows(plain, item_id))
+    return unit
+
+
+def children_ids(unit: dict) -> set[str]:
+    return {child['id'] for child in unit['children']}
+
+
+async def _load_and_sync():
+    items = Items()
+    root, phones, tvs = new_id(), new_id(), new_id()
+    phone, tv = new_id(), new_id()
+    items.write(root, 'root', None, CATEGORY, 150)
+    items.write(phones, 'phones', root, CATEGORY, 100)
+    items.write(phone, 'phone', phones, OFFER, 100)
+    items.write(tvs, 'tvs', root, CATEGORY, 200)
+    items.write(tv, 'tv', tvs, OFFER, 200)
+    catalog = await make_catalog(items)
+
+    unit = node(catalog, root)
+    assert children_ids(unit) == {phones, tvs}, unit
+    assert unit['price'] == 150
+    assert node(catalog, tv)['children'] is None
+    assert catalog.get_modified(uuid.UUID(root)) is not None
+    assert node(catalog, new_id()) is None
+
+    # move offer to other category
+    items.write(tv, 'tv', phones, OFFER, 200)
+    items.write(phones, 'phones', root, CATEGORY, 150)
+    items.write(tvs, 'tvs', root, CATEGORY, None)
+    await catalog.sync()
+    assert children_ids(node(catalog, phones)) == {phone, tv}
+    assert node(catalog, tvs)['children'] == []
+    assert node(catalog, tvs)['price'] is None
+    assert node(catalog, tv)['parentId'] == phones
+
+    # delete category with its offers
+    time = items.delete(phones, phone, tv)
+    items.write(root, 'root', None, CATEGORY, None)
+    await catalog.sync([uuid.UUID(phones)], time)
+    assert node(catalog, phones) is None and node(catalog, tv) is None
+    assert children_ids(node(catalog, root)) == {tvs}
+    assert len(catalog.index) == 2
+
+    # positions of deleted Items are reused
+    new_phone = new_id()
+    items.write(new_phone, 'phone', tvs, OFFER, 10)
+    await catalog.sync()
+    assert len(catalog.ids) == 5, catalog.ids
+    assert children_ids(node(catalog, tvs)) == {new_phone}
+
+
+async def _delete_after_rewrite():
+    items = Items()
+    category, offer = new_id(), new_id()
+    items.write(category, 'category', None, CATEGORY, 1)
+    items.write(offer, 'offer', category, OFFER, 1)
+    catalog = await make_catalog(items)
+
+    # deleted and imported again before delete is notified
+    time = items.delete(category, offer)
+    items.write(category, 'category', None, CATEGORY, None)
+    await catalog.sync()
+    await catalog.sync([uuid.UUID(category)], time)
+    assert node(catalog, category) == {
+        'id': category, 'name': 'category', 'date': '2022-02-01T12:00:00.000Z',
+        'parentId': None, 'type': CATEGORY, 'price': None, 'children': [],
+    }
+    assert node(catalog, offer) is None
+
+
+async def _sales():
+    items = Items()
+    category = new_id()
+    items.write(category, 'category', None, CATEGORY, 1)
+    offers = []
+    for i in range(10):
+        offers.append(new_id())
+        items.write(
+            offers[-1], f'offer {i}', category, OFFER, i,
+            date=DATE - timedelta(hours=i % 3),
+        )
+    catalog = await make_catalog(items)
+
+    def sales(start, end, limit=None, after=None):
+        return [
+            offer.id for offer in
+            catalog.get_offers_in_date_range(start, end, limit, after)
+        ]
+
+    expected = sorted(
+        (row[2], row[0]) for row in items.rows.values() if row[4] == OFFER
+    )
+    assert sales(DATE - timedelta(days=1), DATE) == [i for _, i in expected]
+    assert sales(DATE, DATE) == [i for date, i in expected if date == DATE]
+    page = catalog.get_offers_in_date_range(DATE - timedelta(days=1), DATE, 4)
+    after = (page[-1].date, uuid.UUID(page[-1].id))
+    assert sales(DATE - timedelta(days=1), DATE, 4, after) == [
+        i for _, i in expected[4:8]
+    ]
+
+    # date changed by import, offer deleted
+    items.write(offers[0], 'offer 0', category, OFFER, 0,
+                date=DATE - timedelta(days=2))
+    time = items.delete(offers[1])
+    await catalog.sync([uuid.UUID(offers[1])], time)
+    assert offers[0] not in sales(DATE - timedelta(days=1), DATE)
+    assert offers[1] not in sales(DATE - timedelta(days=3), DATE)
+    assert sales(DATE - timedelta(days=3), DATE - timedelta(days=2)) == [
+        offers[0]
+    ]
+
+
+async def _page_rows():
+    items = Items()
+    root = new_id()
+    items.write(root, 'root', None, CATEGORY, 1)
+    children = sorted(new_id() for _ in range(5))
+    for i, child in enumerate(children):
+        items.write(child, f'child {i}', root, CATEGORY if i % 2 else OFFER, 1)
+    grandchild = new_id()
+    items.write(grandchild, 'grandchild', children[1], OFFER, 1)
+    catalog = await make_catalog(items)
+
+    def page(depth=None, limit=None, after=None):
+        rows = catalog.get_page_rows(uuid.UUID(root), depth, limit, after)
+        return [(row[0], row[-2], row[-1]) for row in rows]
+
+    # ordered by ids, each category followed by its subtree
+    rest = [(child, i, None) for i, child in enumerate(children[2:], 3)]
+    assert page() == [
+        (root, 1, None), (children[0], 1, None), (children[1], 2, None),
+        (grandchild, 1, None), *rest,
+    ]
+    assert page(depth=0) == [(root, 1, True)]
+    # one more child of rank above limit, not expanded
+    assert page(depth=1, limit=2) == [
+        (root, 1, None), (children[0], 1, None), (children[1], 2, True),
+        (children[2], 3, None),
+    ]
+    assert page(limit=1, after=uuid.UUID(children[3])) == [
+        (root, 1, None), (children[4], 1, None),
+    ]
+    assert catalog.get_page_rows(uuid.uuid4()) is None
+
+
+def test_all():
+    for test in (_load_and_sync, _delete_after_rewrite, _sales, _page_rows):
+        asyncio.run(test())
+    print("Test catalog passed.")
+
+
+if __name__ == "__main__":
+    test_all()
@@ -0,0 +1,92 @@
+# encoding=utf8
+"""
+Checks ``ImportCoalescer``: imports submitted together are written by one
+call in order of submission, each one gets its own result, and writes are
+made one at a time.
+
+Run from ``project`` directory: python -m tests.coalescing_test
+"""
+
+import asyncio
+
+from app.coalescing import ImportCoalescer
+
+
+class Writer:
+    """
+    Records imports of each write, fails imports with ``'invalid'`` row
+    """
+
+    def __init__(self, seconds: float = 0.0):
+        self.seconds = seconds
+        self.writes: list[list] = []
+        self.running = 0
+
+    async def __call__(self, imports):
+        self.running += 1
+        assert self.running == 1, "concurrent writes"
+        await asyncio.sleep(self.seconds)
+        self.writes.append(imports)
+        self.running -= 1
+        return [
+            ValueError(rows) if 'invalid' in rows else None
+            for rows in imports
+        ]
+
+
+async def _coalesced():
+    writer = Writer()
+    coalescer = ImportCoalescer(writer, window=0.01)
+    results = await asyncio.gather(
+        coalescer.submit(['a']),
+        coalescer.submit(['invalid']),
+        coalescer.submit(['b', 'c']),
+        return_exceptions=True,
+    )
+    assert writer.writes == [[['a'], ['invalid'], ['b', 'c']]], writer.writes
+    assert results[0] is None and results[2] is None, results
+    assert isinstance(results[1], ValueError), results
+    assert coalescer.stats() == {'imports': 3, 'writes': 1}
+
+
+async def _max_items():
+    writer = Writer()
+    coalescer = ImportCoalescer(writer, window=10, max_items=3)
+    await asyncio.wait_for(asyncio.gather(
+        coalescer.submit(['a', 'b']),
+        coalescer.submit(['c']),
+    ), timeout=1)
+    assert writer.writes == [[['a', 'b'], ['c']]], writer.writes
+
+
+async def _one_write_at_a_time():
+    writer = Writer(seconds=0.05)
+    coalescer = ImportCoalescer(writer, window=0.001)
+    first = asyncio.create_task(coalescer.submit(['a']))
+    await asyncio.sleep(0.01)
+    # submitted while the first write is made
+    await asyncio.gather(
+        first, coalescer.submit(['b']), coalescer.submit(['c']),
+    )
+    assert writer.writes == [[['a']], [['b'], ['c']]], writer.writes
+
+
+async def _failed_write():
+    async def write(imports):
+        raise ConnectionError
+    coalescer = ImportCoalescer(write, window=0.001)
+    results = await asyncio.gather(
+        coalescer.submit(['a']), coalescer.submit(['b']),
+        return_exceptions=True,
+    )
+    assert all(isinstance(r, ConnectionError) for r in results), results
+
+
+def test_all():
+    for test in (_coalesced, _max_items, _one_write_at_a_time, _failed_write):
+        asyncio.run(test())
+    print("Test coalescing passed.")
+
+
+if __name__ == "__main__":
+    test_all()
@@ -0,0 +1,319 @@
+# encoding=utf8
+"""
+Load test of running server with a synthetic catalog.
+
+Imports a catalog tree of given ``depth`` and ``fanout`` with ``offers`` in
+every leaf category, then replays mixed workload of ``/imports``, ``/nodes``,
+``/sales``, ``/delete`` and ``/node/{id}/statistic`` requests at target RPS
+for ``duration`` seconds. Requests are sent on schedule regardless of
+responses, latency is counted from scheduled time, so server stalls are
+not hidden by a slowed down client.
+
+Prints JSON report with latency percentiles and throughput by endpoint,
+``--baseline`` report of another commit adds relative changes of them.
+
+Run from ``project`` directory: python -m tests.load_test --help
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+
+START_DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+DEFAULT_MIX = 'nodes=50,sales=15,statistic=15,imports=15,delete=5'
+PERCENTILES = (50, 95, 99)
+
+
+def iso(date: datetime) -> str:
+    return date.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class Catalog:
+    """
+    Synthetic catalog tree and its changes made by workload
+    """
+
+    def __init__(self, depth: int, fanout: int, offers: int, seed: int):
+        self.random = random.Random(seed)
+        self.categories: list[str] = []
+        self.parents: dict[str, str | None] = {}
+        self.offers: list[str] = []
+        self.items: list[dict] = []
+        self.imports = 0
+        self._make_category(None, depth, fanout, offers)
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def _make_category(self, parent_id, depth, fanout, offers) -> None:
+        category_id = self._uuid()
+        self.categories.append(category_id)
+        self.parents[category_id] = parent_id
+        self.items.append({
+            'id': category_id, 'name': f'category {len(self.categories)}',
+            'type': 'CATEGORY', 'parentId': parent_id,
+        })
+        if depth > 0:
+            for _ in range(fanout):
+                self._make_category(category_id, depth - 1, fanout, offers)
+            return
+        for _ in range(offers):
+            offer_id = self._uuid()
+            self.offers.append(offer_id)
+            self.parents[offer_id] = category_id
+            self.items.append({
+                'id': offer_id, 'name': f'offer {len(self.offers)}',
+                'type': 'OFFER', 'parentId': category_id,
+                'price': self.random.randint(1, 10**6),
+            })
+
+    def next_date(self) -> datetime:
+        self.imports += 1
+        return START_DATE + timedelta(minutes=self.imports)
+
+    def import_batches(self, size: int):
+        # parents go before children, so every batch is valid by itself
+        for i in range(0, len(self.items), size):
+            yield {
+                'items': self.items[i:i + size],
+                'updateDate': iso(self.next_date()),
+            }
+
+    def price_update(self, size: int) -> dict:
+        """
+        Import of new prices for random offers, some moved to other category
+        """
+        items = []
+        size = min(size, len(self.offers))
+        for offer_id in self.random.sample(self.offers, size):
+            if self.random.random() < 0.2:
+                self.parents[offer_id] = self.random.choice(self.categories)
+            items.append({
+                'id': offer_id, 'name': 'offer', 'type': 'OFFER',
+                'parentId': self.parents[offer_id],
+                'price': self.random.randint(1, 10**6),
+            })
+        return {'items': items, 'updateDate': iso(self.next_date())}
+
+    def pop_offer(self) -> str | None:
+        if len(self.offers) <= 1:
+            return None
+        offer_id = self.offers.pop(self.random.randrange(len(self.offers)))
+        del self.parents[offer_id]
+        return offer_id
+
+
+class Workload:
+    def __init__(self, session: aiohttp.ClientSession, catalog: Catalog,
+                 import_size: int):
+        self.session = session
+        self.catalog = catalog
+        self.import_size = import_size
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.errors: defaultdict[str, int] = defaultdict(int)
+
+    async def request(self, endpoint: str, method: str, path: str,
+                      scheduled: float, **kwargs) -> None:
+        try:
+            async with self.session.request(method, path, **kwargs) as resp:
+                await resp.read()
+                ok = resp.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        self.latencies[endpoint].append(time.perf_counter() - scheduled)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def nodes(self, scheduled: float):
+        category_id = self.catalog.random.choice(self.catalog.categories)
+        return self.request('nodes', 'GET', f'/nodes/{category_id}', scheduled)
+
+    def sales(self, scheduled: float):
+        date = START_DATE + timedelta(
+            minutes=self.catalog.random.randint(1, self.catalog.imports)
+        )
+        return self.request(
+            'sales', 'GET', '/sales', scheduled, params={'date': iso(date)},
+        )
+
+    def statistic(self, scheduled: float):
+        item_id = self.catalog.random.choice(
+            self.catalog.categories + self.catalog.offers[:100]
+        )
+        return self.request(
+            'statistic', 'GET', f'/node/{item_id}/statistic', scheduled,
+        )
+
+    def imports(self, scheduled: float):
+        body = self.catalog.price_update(self.import_size)
+        return self.request('imports', 'POST', '/imports', scheduled, json=body)
+
+    def delete(self, scheduled: float):
+        offer_id = self.catalog.pop_offer()
+        if offer_id is None:
+            return self.nodes(scheduled)
+        return self.request(
+            'delete', 'DELETE', f'/delete/{offer_id}', scheduled,
+        )
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(','):
+        name, weight = part.split('=')
+        if name not in ('nodes', 'sales', 'statistic', 'imports', 'delete'):
+            raise argparse.ArgumentTypeError(f'unknown endpoint: {name}')
+        weights[name] = int(weight)
+    return weights
+
+
+def percentile(values: list[float], p: int) -> float:
+    """
+    Nearest-rank percentile of sorted ``values``
+    """
+    rank = max(0, -(-len(values) * p // 100) - 1)
+    return values[rank]
+
+
+def summary(latencies: list[float], errors: int, seconds: float) -> dict:
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / seconds, 2),
+    }
+    if latencies:
+        for p in PERCENTILES:
+            result[f'p{p}_ms'] = round(percentile(latencies, p) * 1e3, 2)
+        result['max_ms'] = round(latencies[-1] * 1e3, 2)
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """
+    Relative changes of latencies and throughput against ``baseline``
+    """
+    changes = {}
+    for endpoint, stats in report['endpoints'].items():
+        base = baseline['endpoints'].get(endpoint, {})
+        changes[endpoint] = {
+            key: round(value / base[key] - 1, 3)
+            for key, value in stats.items()
+            if key not in ('requests', 'errors') and base.get(key)
+        }
+    return changes
+
+
+async def run(args: argparse.Namespace) -> dict:
+    catalog = Catalog(args.depth, args.fanout, args.offers, args.seed)
+    mix = parse_mix(args.mix)
+    endpoints, weights = list(mix), list(mix.values())
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(
+        args.url, connector=connector, timeout=timeout,
+    ) as session:
+        setup_start = time.perf_counter()
+        for batch in catalog.import_batches(args.batch_size):
+            async with session.post('/imports', json=batch) as resp:
+                if resp.status != 200:
+                    sys.exit(f'catalog import failed: {resp.status}')
+        setup_seconds = time.perf_counter() - setup_start
+
+        workload = Workload(session, catalog, args.import_size)
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(args.rps * args.duration)):
+            scheduled = start + i / args.rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            endpoint = catalog.random.choices(endpoints, weights)[0]
+            tasks.append(asyncio.create_task(
+                getattr(workload, endpoint)(scheduled)
+            ))
+        await asyncio.gather(*tasks)
+        seconds = time.perf_counter() - start
+
+    all_latencies = [t for lat in workload.latencies.values() for t in lat]
+    return {
+        'commit': git_commit(),
+        'options': vars(args),
+        'catalog': {
+            'items': len(catalog.items),
+            'categories': len(catalog.categories),
+            'import_seconds': round(setup_seconds, 2),
+        },
+        'seconds': round(seconds, 2),
+        'total': summary(
+            all_latencies, sum(workload.errors.values()), seconds,
+        ),
+        'endpoints': {
+            endpoint: summary(
+                workload.latencies[endpoint], workload.errors[endpoint],
+                seconds,
+            )
+            for endpoint in endpoints if workload.latencies[endpoint]
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://localhost:80')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='levels of categories below root')
+    parser.add_argument('--fanout', type=int, default=5,
+                        help='subcategories of each category')
+    parser.add_argument('--offers', type=int, default=20,
+                        help='offers in each leaf category')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='items in each catalog import')
+    parser.add_argument('--import-size', type=int, default=10,
+                        help='offers updated by each workload import')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='endpoints weights in workload')
+    parser.add_argument('--rps', type=float, default=100)
+    parser.add_argument('--duration', type=float, default=10,
+                        help='workload duration in seconds')
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='report file instead of stdout')
+    parser.add_argument('--baseline', help='report to compare with')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['changes'] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+# encoding=utf8
+"""
+Checks ``/nodes`` views on application started in this process, reading
+database and, with ``CATALOG_ENABLED``, catalog: 304 responses to conditional
+requests, pages of ``depth``, ``limit`` and ``cursor`` against whole subtrees,
+``POST /nodes`` limited by ``NODES_STREAM_THRESHOLD``, and database reads
+while catalog is loaded in background.
+
+Needs database of ``config.env`` migrated to head, the server may be running.
+
+Run from ``project`` directory: python -m tests.nodes_test
+"""
+
+import asyncio
+import base64
+import os
+import random
+import uuid
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator
+
+from aiohttp.test_utils import TestClient, TestServer
+from aiohttp.web_app import Application
+
+from app.catalog import Catalog
+from main import app_factory
+
+DATE = "2022-02-01T12:00:00.000Z"
+LATER_DATE = "2022-02-02T12:00:00.000Z"
+
+
+async def make_app(**env: str) -> Application:
+    """
+    Application configured by ``env`` overrides of ``config.env``
+    """
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        return await app_factory()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+async def wait_ready(catalog: Catalog):
+    for _ in range(500):
+        if catalog.ready:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('catalog is not ready')
+
+
+@asynccontextmanager
+async def client(**env: str) -> AsyncIterator[TestClient]:
+    """
+    Client of application made by ``make_app()``, started with catalog
+    loaded, if it is enabled
+    """
+    app = await make_app(**env)
+    async with TestClient(TestServer(app)) as test_client:
+        if app['catalog'] is not None:
+            await wait_ready(app['catalog'])
+        yield test_client
+
+
+def category(item_id: str, parent_id: str | None = None) -> dict:
+    return {"id": item_id, "name": item_id, "type": "CATEGORY",
+            "parentId": parent_id}
+
+
+def offer(item_id: str, parent_id: str, price: int) -> dict:
+    return {"id": item_id, "name": item_id, "type": "OFFER",
+            "parentId": parent_id, "price": price}
+
+
+def make_tree(offers: int) -> tuple[str, list[dict]]:
+    """
+    Root category with a subcategory and ``offers`` offers split between them
+    """
+    root_id, child_id = str(uuid.uuid4()), str(uuid.uuid4())
+    items = [category(root_id), category(child_id, root_id)]
+    for i in range(offers):
+        items.append(offer(str(uuid.uuid4()), (root_id, child_id)[i % 2], i))
+    return root_id, items
+
+
+async def _conditional(env: dict[str, str]):
+    root_id, items = make_tree(2)
+    async with client(**env) as http:
+        response = await http.post(
+            '/imports', json={"items": items, "updateDate": DATE},
+        )
+        assert response.status == 200
+        # ``Last-Modified`` is sent once the second of write is over
+        await asyncio.sleep(1)
+        # whole subtree, read and then from cache, and pages of it
+        paths = [f'/nodes/{root_id}', f'/nodes/{root_id}',
+                 f'/nodes/{root_id}?depth=1', f'/nodes/{root_id}/children']
+        for path in paths:
+            response = await http.get(path)
+            assert response.status == 200
+            etag = response.headers['ETag']
+            last_modified = response.headers['Last-Modified']
+            assert etag.startswith('W/"'), etag
+            earlier = format_datetime(
+                parsedate_to_datetime(last_modified) - timedelta(seconds=1),
+                usegmt=True,
+            )
+            for headers, status in (
+                ({'If-None-Match': etag}, 304),
+                ({'If-None-Match': etag.removeprefix('W/')}, 304),
+                ({'If-None-Match': f'"other", {etag}'}, 304),
+                ({'If-None-Match': '*'}, 304),
+                ({'If-None-Match': 'W/"other"'}, 200),
+                ({'If-Modified-Since': last_modified}, 304),
+                ({'If-Modified-Since': earlier}, 200),
+                # If-None-Match wins over If-Modified-Since
+                ({'If-None-Match': 'W/"other"',
+                  'If-Modified-Since': last_modified}, 200),
+            ):
+                response = await http.get(path, headers=headers)
+                assert response.status == status, (path, headers)
+                assert response.headers['ETag'] == etag
+                if status == 304:
+                    assert await response.read() == b''
+
+        # a write below the root changes its validators
+        items[-1]["price"] += 1
+        response = await http.post(
+            '/imports', json={"items": items[-1:], "updateDate": LATER_DATE},
+        )
+        assert response.status == 200
+        for path in paths:
+            response = await http.get(
+                path, headers={'If-None-Match': etag},
+            )
+            assert response.status == 200, path
+            assert response.headers['ETag'] != etag
+            response = await http.get(
+                path, headers={'If-Modified-Since': last_modified},
+            )
+            assert response.status == 200, path
+        response = await http.delete(f'/delete/{root_id}')
+        assert response.status == 200
+
+
+def make_random_tree(rnd: random.Random, size: int) -> tuple[str, list[dict]]:
+    """
+    Root category with ``size`` random offers and categories below it
+    """
+    root_id = str(uuid.uuid4())
+    items = [category(root_id)]
+    categories = [root_id]
+    for _ in range(size):
+        item_id, parent_id = str(uuid.uuid4()), rnd.choice(categories)
+        if rnd.random() < 0.6:
+            items.append(offer(item_id, parent_id, rnd.randint(0, 1000)))
+        else:
+            items.append(category(item_id, parent_id))
+            categories.append(item_id)
+    return root_id, items
+
+
+def children_cursor(item_id: str) -> str:
+    return base64.urlsafe_b64encode(item_id.encode()).decode()
+
+
+FIRST_CURSOR = children_cursor(str(uuid.UUID(int=0)))
+
+
+def page(unit: dict, depth: int | None, limit: int | None,
+         after: str | None, level: int = 0) -> dict:
+    """
+    Page of ``/nodes/{id}`` expected from ``unit`` of whole subtree
+    """
+    node = {name: value for name, value in unit.items() if name != 'children'}
+    if unit['type'] == 'OFFER':
+        return node | {'children': None}
+    children = sorted(unit['children'], key=lambda child: child['id'])
+    if level == 0 and after is not None and depth != 0:
+        children = [child for child in children if child['id'] > after]
+    if level == depth:
+        # not listed, the cursor starts from the first one
+        return node | {'children': [],
+                       'nextCursor': FIRST_CURSOR if children else None}
+    listed = children if limit is None else children[:limit]
+    return node | {
+        'children': [
+            page(child, depth, limit, after, level + 1) for child in listed
+        ],
+        'nextCursor': (
+            children_cursor(listed[-1]['id'])
+            if len(listed) < len(children) else None
+        ),
+    }
+
+
+def subtree_units(unit: dict) -> list[dict]:
+    units = [unit]
+    for child in unit['children'] or ():
+        units.extend(subtree_units(child))
+    return units
+
+
+async def read_children(http: TestClient, item_id: str,
+                        limit: int | None) -> list[dict]:
+    """
+    All children of ``/nodes/{id}/children`` by pages of ``limit``
+    """
+    children, cursor = [], None
+    while True:
+        query = {name: value for name, value in
+                 (('limit', limit), ('cursor', cursor)) if value is not None}
+        response = await http.get(f'/nodes/{item_id}/children', params=query)
+        assert response.status == 200, (item_id, query)
+        body = await response.json()
+        assert limit is None or len(body['items']) <= limit
+        children.extend(body['items'])
+        cursor = body['nextCursor']
+        if cursor is None:
+            return children
+
+
+async def _pages(env: dict[str, str], seed: int = 1):
+    rnd = random.Random(seed)
+    root_id, items = make_random_tree(rnd, 80)
+    other_id, other_items = make_random_tree(rnd, 5)
+    async with client(**env) as http:
+        response = await http.post(
+            '/imports',
+            json={"items": items + other_items, "updateDate": DATE},
+        )
+        assert response.status == 200
+        response = await http.get(f'/nodes/{root_id}')
+        root = await response.json()
+        units = subtree_units(root)
+        response = await http.get(f'/nodes/{other_id}')
+        other = await response.json()
+        # cursor of another category bounds ids only
+        foreign_ids = [child['id'] for child in other['children']]
+
+        count = 0
+        for unit in rnd.sample(units, 15) + [root]:
+            child_ids = [child['id'] for child in unit['children'] or ()]
+            cursors = [None, *rnd.sample(child_ids, min(len(child_ids), 1))]
+            cursors.append(rnd.choice(foreign_ids))
+            for depth in (None, 0, 1, 2):
+                for limit in (None, 1, 3):
+                    for after in cursors:
+                        query = {name: value for name, value in (
+                            ('depth', depth), ('limit', limit),
+                            ('cursor', after and children_cursor(after)),
+                        ) if value is not None}
+                        if not query:
+                            continue
+                        response = await http.get(
+                            f'/nodes/{unit["id"]}', params=query,
+                        )
+                        assert response.status == 200, (unit['id'], query)
+                        expected = page(unit, depth, limit, after)
+                        assert await response.json() == expected, \
+                            (unit['id'], query)
+                        count += 1
+        assert count > 200, count
+
+        # pages of children cover them once, the last full page included
+        for unit in units:
+            if unit['type'] == 'OFFER':
+                continue
+            expected = sorted(
+                ({name: value for name, value in child.items()
+                  if name != 'children'} for child in unit['children']),
+                key=lambda child: child['id'],
+            )
+            for limit in {None, 1, 2, 7, len(expected) or 1}:
+                children = await read_children(http, unit['id'], limit)
+                assert children == expected, (unit['id'], limit)
+        response = await http.get(
+            f'/nodes/{root_id}/children',
+            params={'limit': len(root['children'])},
+        )
+        assert (await response.json())['nextCursor'] is None
+
+        after = rnd.choice(foreign_ids)
+        response = await http.get(
+            f'/nodes/{root_id}/children',
+            params={'cursor': children_cursor(after)},
+        )
+        assert [child['id'] for child in (await response.json())['items']] \
+            == sorted(child['id'] for child in root['children']
+                      if child['id'] > after)
+
+        for path, query in (
+            (f'/nodes/{root_id}', {'cursor': 'xx'}),
+            (f'/nodes/{root_id}', {'cursor': children_cursor('xx')}),
+            (f'/nodes/{root_id}/children', {'cursor': 'xx'}),
+            (f'/nodes/{root_id}/children', {'cursor': children_cursor('xx')}),
+            (f'/nodes/{root_id}', {'limit': '0'}),
+            (f'/nodes/{root_id}', {'depth': '-1'}),
+            (f'/nodes/{root_id}/children', {'limit': '0'}),
+        ):
+            response = await http.get(path, params=query)
+            assert response.status == 400, (path, query)
+        for path in (f'/nodes/{uuid.uuid4()}?depth=1',
+                     f'/nodes/{uuid.uuid4()}/children'):
+            response = await http.get(path)
+            assert response.status == 404, path
+
+        response = await http.post(
+            '/delete', json={"ids": [root_id, other_id]},
+        )
+        assert response.status == 200
+
+
+async def _batch_limit(env: dict[str, str]):
+    big_id, big = make_tree(6)
+    small_id, small = make_tree(0)
+    async with client(**env, NODES_STREAM_THRESHOLD='8') as http:
+        response = await http.post(
+            '/imports', json={"items": big + small, "updateDate": DATE},
+        )
+        assert response.status == 200
+        missing_id = str(uuid.uuid4())
+        for ids, status in (
+            ([big_id, small_id], 413),
+            ([missing_id, big_id], 200),
+            ([small_id, missing_id], 200),
+        ):
+            response = await http.post('/nodes', json={"ids": ids})
+            assert response.status == status, (ids, response.status)
+            body = await response.json()
+            if status == 413:
+                assert body == {"code": 413, "message": "Too many items"}
+                continue
+            assert [unit["id"] for unit in body["items"]] == \
+                [i for i in ids if i != missing_id]
+            assert body["notFound"] == [missing_id]
+        response = await http.post('/delete', json={"ids": [big_id, small_id]})
+        assert response.status == 200
+
+
+async def _catalog_bootstrap():
+    root_id, items = make_tree(2)
+    async with client() as http:
+        response = await http.post(
+            '/imports', json={"items": items, "updateDate": DATE},
+        )
+        assert response.status == 200
+
+    # server starts while catalog is loaded, reads go to database meanwhile
+    app = await make_app(CATALOG_ENABLED='true')
+    catalog: Catalog = app['catalog']
+    loading = asyncio.Event()
+    iter_catalog_rows = app['items'].iter_catalog_rows
+
+    async def held_rows(*args, **kwargs):
+        await loading.wait()
+        async for rows in iter_catalog_rows(*args, **kwargs):
+            yield rows
+
+    app['items'].iter_catalog_rows = held_rows
+    async with TestClient(TestServer(app)) as http:
+        assert not catalog.ready
+        response = await http.get(f'/nodes/{root_id}')
+        assert response.status == 200
+        assert (await response.json())["price"] == 0
+        assert not catalog.ready
+
+        loading.set()
+        await wait_ready(catalog)
+        assert catalog.get_modified(root_id) is not None
+        response = await http.post('/delete', json={"ids": [root_id]})
+        assert response.status == 200
+        assert catalog.get_modified(root_id) is None
+
+
+async def run_all():
+    for env in ({}, {'CACHE_MAX_SIZE': '0'}, {'CATALOG_ENABLED': 'true'}):
+        await _conditional(env)
+    for env in ({}, {'CATALOG_ENABLED': 'true'}):
+        await _pages(env)
+    # without cache every response is read, so the limit always applies
+    for env in ({}, {'CATALOG_ENABLED': 'true'}):
+        env = {'CACHE_MAX_SIZE': '0', **env}
+        await _batch_limit(env)
+    await _catalog_bootstrap()
+
+
+def test_all():
+    asyncio.run(run_all())
+    print("Test nodes passed.")
+
+
+if __name__ == "__main__":
+    test_all()
@@ -0,0 +1,43 @@
+# encoding=utf8
+"""
+Checks that ``Offloader`` with process executor starts inside a prefork
+worker process, as ``main.py --workers`` runs it.
+
+Run from ``project`` directory: python -m tests.offload_test
+"""
+
+import asyncio
+import multiprocessing
+
+from app.offload import Offloader
+from main import start_worker_process
+
+
+async def run_offloaded() -> int:
+    offloader = Offloader('process', workers=1, threshold=0)
+    await offloader.start(None)
+    try:
+        return await offloader.run(1, pow, 2, 10)
+    finally:
+        await offloader.stop(None)
+
+
+def worker(results: multiprocessing.SimpleQueue) -> None:
+    results.put(asyncio.run(run_offloaded()))
+
+
+def test_process_executor_in_worker():
+    results = multiprocessing.get_context('fork').SimpleQueue()
+    process = start_worker_process(worker, results)
+    process.join(60)
+    assert process.exitcode == 0, process.exitcode
+    assert results.get() == 1024
+
+
+def test_all():
+    test_process_executor_in_worker()
+    print("Test offload passed.")
+
+
+if __name__ == "__main__":
+    test_all()
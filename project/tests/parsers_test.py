@@ -0,0 +1,145 @@
+# encoding=utf8
+"""
+Checks ``ImportRequestStream``: rows parsed from body split into chunks at
+any position are the same as from whole body, and invalid bodies are
+rejected.
+
+Run from ``project`` directory: python -m tests.parsers_test
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+from aiohttp.web_exceptions import HTTPRequestEntityTooLarge
+from marshmallow import ValidationError
+
+from app.models import ItemRow
+from app.parsers import ImportRequestStream
+
+DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+CATEGORY_ID, OFFER_ID = str(uuid.uuid4()), str(uuid.uuid4())
+ITEMS = [
+    {"id": CATEGORY_ID, "name": "Тв \"и\" \\ телефоны", "type": "CATEGORY",
+     "parentId": None},
+    {"id": OFFER_ID, "name": "Offer\n\t☃", "type": "OFFER",
+     "parentId": CATEGORY_ID, "price": 1234567890123},
+]
+ROWS = [
+    ItemRow(uuid.UUID(CATEGORY_ID), ITEMS[0]["name"], DATE, None,
+            "CATEGORY", None),
+    ItemRow(uuid.UUID(OFFER_ID), ITEMS[1]["name"], DATE,
+            uuid.UUID(CATEGORY_ID), "OFFER", 1234567890123),
+]
+
+
+class Content:
+    """
+    ``StreamReader`` of body split into chunks of ``chunk_size`` bytes
+    """
+
+    def __init__(self, body: bytes, chunk_size: int):
+        self.chunks = [
+            body[i:i + chunk_size] for i in range(0, len(body), chunk_size)
+        ]
+
+    async def read(self, _: int) -> bytes:
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+def body(items=ITEMS, date="2022-02-01T12:00:00.000Z", date_first=True,
+         ensure_ascii=False) -> bytes:
+    fields = [("items", items), ("updateDate", date)]
+    if date_first:
+        fields.reverse()
+    return json.dumps(dict(fields), ensure_ascii=ensure_ascii).encode()
+
+
+def parse(raw: bytes, chunk_size: int = 2**16, **kwargs):
+    async def collect():
+        stream = ImportRequestStream(Content(raw, chunk_size), **kwargs)
+        return [row async for row in stream], stream.update_date
+    return asyncio.run(collect())
+
+
+def assert_invalid(raw: bytes, error=ValidationError, **kwargs):
+    try:
+        parse(raw, **kwargs)
+    except error:
+        return
+    raise AssertionError(f'{raw!r} is not rejected')
+
+
+def test_chunk_splits():
+    # splits inside strings, multibyte chars, escapes and numbers
+    for raw in (body(), body(ensure_ascii=True)):
+        for chunk_size in range(1, 12):
+            rows, date = parse(raw, chunk_size)
+            assert rows == ROWS, (chunk_size, rows)
+            assert date == DATE
+
+
+def test_update_date_after_items():
+    rows, date = parse(body(date_first=False), chunk_size=5)
+    assert rows == [row._replace(date=None) for row in ROWS]
+    assert date == DATE
+
+
+def test_invalid_fields():
+    date = '"updateDate": "2022-02-01T12:00:00.000Z"'
+    for raw in (
+        '{"items": [], "extra": 1, ' + date + '}',
+        '{"items": [], "items": [], ' + date + '}',
+        '{' + date + ', ' + date + ', "items": []}',
+        '{"items": []}',
+        '{' + date + '}',
+        '{}',
+        '{[1]: 2, "items": [], ' + date + '}',
+        '{1: 2, "items": [], ' + date + '}',
+        '{"items": [1], ' + date + '}',
+        '{"items": {}, ' + date + '}',
+        '{"items": [], "updateDate": "yesterday"}',
+    ):
+        assert_invalid(raw.encode())
+
+
+def test_invalid_json():
+    raw = body()
+    for invalid in (
+        raw + b' {}',
+        raw + b'x',
+        raw[:-1],
+        b'',
+        b'[]',
+        b'"items"',
+        b'null',
+        b'\xff' + raw,
+    ):
+        assert_invalid(invalid)
+    # whitespace after body is fine
+    assert parse(raw + b' \n')[0] == ROWS
+
+
+def test_size_limits():
+    raw = body()
+    assert parse(raw, max_size=len(raw))[0] == ROWS
+    assert_invalid(raw, HTTPRequestEntityTooLarge, max_size=len(raw) - 1)
+    assert_invalid(raw, HTTPRequestEntityTooLarge, chunk_size=7, max_size=100)
+
+    name = 'x' * 2 * ImportRequestStream.max_value_size
+    items = [dict(ITEMS[0], name=name)]
+    assert_invalid(body(items), chunk_size=ImportRequestStream.read_size)
+
+
+def test_all():
+    test_chunk_splits()
+    test_update_date_after_items()
+    test_invalid_fields()
+    test_invalid_json()
+    test_size_limits()
+    print("Test parsers passed.")
+
+
+if __name__ == "__main__":
+    test_all()
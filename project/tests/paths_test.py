@@ -0,0 +1,153 @@
+# encoding=utf8
+"""
+Checks ``Item.path`` rewrites when subtrees move, rejection of moves which
+would make a cycle, and subtrees read by paths: whole ones by ``get_rows()``
+and pages by ``get_page_rows()`` for combinations of depth, limit and cursor,
+against a model of the tree.
+
+Needs database of ``config.env`` migrated to head, the server may be running.
+
+Run from ``project`` directory: python -m tests.paths_test
+"""
+
+import asyncio
+import random
+import uuid
+
+from app.accessors import ItemAccessor
+from app.database import Database
+from tests.aggregates_test import Node, Tree, new_ids
+
+
+async def check_subtrees(tree: Tree):
+    """
+    Checks paths of all ``Items`` and subtrees read from each one
+    """
+    await tree.check()
+    for item_id in tree.items:
+        rows = await tree.accessor.get_rows(item_id)
+        assert {uuid.UUID(row[0]) for row in rows} == tree.subtree(item_id)
+
+
+async def _subtree_moves(tree: Tree):
+    root, other, first, nested, deepest, *offers = new_ids(8)
+    await tree.write(
+        (root, None, None), (other, root, None), (first, root, None),
+        (nested, first, None), (deepest, nested, None),
+        (offers[0], deepest, 10), (offers[1], nested, 20),
+        (offers[2], other, 30),
+    )
+    await check_subtrees(tree)
+    moves: list[list[Node]] = [
+        # subtree three levels deep moves down, up and to the top level
+        [(first, other, None)],
+        [(nested, root, None)],
+        [(nested, None, None)],
+        # child moves along with its parent, and under a moved sibling
+        [(nested, other, None), (deepest, first, None)],
+        [(first, deepest, None), (deepest, root, None)],
+        # the whole tree moves under a new category
+        [(other, None, None), (root, other, None)],
+    ]
+    for items in moves:
+        await tree.write(*items)
+        await check_subtrees(tree)
+    await tree.clear()
+
+
+async def _cycles(tree: Tree):
+    root, child, grandchild, side, offer = new_ids(5)
+    await tree.write(
+        (root, None, None), (child, root, None), (side, None, None),
+        (grandchild, child, None), (offer, grandchild, 5),
+    )
+    # under own child, deep descendant and itself, and under a category
+    # which moves under it in the same import
+    await tree.reject((root, child, None))
+    await tree.reject((root, grandchild, None))
+    await tree.reject((grandchild, grandchild, None))
+    await tree.reject((root, side, None), (side, child, None))
+    await check_subtrees(tree)
+    await tree.clear()
+
+
+def page(tree: Tree, item_id: uuid.UUID, depth: int | None,
+         limit: int | None, after: uuid.UUID | None) -> list[tuple]:
+    """
+    Rows expected from ``get_page_rows()``, with ids, ranks and
+    ``has_children`` flags only
+    """
+    rows = []
+
+    def visit(node_id: uuid.UUID, level: int, rank: int):
+        children = sorted(tree.children(node_id))
+        is_category = tree.items[node_id][1] is None
+        has_children = None
+        if depth is not None and level == depth and is_category:
+            has_children = bool(children)
+        rows.append((node_id, rank, has_children))
+        if not is_category or level == depth or (limit and rank > limit):
+            return
+        if level == 0 and after is not None:
+            children = [i for i in children if i > after]
+        if limit is not None:
+            children = children[:limit + 1]
+        for child_rank, child_id in enumerate(children, 1):
+            visit(child_id, level + 1, child_rank)
+
+    visit(item_id, 0, 1)
+    return rows
+
+
+async def _pages(tree: Tree, seed: int = 1):
+    rnd = random.Random(seed)
+    root = uuid.uuid4()
+    await tree.write((root, None, None))
+    for _ in range(5):
+        items = []
+        for _ in range(60):
+            item_id = uuid.uuid4()
+            categories = [i for i, _, price in items if price is None]
+            parent_id = rnd.choice(tree.categories() + categories)
+            price = rnd.randint(0, 1000) if rnd.random() < 0.6 else None
+            items.append((item_id, parent_id, price))
+        await tree.write(*items)
+
+    count = 0
+    for item_id in rnd.sample(list(tree.items), 40) + [root]:
+        children = sorted(tree.children(item_id))
+        cursors = [None, *rnd.sample(children, min(len(children), 2))]
+        for depth in (None, 0, 1, 2, 5):
+            for limit in (None, 1, 3, 50):
+                for after in cursors:
+                    rows = await tree.accessor.get_page_rows(
+                        item_id, depth, limit, after,
+                    )
+                    found = [(uuid.UUID(row[0]), *row[-2:]) for row in rows]
+                    expected = page(tree, item_id, depth, limit, after)
+                    assert found == expected, (item_id, depth, limit, after)
+                    count += 1
+    assert count > 500, count
+    assert not await tree.accessor.get_page_rows(uuid.uuid4(), 1)
+    await tree.clear()
+
+
+async def run_all():
+    from main import get_config
+    await Database.connect({'config': get_config()})
+    try:
+        tree = Tree(ItemAccessor())
+        await _subtree_moves(tree)
+        await _cycles(tree)
+        await _pages(tree)
+    finally:
+        await Database.disconnect(None)
+
+
+def test_all():
+    asyncio.run(run_all())
+    print("Test paths passed.")
+
+
+if __name__ == "__main__":
+    test_all()
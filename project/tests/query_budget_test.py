@@ -0,0 +1,126 @@
+# encoding=utf8
+"""
+Checks budgets of SQL statements per request of each endpoint, on small and
+large catalogs: number of statements must not grow with number of items.
+
+Needs server started with ``MONITOR_QUERIES=true``, which returns number of
+statements of request in ``X-Query-Count`` header.
+
+Run from ``project`` directory: python -m tests.query_budget_test [url]
+"""
+
+import json
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+API_BASEURL = "http://localhost:80"
+
+# statements per request, at most
+QUERY_BUDGETS = {
+    'imports': 12,
+    'nodes': 2,
+    'nodes_not_modified': 1,
+    'nodes_batch': 1,
+    'nodes_page': 2,
+    'sales': 1,
+    'statistic': 1,
+    'delete': 3,
+}
+
+
+def query_count(path: str, method: str = "GET", data=None,
+                headers=None) -> int:
+    """
+    Number of SQL statements executed by request
+    """
+    req = urllib.request.Request(
+        f"{API_BASEURL}{path}", method=method, headers=headers or {},
+    )
+    if data is not None:
+        req.data = json.dumps(data).encode()
+        req.add_header("Content-Type", "application/json")
+    try:
+        with urllib.request.urlopen(req) as res:
+            res.read()
+            headers = res.headers
+    except urllib.error.HTTPError as e:
+        headers = e.headers
+    count = headers.get("X-Query-Count")
+    assert count is not None, "server runs without MONITOR_QUERIES=true"
+    return int(count)
+
+
+def assert_query_budget(endpoint: str, path: str, method: str = "GET",
+                        data=None, headers=None) -> int:
+    count = query_count(path, method, data, headers)
+    budget = QUERY_BUDGETS[endpoint]
+    assert count <= budget, \
+        f"{method} {path}: {count} statements, budget of {endpoint} is {budget}"
+    return count
+
+
+def make_catalog(categories: int, offers: int) -> tuple[str, list[dict]]:
+    root_id = str(uuid.uuid4())
+    items = [{"id": root_id, "name": "root", "type": "CATEGORY",
+              "parentId": None}]
+    parents = [root_id]
+    for i in range(categories):
+        category_id = str(uuid.uuid4())
+        items.append({"id": category_id, "name": f"category {i}",
+                      "type": "CATEGORY", "parentId": parents[i // 2]})
+        parents.append(category_id)
+    for i in range(offers):
+        items.append({"id": str(uuid.uuid4()), "name": f"offer {i}",
+                      "type": "OFFER", "parentId": parents[i % len(parents)],
+                      "price": i})
+    return root_id, items
+
+
+def check_catalog(categories: int, offers: int) -> None:
+    root_id, items = make_catalog(categories, offers)
+    date = "2022-02-01T12:00:00.000Z"
+    assert_query_budget("imports", "/imports", "POST",
+                        {"items": items, "updateDate": date})
+    # update of existing items, moved to other parents
+    for item in items[2:]:
+        item["parentId"] = items[1]["id"]
+    assert_query_budget("imports", "/imports", "POST",
+                        {"items": items[1:], "updateDate": date})
+
+    assert_query_budget("nodes", f"/nodes/{root_id}")
+    assert_query_budget("nodes", f"/nodes/{uuid.uuid4()}")
+    with urllib.request.urlopen(f"{API_BASEURL}/nodes/{root_id}") as res:
+        etag = res.headers["ETag"]
+    assert_query_budget("nodes_not_modified", f"/nodes/{root_id}",
+                        headers={"If-None-Match": etag})
+    assert_query_budget("nodes_page", f"/nodes/{root_id}?depth=2&limit=10")
+    assert_query_budget("nodes_page", f"/nodes/{root_id}/children?limit=10")
+    # nested, overlapping and unknown ids
+    assert_query_budget("nodes_batch", "/nodes", "POST", {"ids": [
+        root_id, items[1]["id"], items[-1]["id"], str(uuid.uuid4()),
+    ]})
+    params = urllib.parse.urlencode({"date": date, "limit": 10})
+    assert_query_budget("sales", f"/sales?{params}")
+    assert_query_budget("statistic", f"/node/{root_id}/statistic")
+    assert_query_budget("statistic", f"/node/{uuid.uuid4()}/statistic")
+    assert_query_budget("delete", f"/delete/{items[-1]['id']}", "DELETE")
+    # nested and unknown ids
+    ids = [item["id"] for item in items[-len(items) // 2:-1]]
+    assert_query_budget("delete", "/delete", "POST",
+                        {"ids": [*ids, items[1]["id"], str(uuid.uuid4())]})
+    assert_query_budget("delete", f"/delete/{root_id}", "DELETE")
+
+
+def test_all():
+    check_catalog(categories=1, offers=2)
+    check_catalog(categories=100, offers=2000)
+    print("Test query budgets passed.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        API_BASEURL = sys.argv[1].rstrip("/")
+    test_all()
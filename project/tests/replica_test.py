@@ -0,0 +1,74 @@
+# encoding=utf8
+"""
+Checks that ``Database.read_session()`` reads replica and falls back to
+primary when replica refuses connections, while errors of reads themselves
+are raised.
+
+Needs database of ``config.env`` migrated to head, the server may be running.
+
+Run from ``project`` directory: python -m tests.replica_test
+"""
+
+import asyncio
+import socket
+
+from sqlalchemy import exc, text
+
+from app.database import Database
+
+SELECT_ONE = text('SELECT 1')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+async def read_counts(config: dict) -> tuple[int, int, int]:
+    """
+    Numbers of replica, primary and failed replica reads of one read and
+    one failing read
+    """
+    await Database.connect({'config': config})
+    before = Database.read_stats() | {'failures': Database.replica_failures}
+    try:
+        async with Database.read_session() as db:
+            assert await db.scalar(SELECT_ONE) == 1
+        try:
+            async with Database.read_session() as db:
+                await db.execute(text('SELECT 1/0'))
+        except exc.DBAPIError:
+            pass
+        else:
+            raise AssertionError('error of read is not raised')
+    finally:
+        await Database.disconnect(None)
+        # ``connect()`` without replica keeps the one set before
+        Database._replica_engine = Database._replica_session_maker = None
+    after = Database.read_stats() | {'failures': Database.replica_failures}
+    return tuple(
+        after[name] - before[name]
+        for name in ('replica_reads', 'primary_reads', 'failures')
+    )
+
+
+async def run_all():
+    from main import get_config
+    config = get_config()
+
+    # primary itself as replica
+    config['replica'] = {'host': config['db']['host']}
+    assert await read_counts(config) == (2, 0, 0)
+
+    config['replica'] = {'host': 'localhost', 'port': str(free_port())}
+    assert await read_counts(config) == (0, 2, 2)
+
+
+def test_all():
+    asyncio.run(run_all())
+    print("Test replica passed.")
+
+
+if __name__ == "__main__":
+    test_all()
@@ -0,0 +1,146 @@
+# encoding=utf8
+"""
+Checks that fast ``serializers`` produce the same JSON as marshmallow schemas.
+
+Run from ``project`` directory: python -m tests.serializers_test
+"""
+
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import orjson
+from asyncpg.pgproto.pgproto import UUID as PgUUID
+
+from app import schemas, serializers
+from app.models import ItemType
+
+DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_item(type_, parent=None, price=None, name='Товар', date=DATE):
+    """
+    ``Item`` attributes dumped by schemas, with ``children`` linked
+    """
+    item = SimpleNamespace(
+        # same type as ids loaded from database
+        id=PgUUID(str(uuid.uuid4())),
+        name=name,
+        date=date,
+        parent_id=parent and parent.id,
+        type=type_.value,
+        price=price,
+        children=[] if type_ == ItemType.CATEGORY else None,
+    )
+    if parent is not None:
+        parent.children.append(item)
+    return item
+
+
+def make_tree():
+    root = make_item(ItemType.CATEGORY, name='Товары')
+    empty = make_item(ItemType.CATEGORY, root, name='Пустая "категория"')
+    phones = make_item(ItemType.CATEGORY, root, name='Смартфоны')
+    root.price = phones.price = 69999
+    make_item(ItemType.OFFER, phones, 79999, 'jPhone 13')
+    make_item(ItemType.OFFER, phones, 59999, 'Xomiа Readme 10')
+    make_item(ItemType.OFFER, root, 0, 'Zero\n\\', DATE + timedelta(hours=1))
+    assert empty.price is None
+    return root
+
+
+def make_rows(root) -> list[tuple]:
+    """
+    Rows of subtree as returned by ``ItemAccessor.get_rows()``: ids are text
+    """
+    items, stack = [], [root]
+    while stack:
+        item = stack.pop()
+        items.append(item)
+        stack.extend(item.children or ())
+    return [
+        (
+            str(item.id), item.name, item.date,
+            item.parent_id and str(item.parent_id), item.type, item.price,
+        )
+        for item in reversed(items)
+    ]
+
+
+def marshmallow_bytes(schema, obj) -> bytes:
+    """
+    Marshmallow output rendered by ``orjson`` for byte-to-byte comparison
+    """
+    return orjson.dumps(json.loads(schema.dumps(obj)))
+
+
+def test_shop_unit_rows():
+    root = make_tree()
+    rows = make_rows(root)
+    for item in (root, root.children[1], root.children[-1]):
+        expected = marshmallow_bytes(schemas.ShopUnit(), item)
+        rows_bytes = serializers.dumps_shop_unit_rows(rows, str(item.id))
+        assert rows_bytes == expected
+
+
+def test_shop_units_rows():
+    root = make_tree()
+    items = [root.children[1], root.children[-1], root]
+    bodies = serializers.dumps_shop_units_rows(
+        make_rows(root), [str(item.id) for item in items],
+    )
+    expected = [marshmallow_bytes(schemas.ShopUnit(), item) for item in items]
+    assert bodies == expected
+
+
+def test_statistic():
+    root = make_tree()
+    states = [
+        SimpleNamespace(
+            id=root.id, name=root.name, date=DATE, parent_id=None,
+            type=ItemType.CATEGORY.value, price=Decimal(69999),
+        ),
+        root.children[1],
+        root.children[-1],
+    ]
+    response = {'items': states}
+    expected = marshmallow_bytes(schemas.ShopUnitStatisticResponse(), response)
+    assert serializers.dumps_shop_unit_list(response) == expected
+    assert serializers.dumps_shop_unit_list({'items': []}) == b'{"items":[]}'
+
+
+def test_sales():
+    offers = make_tree().children[1].children
+    for response in (
+        {'items': offers},
+        {'items': offers, 'next_cursor': (DATE, offers[-1].id)},
+        {'items': offers, 'next_cursor': None},
+    ):
+        expected = marshmallow_bytes(schemas.ShopUnitSalesResponse(), response)
+        assert serializers.dumps_shop_unit_list(response) == expected
+
+
+def test_date_timezones():
+    # same instant, cached formatting must not mix them up
+    for date in (DATE, DATE.astimezone(timezone(timedelta(hours=3)))):
+        item = make_item(ItemType.OFFER, price=1, date=date)
+        expected = marshmallow_bytes(schemas.ShopUnit(), item)
+        rows_bytes = serializers.dumps_shop_unit_rows(
+            make_rows(item), str(item.id),
+        )
+        assert rows_bytes == expected
+
+
+def test_all():
+    test_shop_unit_rows()
+    test_shop_units_rows()
+    test_statistic()
+    test_sales()
+    test_date_timezones()
+    print("Test serializers passed.")
+
+
+if __name__ == "__main__":
+    test_all()
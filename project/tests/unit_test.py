@@ -246,15 +246,72 @@ def test_sales():
     print("Test sales passed.")
 
 
-def test_stats():
+def request_stats(item_id, date_start=None, date_end=None):
     params = urllib.parse.urlencode({
-        "dateStart": "2022-02-01T00:00:00.000Z",
-        "dateEnd": "2022-02-03T00:00:00.000Z"
+        name: value for name, value in (
+            ("dateStart", date_start), ("dateEnd", date_end)
+        ) if value is not None
     })
     status, response = request(
-        f"/node/{ROOT_ID}/statistic?{params}", json_response=True)
+        f"/node/{item_id}/statistic?{params}", json_response=True)
 
     assert status == 200, f"Expected HTTP status code 200, got {status}"
+    return sorted(response["items"], key=lambda state: state["date"])
+
+
+def state(item_id, date, price):
+    """
+    State of imported ``Item`` with ``price`` at ``date``
+    """
+    for batch in IMPORT_BATCHES:
+        for item in batch["items"]:
+            if item["id"] == item_id:
+                return {
+                    "id": item_id, "name": item["name"], "date": date,
+                    "parentId": item["parentId"], "type": item["type"],
+                    "price": price,
+                }
+
+
+def test_stats():
+    # every import below the root adds a state of it, dateStart is
+    # included and dateEnd is excluded
+    root_states = [
+        state(ROOT_ID, "2022-02-01T12:00:00.000Z", None),
+        state(ROOT_ID, "2022-02-02T12:00:00.000Z", 69999),
+        state(ROOT_ID, "2022-02-03T12:00:00.000Z", 55749),
+        state(ROOT_ID, "2022-02-03T15:00:00.000Z", 58599),
+    ]
+    for date_start, date_end, expected in (
+        ("2022-02-01T00:00:00.000Z", "2022-02-03T00:00:00.000Z",
+         root_states[:2]),
+        ("2022-02-01T12:00:00.000Z", "2022-02-03T12:00:00.000Z",
+         root_states[:2]),
+        ("2022-02-01T12:00:00.001Z", "2022-02-03T12:00:00.001Z",
+         root_states[1:3]),
+        ("2022-02-03T15:00:00.000Z", None, root_states[3:]),
+        (None, "2022-02-01T12:00:00.000Z", []),
+        (None, None, root_states),
+    ):
+        response = request_stats(ROOT_ID, date_start, date_end)
+        assert response == expected, \
+            f"Statistic from {date_start} to {date_end}: {response}"
+
+    tv_id = "1cc0129a-2bfe-474c-9ee6-d435bf5fc8f2"
+    response = request_stats(tv_id)
+    assert response == [
+        state(tv_id, "2022-02-03T12:00:00.000Z", 41499),
+        state(tv_id, "2022-02-03T15:00:00.000Z", 50999),
+    ], f"Statistic of category: {response}"
+
+    # offers change only when imported themselves
+    offer_id = "98883e8f-0507-482f-bce2-2fb306cf6483"
+    response = request_stats(offer_id)
+    assert response == [
+        state(offer_id, "2022-02-03T12:00:00.000Z", 32999),
+    ], f"Statistic of offer: {response}"
+    assert request_stats(offer_id, "2022-02-03T15:00:00.000Z") == []
+
     print("Test stats passed.")
 
 
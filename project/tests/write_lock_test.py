@@ -0,0 +1,108 @@
+# encoding=utf8
+"""
+Checks that writes are serialized by the write lock of ``_batch_mode()``
+without import coalescing: an import waits for a held lock, and concurrent
+moves of one offer keep aggregates of categories right.
+
+Needs database of ``config.env`` migrated to head, the server may be running.
+
+Run from ``project`` directory: python -m tests.write_lock_test
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.accessors import ItemAccessor, _batch_mode
+from app.database import Database
+from app.models import Item, ItemRow, ItemType
+
+DATE = datetime(2022, 2, 1, 12, 0, tzinfo=timezone.utc)
+ROUNDS = 20
+
+
+def category(item_id: uuid.UUID, parent_id: uuid.UUID | None) -> ItemRow:
+    return ItemRow(
+        item_id, str(item_id), DATE, parent_id, ItemType.CATEGORY.value, None,
+    )
+
+
+async def paths(ids: list[uuid.UUID]) -> dict[uuid.UUID, list[uuid.UUID]]:
+    async with Database.session() as db:
+        result = await db.execute(
+            select(Item.id, Item.path).where(Item.id.in_(ids))
+        )
+        return dict(result.all())
+
+
+async def _import_waits_for_lock(accessor: ItemAccessor):
+    root_id = uuid.uuid4()
+    async with Database.session() as db:
+        await db.execute(_batch_mode())
+        task = asyncio.create_task(
+            accessor.import_many([category(root_id, None)])
+        )
+        await asyncio.sleep(1)
+        assert not task.done()
+        assert not await paths([root_id])
+    await asyncio.wait_for(task, 10)
+    assert await paths([root_id]) == {root_id: [root_id]}
+
+    await accessor.delete_many([root_id])
+
+
+async def aggregates(ids: list[uuid.UUID]) -> list[tuple[int, int]]:
+    async with Database.session() as db:
+        result = await db.execute(
+            select(Item.id, Item.offer_count, Item.price_sum).
+            where(Item.id.in_(ids))
+        )
+        found = {item_id: (count, total) for item_id, count, total in result}
+        return [found[item_id] for item_id in ids]
+
+
+async def _concurrent_moves(accessor: ItemAccessor):
+    category_ids = [uuid.uuid4() for _ in range(3)]
+    offer_id = uuid.uuid4()
+
+    def offer(parent_id: uuid.UUID) -> ItemRow:
+        return ItemRow(
+            offer_id, 'offer', DATE, parent_id, ItemType.OFFER.value, 10,
+        )
+
+    await accessor.import_many([category(i, None) for i in category_ids])
+    for _ in range(ROUNDS):
+        await accessor.import_many([offer(category_ids[0])])
+        # both moves would subtract the offer from its old parent
+        await asyncio.gather(
+            accessor.import_many([offer(category_ids[1])]),
+            accessor.import_many([offer(category_ids[2])]),
+        )
+        found = await aggregates(category_ids)
+        assert found[0] == (0, 0), found
+        assert sorted(found[1:]) == [(0, 0), (1, 10)], found
+
+    await accessor.delete_many(category_ids)
+
+
+async def run_all():
+    from main import get_config
+    await Database.connect({'config': get_config()})
+    try:
+        accessor = ItemAccessor()
+        assert accessor.coalescer is None
+        await _import_waits_for_lock(accessor)
+        await _concurrent_moves(accessor)
+    finally:
+        await Database.disconnect(None)
+
+
+def test_all():
+    asyncio.run(run_all())
+    print("Test write lock passed.")
+
+
+if __name__ == "__main__":
+    test_all()